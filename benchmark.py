@@ -0,0 +1,452 @@
+import click
+import contextlib
+import copy
+import io
+import os
+import tempfile
+import time
+import statistics
+import tracemalloc
+from collections import abc
+from collections.abc import MutableMapping, Iterable
+
+from mhdata.io import DataStitcher, DataRow, merge_list
+from mhdata.io.functions import to_basic
+from mhdata.io.functions import fix_id
+
+# Benchmarks used when working on build performance.
+# These run against the real source_data and print timings, they are not part of the test suite.
+
+def measure(fn, repeat, setup=None):
+    """Runs fn repeat times, returning the (best, mean) time in seconds.
+    If setup is given, it is called untimed before each run and its result is passed to fn"""
+    times = []
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.mean(times)
+
+def print_result(name, result):
+    best, mean = result
+    print(f"{name:<40} best {best*1000:9.2f}ms  mean {mean*1000:9.2f}ms")
+
+@click.group()
+def benchmark():
+    "Contains subcommands that benchmark parts of the build"
+    pass
+
+# (dir, keys_ex, base, translation, [(filename, key, many, groups)])
+join_chains = {
+    'monster_map': ('monsters/', [], 'monster_base.csv', 'monster_base_translations.csv', [
+        ('monster_weaknesses.csv', 'weaknesses', True, []),
+        ('monster_hitzones.csv', 'hitzones', True, ['hitzone']),
+        ('monster_breaks.csv', 'breaks', True, ['part']),
+        ('monster_ailments.csv', 'ailments', False, []),
+        ('monster_habitats.csv', 'habitats', True, []),
+        ('monster_rewards.csv', 'rewards', True, []),
+    ]),
+    'weapon_map': ('weapons/', ['weapon_type'], 'weapon_base.csv', 'weapon_base_translations.csv', [
+        ('weapon_sharpness.csv', 'sharpness', False, []),
+        ('weapon_bow_ext.csv', 'bow', False, []),
+        ('weapon_craft.csv', 'craft', True, []),
+    ])
+}
+
+@benchmark.command()
+@click.option('--repeat', default=5, show_default=True)
+def join(repeat):
+    "Compares joins sharing one join index per chain with joins that rebuild it every time"
+    from mhdata.load.loaddata import reader, loaders
+
+    for name, (dir, keys_ex, base_file, translate_file, joins) in join_chains.items():
+        print_result(f"{name} full chain", measure(loaders[name], repeat))
+
+        sub_data = [
+            (fix_id(reader.load_list_csv(dir + filename)), key, many, groups)
+            for (filename, key, many, groups) in joins
+        ]
+
+        def setup():
+            data_map = (DataStitcher(reader, dir=dir, keys_ex=keys_ex)
+                .base_csv(base_file)
+                .translate(translate_file)
+                .data_map)
+            return data_map, copy.deepcopy(sub_data)
+
+        def run_joins(args, rebuild):
+            data_map, sub_data = args
+            for rows, key, many, groups in sub_data:
+                if rebuild:
+                    data_map.reindex()
+                merge_list(data_map, rows, key=key, groups=groups, many=many)
+
+        shared = measure(lambda args: run_joins(args, False), repeat, setup)
+        rebuilt = measure(lambda args: run_joins(args, True), repeat, setup)
+        print_result(f"{name} joins (shared index)", shared)
+        print_result(f"{name} joins (rebuilt per join)", rebuilt)
+
+class DictRow(MutableMapping):
+    "The previous dict backed DataRow, used as a reference by the rows benchmark"
+
+    def __init__(self, parent, row_id, datarowdict):
+        self._parent = parent
+        self._data = { 'id': row_id }
+        for key, value in datarowdict.items():
+            if key != 'id':
+                self._data[key] = value
+
+    def __getitem__(self, key):
+        if key in self._data:
+            return self._data[key]
+        elif '_' in key:
+            key1, key2 = key.rsplit('_', 1)
+            if key1 in self._data:
+                nested = self._data[key1]
+                if isinstance(nested, Iterable) and key2 in nested:
+                    return nested[key2]
+        raise KeyError(f'No entry with {key} found in data row')
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __iter__(self):
+        return self._data.__iter__()
+
+    def __len__(self):
+        return self._data.__len__()
+
+@benchmark.command()
+@click.option('--repeat', default=5, show_default=True)
+def rows(repeat):
+    "Compares memory use and access time of DataRow against the previous dict backed rows"
+    from mhdata.load.loaddata import loaders
+
+    for name in ('weapon_map', 'monster_map'):
+        source = [(entry.id, dict(entry)) for entry in loaders[name]().values()]
+        row_keys = [list(data.keys()) for (_, data) in source]
+
+        for row_type in (DictRow, DataRow):
+            label = f"{name} {row_type.__name__}"
+
+            tracemalloc.start()
+            rows = [row_type(None, row_id, data) for (row_id, data) in source]
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{label:<40} {len(rows)} rows using {size/1024:.0f}KiB")
+
+            def read_fields():
+                for row, keys in zip(rows, row_keys):
+                    for key in keys:
+                        row[key]
+            def read_names():
+                for row in rows:
+                    row['name_en']
+            def read_items():
+                for row in rows:
+                    for _ in row.items(): pass
+
+            print_result(f"{label} fields", measure(read_fields, repeat))
+            print_result(f"{label} name_en", measure(read_names, repeat))
+            print_result(f"{label} items", measure(read_items, repeat))
+
+def stacked_to_basic(obj, *, stack=[]):
+    "The previous recursive to_basic, used as a reference by the basic benchmark"
+    obj_id = id(obj)
+    if obj_id in stack:
+        raise Exception("Cyclical reference detected")
+
+    if isinstance(obj, abc.Mapping):
+        return { k:stacked_to_basic(v, stack=stack+[obj_id]) for (k, v) in obj.items() }
+    elif isinstance(obj, str):
+        return obj
+    elif isinstance(obj, abc.Iterable):
+        return [stacked_to_basic(v, stack=stack+[obj_id]) for v in obj]
+    else:
+        return obj
+
+@benchmark.command()
+@click.option('--repeat', default=5, show_default=True)
+def basic(repeat):
+    "Micro benchmarks of to_basic against the previous recursive implementation"
+    from mhdata.load.loaddata import loaders
+
+    weapon_map = loaders['weapon_map']()
+    plain = weapon_map.to_list()
+    cases = [
+        ('DataMap', weapon_map),
+        ('DataRow values', list(weapon_map.values())),
+        ('plain lists and dicts', plain),
+        ('names only', [entry['name'] for entry in plain]),
+    ]
+
+    for label, data in cases:
+        expected = stacked_to_basic(data)
+        if to_basic(data) != expected or to_basic(data, copy=False) != expected:
+            raise Exception(f"to_basic output differs for {label}")
+
+        print_result(f"{label} (previous)", measure(lambda: stacked_to_basic(data), repeat))
+        print_result(f"{label}", measure(lambda: to_basic(data), repeat))
+        print_result(f"{label} (copy=False)", measure(lambda: to_basic(data, copy=False), repeat))
+
+class RecordingSchema:
+    "Wraps a schema to record every load, used by the schema benchmark"
+    def __init__(self, schema):
+        self.schema = schema
+        self.inputs = []
+        recorded_schemas.append(self)
+
+    def load(self, data, many=None, partial=None):
+        self.inputs.append((copy.deepcopy(data), many))
+        return self.schema.load(data, many=many, partial=partial)
+
+recorded_schemas = []
+
+@benchmark.command()
+@click.option('--repeat', default=5, show_default=True)
+def schema(repeat):
+    "Compares marshmallow schema loads with compiled schema loads, using the inputs of a full load"
+    from mhdata.load import loaddata
+    from mhdata.load.compiler import compile_schema
+
+    original_compile = loaddata.compile_schema
+    loaddata.compile_schema = RecordingSchema
+    try:
+        for load_fn in loaddata.loaders.values():
+            load_fn()
+    finally:
+        loaddata.compile_schema = original_compile
+
+    total_marshmallow = total_compiled = 0
+    for recorded in recorded_schemas:
+        schema = recorded.schema
+        compiled = compile_schema(schema)
+        inputs = recorded.inputs
+
+        for data, many in inputs:
+            if compiled.load(data, many=many) != schema.load(data, many=many):
+                raise Exception(f"Compiled output differs for {type(schema).__name__}")
+
+        def load_all(target):
+            for data, many in inputs:
+                target.load(data, many=many)
+
+        label = f"{type(schema).__name__} x{len(inputs)}"
+        marshmallow_result = measure(lambda: load_all(schema), repeat)
+        compiled_result = measure(lambda: load_all(compiled), repeat)
+        print_result(f"{label} (marshmallow)", marshmallow_result)
+        print_result(f"{label} (compiled)", compiled_result)
+        total_marshmallow += marshmallow_result[0]
+        total_compiled += compiled_result[0]
+
+    print_result("total (marshmallow)", (total_marshmallow, total_marshmallow))
+    print_result("total (compiled)", (total_compiled, total_compiled))
+
+@benchmark.command()
+@click.option('--repeat', default=3, show_default=True)
+def sqlbuild(repeat):
+    "Compares SQL builds using the ORM unit of work with builds using bulk inserts"
+    from mhdata import build
+    from mhdata.build.dump import dump_database
+    from mhdata.load import load_data_processed
+
+    mhdata = load_data_processed()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for bulk in (False, True):
+            filename = os.path.join(tmpdir, f'{"bulk" if bulk else "orm"}.db')
+            def run_build():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    build.build_sql_database(filename, mhdata, bulk=bulk)
+            print_result("bulk build" if bulk else "orm build", measure(run_build, repeat))
+
+        if dump_database(os.path.join(tmpdir, 'orm.db')) != dump_database(os.path.join(tmpdir, 'bulk.db')):
+            raise Exception("Bulk build output differs from the orm build")
+
+@benchmark.command()
+@click.option('--repeat', default=5, show_default=True)
+@click.option('--lookups', default=50, show_default=True, help="Number of distinct values looked up per index")
+@click.option('--page-size', default=4096, show_default=True)
+def queries(repeat, lookups, page_size):
+    "Times the lookups supported by each query index, with and without the index"
+    import random
+    import sqlite3
+    from mhdata import build
+    from mhdata.build.optimize import query_indexes, index_name
+    from mhdata.load import load_data_processed
+
+    mhdata = load_data_processed()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'mhw.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            build.build_sql_database(filename, mhdata, bulk=True)
+            build.optimize_database(filename, page_size=page_size)
+
+        rng = random.Random(0)
+        with contextlib.closing(sqlite3.connect(filename)) as conn:
+            for table_name, columns in query_indexes:
+                name = index_name(table_name, columns)
+                column_list = ', '.join(columns)
+                condition = ' AND '.join(f'{c} = ?' for c in columns)
+                values = conn.execute(f'SELECT DISTINCT {column_list} FROM {table_name}').fetchall()
+                values = rng.sample(values, min(lookups, len(values)))
+                sql = f'SELECT * FROM {table_name} WHERE {condition}'
+
+                def run_lookups():
+                    for params in values:
+                        conn.execute(sql, params).fetchall()
+
+                indexed = measure(run_lookups, repeat)
+                conn.execute(f'DROP INDEX {name}')
+                unindexed = measure(run_lookups, repeat)
+                conn.execute(f'CREATE INDEX {name} ON {table_name} ({column_list})')
+
+                print_result(f"{name}", indexed)
+                print_result(f"{name} (no index)", unindexed)
+                print(f"{'':<40} {unindexed[0] / indexed[0]:.1f}x faster with the index")
+
+@benchmark.command()
+@click.option('--repeat', default=5, show_default=True)
+@click.option('--lookups', default=100, show_default=True, help="Number of distinct entries looked up per query")
+@click.option('--threads', default=4, show_default=True, help="Number of threads used to measure throughput")
+@click.option('--seconds', default=2.0, show_default=True, help="Duration of each throughput measurement")
+def querylib(repeat, lookups, threads, seconds):
+    "Times the lookups of the mhdata.query library, and its throughput when shared by threads"
+    import random
+    import sqlite3
+    import concurrent.futures
+    from mhdata import build
+    from mhdata.load import load_data_processed
+    from mhdata.query import QueryDatabase
+
+    mhdata = load_data_processed()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'mhw.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            build.build_sql_database(filename, mhdata, bulk=True)
+            build.optimize_database(filename)
+
+        rng = random.Random(0)
+        with contextlib.closing(sqlite3.connect(filename)) as conn:
+            def sample(sql):
+                values = [row[0] for row in conn.execute(sql)]
+                return rng.sample(values, min(lookups, len(values)))
+            item_names = sample("SELECT name FROM item_text")
+            item_ids = sample("SELECT id FROM item")
+            weapon_ids = sample("SELECT id FROM weapon")
+            armorset_ids = sample("SELECT id FROM armorset")
+            monster_ids = sample("SELECT id FROM monster")
+
+        queries = [
+            ('item by name', QueryDatabase.item_by_name, item_names),
+            ('item sources', QueryDatabase.item_sources, item_ids),
+            ('weapon tree', QueryDatabase.weapon_tree, weapon_ids),
+            ('armor set', QueryDatabase.armorset, armorset_ids),
+            ('monster hitzones', QueryDatabase.monster_hitzones, monster_ids),
+        ]
+
+        def run_all(querydb):
+            for _, fn, values in queries:
+                for value in values:
+                    fn(querydb, value)
+
+        for cache_size in (0, 10000):
+            with QueryDatabase(filename, cache_size=cache_size, pool_size=threads) as querydb:
+                run_all(querydb) # warm up statements and the result cache
+                label = "cached" if cache_size else "uncached"
+                for name, fn, values in queries:
+                    def run_lookups():
+                        for value in values:
+                            fn(querydb, value)
+                    best, mean = measure(run_lookups, repeat)
+                    print_result(f"{name} ({label}, per lookup)", (best / len(values), mean / len(values)))
+
+                # Every thread runs every query until the time is up
+                def run_thread():
+                    count = 0
+                    end = time.perf_counter() + seconds
+                    while time.perf_counter() < end:
+                        run_all(querydb)
+                        count += sum(len(values) for (_, _, values) in queries)
+                    return count
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+                    total = sum(executor.map(lambda _: run_thread(), range(threads)))
+                print(f"{'throughput (' + label + ')':<40} {total / seconds:,.0f} lookups/s with {threads} threads")
+
+@benchmark.command()
+@click.option('--repeat', default=5, show_default=True)
+def search(repeat):
+    "Compares full text searches with LIKE scans over the name of every text table"
+    import sqlite3
+    from mhdata import build
+    from mhdata.build.search import search_entities
+    from mhdata.load import load_data_processed
+    from mhdata.query.search import search
+
+    mhdata = load_data_processed()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'mhw.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            build.build_sql_database(filename, mhdata, bulk=True)
+            size = os.path.getsize(filename)
+            build.create_search_index(filename)
+            build.optimize_database(filename)
+        print(f"search index adds {(os.path.getsize(filename) - size) / 1024 / 1024:.1f}MB")
+
+        like_sql = ' UNION ALL '.join(
+            f"SELECT '{entity}', id, lang_id, name FROM {table} WHERE name LIKE ?" for (entity, table) in search_entities)
+        with contextlib.closing(sqlite3.connect(filename)) as conn:
+            for text in ['Po', 'Potion', 'rath', 'Great Sword', '回復', '回復薬']:
+                params = [f'%{text}%'] * len(search_entities)
+                print_result(f"search '{text}'", measure(lambda: search(conn, text), repeat))
+                print_result(f"like '{text}'", measure(lambda: conn.execute(like_sql, params).fetchall(), repeat))
+
+def struct_files(entries):
+    """Returns the (name, data, struct type) of generated quest, epg, eda, and itlot files,
+    as the game files aren't part of the project. Lists have the given number of entries"""
+    import struct
+    from mhdata.binary.parsers import DttEpg, DttEda, Itlot, Mib
+
+    # Zeroes are valid for every mapped value, so only list counts are set
+    epg = struct.pack('<20xI', entries)
+    epg += (struct.pack('<20xI', 2) + bytes(94)) * entries
+    epg += struct.pack('<I', entries) + bytes(44 * entries)
+    epg += struct.pack('<I', entries) + bytes(23 * entries)
+    itlot = struct.pack('<6xI', entries) + bytes(50 * entries)
+
+    return [
+        ('quest', bytes(1000), Mib),
+        ('epg', epg, DttEpg),
+        ('eda', bytes(1000), DttEda),
+        ('itlot', itlot, Itlot),
+    ]
+
+@benchmark.command()
+@click.option('--repeat', default=5, show_default=True)
+@click.option('--entries', default=200, show_default=True, help="Number of entries of every list")
+def structs(repeat, entries):
+    "Compares reading binary structs field by field with reading them using compiled struct plans"
+    from mhdata.binary.parsers import structreader as sr, struct_to_json
+
+    def read_all(data, struct_type, count=100):
+        for _ in range(count):
+            sr.read_struct(data, struct_type)
+
+    for name, data, struct_type in struct_files(entries):
+        compiled = struct_to_json(sr.read_struct(data, struct_type))
+        original_layout, original_plans = sr.fixed_layout, sr._struct_plans
+        sr.fixed_layout, sr._struct_plans = (lambda readable: None), {}
+        try:
+            if struct_to_json(sr.read_struct(data, struct_type)) != compiled:
+                raise Exception(f"Compiled output differs for {name}")
+            print_result(f"{name} x100 (field reads)", measure(lambda: read_all(data, struct_type), repeat))
+        finally:
+            sr.fixed_layout, sr._struct_plans = original_layout, original_plans
+        print_result(f"{name} x100 (compiled)", measure(lambda: read_all(data, struct_type), repeat))
+
+if __name__ == '__main__':
+    benchmark()
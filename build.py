@@ -1,8 +1,11 @@
 import click
+import contextlib
 import sys
+import time
 
 from mhdata import build
-from mhdata.load import load_data_processed
+from mhdata.build.profile import profile_stage
+from mhdata.load import load_data_processed, load_data_reloadable, validate
 
 # Python 3.6 dictionaries preserve insertion order,
 # and python 3.7 officially added it to the spec.
@@ -15,10 +18,154 @@ if sys.version_info < (3,6):
 
 
 @click.command()
-def build_cmd():
-    data = load_data_processed()
+@click.option('--workers', default=1, type=int, show_default=True,
+    help="Number of processes used to load source data. Use 0 for one per cpu.")
+@click.option('--watch', is_flag=True,
+    help="Keep running, and rebuild the parts of the database affected by changed source files.")
+@click.option('--bulk/--orm', default=True, show_default=True,
+    help="Write rows using bulk inserts, or using the ORM unit of work. Both create the same database.")
+@click.option('--build-workers', default=1, type=int, show_default=True,
+    help="Number of processes used to build the database, each building part of it in a separate file. " +
+        "Use 0 for one per cpu. Ignored in watch mode.")
+@click.option('--incremental', is_flag=True,
+    help="Update the existing database, writing only the rows that changed since the last incremental build.")
+@click.option('--verify', is_flag=True,
+    help="After building, check that the database matches a full build.")
+@click.option('--search/--no-search', 'search_index', default=True, show_default=True,
+    help="Create the full text search index of every name and description. Requires sqlite 3.34 or newer, " +
+        "and is skipped with a warning on older versions.")
+@click.option('--optimize/--no-optimize', default=True, show_default=True,
+    help="Create query indexes, analyze, and vacuum the database after building.")
+@click.option('--page-size', default=4096, type=int, show_default=True,
+    help="Page size of the database, set when optimizing.")
+@click.option('--profile', 'profile_filename', default=None, type=click.Path(dir_okay=False),
+    help="Write a JSON report of the time, memory, and rows of each build stage to this file. " +
+        "Incremental and multi-process builds are measured as a single build stage.")
+@click.option('--profile-memory', is_flag=True,
+    help="Also trace python allocations when profiling. This slows down the build.")
+@click.option('--snapshot', 'snapshot_dir', default=None, type=click.Path(file_okay=False),
+    help="Also write a columnar snapshot of the loaded data to this directory, as an Arrow file per family. " +
+        "Requires pyarrow.")
+@click.option('--cache/--no-cache', 'use_cache', default=True, show_default=True,
+    help="Skip the build if the source data and build code match the existing database or a cached one. " +
+        "Not used when profiling, verifying, or writing a snapshot.")
+@click.option('--cache-dir', default='.build_cache', show_default=True, type=click.Path(file_okay=False),
+    help="Directory of cached databases. Incremental builds only compare with the existing database.")
+@click.option('--cache-size', default=1024, type=int, show_default=True,
+    help="Maximum size of the cache directory in megabytes. The least recently used databases are deleted first.")
+def build_cmd(workers, watch, bulk, build_workers, incremental, verify, search_index, optimize, page_size,
+        profile_filename, profile_memory, snapshot_dir, use_cache, cache_dir, cache_size):
     output_filename = 'mhw.db'
-    build.build_sql_database(output_filename, data)
-    
+    if search_index and not build.search_index_supported():
+        print(f"Warning: {build.search_unsupported_message()}. Building without the search index")
+        search_index = False
+
+    if watch:
+        watch_build(output_filename, bulk=bulk, search_index=search_index,
+            page_size=(page_size if optimize else None))
+        return
+
+    manifest = None
+    build_cache = None
+    if use_cache and not profile_filename and not verify and not snapshot_dir:
+        # Bulk and multi-process builds create the same database, so only options that change the output are hashed
+        manifest = build.manifest_hash({
+            'page_size': (page_size if optimize else None),
+            'incremental': incremental,
+            'search': search_index
+        })
+        if not incremental:
+            build_cache = build.BuildCache(cache_dir, max_size=cache_size * 1024 * 1024)
+
+        if build.read_manifest_hash(output_filename) == manifest:
+            print("Database is up to date, skipping build")
+            return
+        if build_cache and build_cache.get(manifest, output_filename):
+            print(f"Copied cached database {manifest}")
+            return
+
+    profile = build.BuildProfile(trace_memory=profile_memory) if profile_filename else None
+    with (profile.run() if profile else contextlib.nullcontext()):
+        timings = {}
+        data = load_data_processed(workers=(workers or None), timings=timings, profile=profile)
+        if workers != 1:
+            for name, elapsed in timings.items():
+                print(f"Loaded {name} in {elapsed:.2f}s")
+
+        if incremental:
+            with profile_stage(profile, 'build'):
+                build.update_sql_database(output_filename, data)
+        elif build_workers != 1:
+            with profile_stage(profile, 'build'):
+                build.build_sql_database_sharded(output_filename, data, workers=(build_workers or None))
+        else:
+            build.build_sql_database(output_filename, data, bulk=bulk, profile=profile)
+
+        if search_index:
+            with profile_stage(profile, 'search'):
+                build.create_search_index(output_filename)
+
+        if optimize:
+            with profile_stage(profile, 'optimize'):
+                build.optimize_database(output_filename, page_size=page_size)
+
+        if snapshot_dir:
+            with profile_stage(profile, 'snapshot'):
+                build.write_snapshot(snapshot_dir, data)
+
+    if manifest:
+        build.write_manifest_hash(output_filename, manifest)
+        if build_cache:
+            build_cache.put(manifest, output_filename)
+    else:
+        # Incremental builds update the database in place, which would keep the hash of an earlier build
+        build.clear_manifest_hash(output_filename)
+
+    if profile:
+        profile.print_summary()
+        profile.write(profile_filename)
+        print(f"Wrote build profile to {profile_filename}")
+
+    if verify:
+        if not build.verify_sql_database(output_filename, data):
+            raise Exception("Verification Failed")
+        print("Database matches a full build")
+
+def watch_build(output_filename, *, bulk, search_index, page_size):
+    """Builds the database, then rebuilds affected parts whenever source files change. Loads serially.
+    If search_index is true, the search index is recreated after every rebuild.
+    If page_size is given, the database is optimized after the first build only."""
+    reloadable = load_data_reloadable()
+    record = build.BuildRecord()
+    build.build_sql_database(output_filename, reloadable.data, record=record, bulk=bulk)
+    if search_index:
+        build.create_search_index(output_filename)
+    if page_size:
+        build.optimize_database(output_filename, page_size=page_size)
+
+    print("Watching for changes, press Ctrl+C to stop")
+    pending = set()
+    try:
+        while True:
+            time.sleep(1)
+            reloaded = reloadable.reload()
+            if not reloaded:
+                continue
+
+            print(f"Reloaded {', '.join(sorted(reloaded))}")
+            pending |= reloaded
+
+            # Maps that fail validation stay pending until a later change fixes them
+            if not validate(reloadable.data):
+                print("Validation failed, database was not updated")
+                continue
+
+            build.rebuild_sql_database(output_filename, reloadable.data, record, pending, bulk=bulk)
+            if search_index:
+                build.create_search_index(output_filename)
+            pending = set()
+    except KeyboardInterrupt:
+        pass
+
 if __name__ == '__main__':
     build_cmd()
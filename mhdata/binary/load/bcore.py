@@ -4,12 +4,11 @@ Consider whether this should be part of parsers, or if its fine to have here.
 """
 
 from typing import Type, Mapping, MutableMapping, Union
-import regex as re
 from os.path import dirname, abspath, join
 
 from mhw_armor_edit import ftypes
-from mhw_armor_edit.ftypes import gmd
 from ..parsers import structreader as sr
+from .gmdtext import load_gmd_text
 
 # Location of MHW binary data.
 # Looks for a folder called /mergedchunks neighboring the main project folder.
@@ -37,10 +36,13 @@ def get_chunk_root():
     return CHUNK_DIRECTORY
 
 def load_schema(schema: Union[Type[ftypes.StructFile],Type[sr.Readable]], relative_dir: str) -> ftypes.StructFile:
-    "Uses an ftypes struct file class to load() a file relative to the chunk directory"
+    """Uses an ftypes struct file class to load() a file relative to the chunk directory.
+    Struct files are loaded read-only: the file is memory mapped, and entries are created when accessed"""
     with open(join(CHUNK_DIRECTORY, relative_dir), 'rb') as f:
         if isinstance(schema, sr.Readable) or issubclass(schema, sr.Readable):
             return sr.read_struct(bytearray(f.read()), schema)
+        if issubclass(schema, ftypes.StructFile):
+            return schema.load(f, readonly=True)
         return schema.load(f)
 
 class GmdGroup(Mapping[Union[int, str], Mapping[str,str]]):
@@ -73,37 +75,16 @@ def load_text(basepath: str, exclude_indices=False, exclude_keys=False) -> GmdGr
     The given base path is the relative directory from the chunk folder,
     excluding the _eng.gmd ending. All GMD files starting with the given basepath
     and ending with the language are combined together into a single result.
+    Texts are normalized and cached by the gmdtext module.
     """
     indexed_entries = {}
     keyed_entries = {}
     for ext_lang, lang in lang_map.items():
-        data = load_schema(gmd.Gmd, f"{basepath}_{ext_lang}.gmd")
-        for idx, value_obj in enumerate(data.items):
-            if idx not in indexed_entries and not exclude_indices:
-                indexed_entries[idx] = {}
-            if value_obj.key not in keyed_entries and not exclude_keys:
-                keyed_entries[value_obj.key] = {}
-
-            value = value_obj.value
-
-            # For german, treat - as a linebreak join if between lowercase characters
-            if lang == 'de':
-                value = re.sub(r"(\p{Ll})-( )*\r?\n( )*(\p{Ll})", r"\1\4", value)
-
-            value = re.sub(r"-()*\r?\n( )*", "-", value)
-            value = re.sub(r"( )*\r?\n( )*", " ", value)
-            value = re.sub(r"( )?<ICON ALPHA>", " α", value)
-            value = re.sub(r"( )?<ICON BETA>", " β", value)
-            value = re.sub(r"( )?<ICON GAMMA>", " γ", value)
-            value = (value
-                .replace("<STYL MOJI_YELLOW_DEFAULT>[1]</STYL>", "[1]")
-                .replace("<STYL MOJI_YELLOW_DEFAULT>[2]</STYL>", "[2]")
-                .replace("<STYL MOJI_YELLOW_DEFAULT>[3]</STYL>", "[3]")
-                .replace("<STYL MOJI_YELLOW_DEFAULT>", "")
-                .replace("<STYL MOJI_LIGHTBLUE_DEFAULT>", "")
-                .replace("</STYL>", "")).strip()
-
-            if not exclude_indices: indexed_entries[idx][lang] = value
-            if not exclude_keys: keyed_entries[value_obj.key][lang] = value
+        items = load_gmd_text(join(CHUNK_DIRECTORY, f"{basepath}_{ext_lang}.gmd"), lang)
+        for idx, (key, value) in enumerate(items):
+            if not exclude_indices:
+                indexed_entries.setdefault(idx, {})[lang] = value
+            if not exclude_keys:
+                keyed_entries.setdefault(key, {})[lang] = value
 
     return GmdGroup(indexed_entries, keyed_entries)
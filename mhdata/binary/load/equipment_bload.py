@@ -1,4 +1,11 @@
 from typing import Type, Mapping, Iterable, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    # SharpnessDataReader requires numpy, and raises through StructFile.to_numpy() without it
+    np = None
+
 from mhw_armor_edit.ftypes import gmd, am_dat, kire, wp_dat, wp_dat_g
 from mhw_armor_edit.ftypes.ext import rod_inse
 from ..parsers import ask, lbr
@@ -57,29 +64,28 @@ mr_variations = {
 
 class SharpnessDataReader():
     "A class that loads sharpness data and processes it for binary weapon objects"
+    colors = ('red', 'orange', 'yellow', 'green', 'blue', 'white', 'purple')
+
     def __init__(self):
         self.sharpness_data = load_schema(kire.Kire, "common/equip/kireaji.kire")
 
+        # Binary data lists "end" positions, not pool sizes
+        # So we convert every entry at once by subtracting the previous end position
+        entries = self.sharpness_data.to_numpy()
+        ends = np.stack([entries[color].astype(np.int64) for color in self.colors], axis=1)
+        self.sharpness_pools = np.diff(ends, axis=1, prepend=0)
+
     def sharpness_for(self, binary: wp_dat.WpDatEntry):
         """"Returns sharpness data for the given binary weapon entry.
         This sharpness data is in the form used in the sharpness csv file"""
 
-        sharpness_binary = self.sharpness_data[binary.kire_id]
         sharpness_modifier = -250 + (binary.handicraft*50)
         sharpness_maxed = sharpness_modifier == 0
         if not sharpness_maxed:
             sharpness_modifier += 50 # we store the handicraft+5 value...
 
-        # Binary data lists "end" positions, not pool sizes
-        # So we convert by subtracting the previous end position
-        sharpness_values = Sharpness(
-            red=sharpness_binary.red,
-            orange=sharpness_binary.orange-sharpness_binary.red,
-            yellow=sharpness_binary.yellow-sharpness_binary.orange,
-            green=sharpness_binary.green-sharpness_binary.yellow,
-            blue=sharpness_binary.blue-sharpness_binary.green,
-            white=sharpness_binary.white-sharpness_binary.blue,
-            purple=sharpness_binary.purple-sharpness_binary.white)
+        pools = self.sharpness_pools[binary.kire_id].tolist()
+        sharpness_values = Sharpness(*pools)
         sharpness_values.subtract(-sharpness_modifier)
 
         return {
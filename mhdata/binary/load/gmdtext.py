@@ -0,0 +1,113 @@
+"""
+Decodes GMD text files into normalized (key, text) pairs, caching the results.
+
+Results are cached in memory by file, and on disk by a hash of the file contents and language,
+so a repeat run (such as a second binary update) skips decoding the GMD files of unchanged chunks.
+Bump TEXT_CACHE_VERSION whenever normalize_text changes, so older cached texts are ignored.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+from os.path import dirname, abspath, join
+
+import regex as re
+from mhw_armor_edit.ftypes import gmd
+
+TEXT_CACHE_VERSION = 1
+
+# Directory of normalized texts cached by file hash. Set to None to disable the disk cache
+TEXT_CACHE_DIRECTORY = join(dirname(abspath(__file__)), "../../../.text_cache")
+
+# Line breaks become spaces, except after a hyphen where they are removed.
+# German also joins words hyphenated across a line break between lowercase characters
+_line_break = r"(?P<hyphen>-)\r?\n( )*|( )*\r?\n( )*"
+_line_break_re = re.compile(_line_break)
+_german_line_break_re = re.compile(r"(?P<before>\p{Ll})-( )*\r?\n( )*(?P<after>\p{Ll})|" + _line_break)
+
+def _replace_line_break(match):
+    groups = match.groupdict()
+    if groups.get('before') is not None:
+        return groups['before'] + groups['after']
+    return '-' if groups['hyphen'] else ' '
+
+# Greek letter icons become letters, and color tags are removed
+_icons = { 'ALPHA': 'α', 'BETA': 'β', 'GAMMA': 'γ' }
+_tag_re = re.compile(r"( )?<ICON (?P<icon>ALPHA|BETA|GAMMA)>|<STYL MOJI_(?:YELLOW|LIGHTBLUE)_DEFAULT>|</STYL>")
+
+def _replace_tag(match):
+    icon = match.group('icon')
+    return ' ' + _icons[icon] if icon else ''
+
+def normalize_text(value: str, lang: str) -> str:
+    "Returns a GMD text with its line breaks joined and its markup replaced"
+    if '\n' in value:
+        line_break_re = _german_line_break_re if lang == 'de' else _line_break_re
+        value = line_break_re.sub(_replace_line_break, value)
+    if '<' in value:
+        value = _tag_re.sub(_replace_tag, value)
+    return value.strip()
+
+def decode_gmd(data, lang: str):
+    "Returns the (key, normalized text) pairs of the GMD file data, in file order"
+    data = bytearray(data)
+    gmd.Gmd.check_header(data)
+    return [(item.key, normalize_text(item.value, lang)) for item in gmd.Gmd(data).items]
+
+# Decoded texts by (path, lang), along with the size and modification time of the file when read
+_loaded_texts = {}
+
+def clear_text_cache():
+    "Clears the texts cached in memory. The disk cache is kept"
+    _loaded_texts.clear()
+
+def _cache_path(digest):
+    return join(TEXT_CACHE_DIRECTORY, digest + '.json')
+
+def _read_cached(digest):
+    try:
+        with open(_cache_path(digest), encoding='utf-8') as f:
+            return [tuple(item) for item in json.load(f)]
+    except (OSError, ValueError):
+        # Missing, or a corrupt or partially written entry
+        return None
+
+def _write_cached(digest, items):
+    "Stores the items in the disk cache. Texts are left uncached if the cache can't be written"
+    temp_path = None
+    try:
+        os.makedirs(TEXT_CACHE_DIRECTORY, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=TEXT_CACHE_DIRECTORY, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(items, f, ensure_ascii=False)
+        os.replace(temp_path, _cache_path(digest))
+    except OSError as e:
+        print(f"Warning: Could not write to the text cache at {TEXT_CACHE_DIRECTORY}: {e}")
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def load_gmd_text(path: str, lang: str):
+    """Returns the (key, normalized text) pairs of the GMD file at path.
+    The file is only decoded if it is not cached in memory or on disk"""
+    stat = os.stat(path)
+    file_id = (stat.st_size, stat.st_mtime_ns)
+    loaded = _loaded_texts.get((path, lang))
+    if loaded is not None and loaded[0] == file_id:
+        return loaded[1]
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    items = None
+    if TEXT_CACHE_DIRECTORY is not None:
+        digest = hashlib.sha1(f'{TEXT_CACHE_VERSION}:{lang}:'.encode('utf-8') + data).hexdigest()
+        items = _read_cached(digest)
+
+    if items is None:
+        items = decode_gmd(data, lang)
+        if TEXT_CACHE_DIRECTORY is not None:
+            _write_cached(digest, items)
+
+    _loaded_texts[(path, lang)] = (file_id, items)
+    return items
@@ -2,14 +2,45 @@ from collections.abc import Sequence
 import struct
 import inspect
 import copy
-from typing import get_type_hints, Type
+import sys
+from typing import get_type_hints, Type, NamedTuple, Callable, Optional
 
 import mhw_armor_edit.ftypes as ft
 
+class FixedLayout(NamedTuple):
+    """The layout of a readable that always has the same size.
+    fmt is its little endian struct format (without the byte order), and count the number of values it unpacks.
+    convert is called with the tuple of unpacked values to create the read value.
+    If convert is None, the single unpacked value is the read value."""
+    fmt: str
+    count: int
+    convert: Optional[Callable]
+
 class Readable:
     def read(self, reader: 'StructReader'):
         raise Exception("Read not implemented")
 
+    def layout(self) -> Optional[FixedLayout]:
+        "Returns the FixedLayout of this readable, or None if its size depends on the data"
+        return None
+
+def fixed_layout(readable) -> Optional[FixedLayout]:
+    "Returns the FixedLayout of a Readable instance or class, or None if it doesn't have one"
+    if inspect.isclass(readable):
+        if not issubclass(readable, Readable):
+            return None
+        readable = readable()
+    if not isinstance(readable, Readable):
+        return None
+    return readable.layout()
+
+def convert_items(layout: FixedLayout, values, count):
+    "Converts the values unpacked by count repetitions of layout into a list of count values"
+    if layout.convert is None:
+        return list(values)
+    size = layout.count
+    return [layout.convert(values[i:i + size]) for i in range(0, size * count, size)]
+
 class StructReader:
     """Class used to read  mhw_armor_edit struct types, when a file contains multiple of them"""
     
@@ -49,9 +80,19 @@ class StructReader:
 class ReadablePrimitive(Readable):
     def __init__(self, fmt):
         self.fmt = fmt
+        self.struct = struct.Struct(fmt)
     
     def read(self, reader: StructReader):
-        return reader.read_field(self.fmt)
+        result = self.struct.unpack_from(reader.data, reader.offset)[0]
+        reader.offset += self.struct.size
+        return result
+
+    def layout(self):
+        # Formats without a byte order are native, which can only be combined with little endian formats
+        order = self.fmt[0] if self.fmt[0] in '@=<>!' else '@'
+        if order == '<' or (order in '@=' and sys.byteorder == 'little'):
+            return FixedLayout(self.fmt.lstrip('@=<>!'), 1, None)
+        return None
 
 class uint(ReadablePrimitive):
     def __init__(self):
@@ -114,6 +155,13 @@ class blist(Readable):
 
         return results
 
+    def layout(self):
+        item = fixed_layout(self.base)
+        if item is None:
+            return None
+        count = self.count
+        return FixedLayout(item.fmt * count, item.count * count, lambda values: convert_items(item, values, count))
+
 class DynamicList(Readable):
     def __init__(self, base, *, count_type=uint):
         self.base = base
@@ -125,6 +173,25 @@ class DynamicList(Readable):
         except Exception as ex:
             raise Exception(f"Failed to read the number of entries") from ex
 
+        # Entries of a fixed size are decoded in one call. Failures are read again one entry at a time,
+        # which raises the same error as before
+        layout = fixed_layout(self.base)
+        if layout is not None and layout.count:
+            start = reader.offset
+            entry_struct = struct.Struct('<' + layout.fmt)
+            end = start + entry_struct.size * count
+            if end <= len(reader.data):
+                try:
+                    entries = entry_struct.iter_unpack(memoryview(reader.data)[start:end])
+                    if layout.convert is None:
+                        results = [values[0] for values in entries]
+                    else:
+                        results = [layout.convert(values) for values in entries]
+                    reader.offset = end
+                    return results
+                except Exception:
+                    reader.offset = start
+
         try:
             results = []
             for i in range(count):
@@ -133,37 +200,139 @@ class DynamicList(Readable):
         except Exception as ex:
             raise Exception(f"Failed to read list with {count} entries - failed at entry {i}") from ex
 
+def read_field(result, name, readable, reader: StructReader):
+    "Reads a single field of an AnnotatedStruct into result"
+    # As typehints are at the class level, we need to copy them if its a readable
+    if isinstance(readable, Readable):
+        readable = copy.copy(readable)
+
+    try:
+        value = reader.read_struct(readable)
+        setattr(result, name, value)
+    except Exception as ex:
+        classname = type(result).__name__
+        raise Exception(f"Failed to read prop {name} in {classname}") from ex
+
+class FieldStep:
+    "Reads a field whose size depends on the data"
+    def __init__(self, name, readable):
+        self.name = name
+        self.readable = readable
+
+    def read(self, result, reader: StructReader):
+        read_field(result, self.name, self.readable, reader)
+
+class FixedRunStep:
+    "Reads consecutive fields of a fixed size using a single struct"
+    def __init__(self, fields):
+        self.fields = fields
+        self.fmt = ''.join(layout.fmt for (_, _, layout) in fields)
+        self.count = sum(layout.count for (_, _, layout) in fields)
+        self.struct = struct.Struct('<' + self.fmt)
+
+        # (name, start, end, convert) of the unpacked values of every field
+        self.slices = []
+        position = 0
+        for name, _, layout in fields:
+            self.slices.append((name, position, position + layout.count, layout.convert))
+            position += layout.count
+        self.names = [name for (name, _, _) in fields]
+        self.plain = all(convert is None for (_, _, _, convert) in self.slices)
+
+    def assign(self, result, values):
+        "Sets the fields of result from the unpacked values"
+        if self.plain:
+            result.__dict__.update(zip(self.names, values))
+            return
+        for name, start, end, convert in self.slices:
+            setattr(result, name, values[start] if convert is None else convert(values[start:end]))
+
+    def read(self, result, reader: StructReader):
+        start = reader.offset
+        try:
+            self.assign(result, self.struct.unpack_from(reader.data, start))
+            reader.offset = start + self.struct.size
+        except Exception:
+            # Read the fields one at a time, which raises the same error as before
+            reader.offset = start
+            for name, readable, _ in self.fields:
+                read_field(result, name, readable, reader)
+
+class StructPlan:
+    """The steps reading an AnnotatedStruct class, created once per class from its type hints.
+    Consecutive fields of a fixed size are read as a single struct, other fields are read one at a time"""
+    def __init__(self, struct_class):
+        self.names = []
+        self.steps = []
+
+        run = []
+        for name, readable in get_type_hints(struct_class).items():
+            self.names.append(name)
+            layout = fixed_layout(readable)
+            if layout is not None:
+                run.append((name, readable, layout))
+                continue
+            if run:
+                self.steps.append(FixedRunStep(run))
+                run = []
+            self.steps.append(FieldStep(name, readable))
+        if run:
+            self.steps.append(FixedRunStep(run))
+
+        # A struct made of a single run has a fixed size, and can be part of the runs of other structs
+        self.fixed = not self.steps or (len(self.steps) == 1 and isinstance(self.steps[0], FixedRunStep))
+
+    def read(self, prototype, reader: StructReader):
+        result = copy_struct(prototype)
+        for step in self.steps:
+            step.read(result, reader)
+        return result
+
+    def layout(self, prototype):
+        if not self.fixed:
+            return None
+        if not self.steps:
+            return FixedLayout('', 0, lambda values: copy_struct(prototype))
+
+        step = self.steps[0]
+        def convert(values):
+            result = copy_struct(prototype)
+            step.assign(result, values)
+            return result
+        return FixedLayout(step.fmt, step.count, convert)
+
+def copy_struct(obj):
+    "Same as copy.copy for AnnotatedStruct objects, without the generic copy protocol"
+    result = object.__new__(type(obj))
+    result.__dict__.update(obj.__dict__)
+    return result
+
+# Compiled plans by AnnotatedStruct class
+_struct_plans = {}
+
+def compile_struct(struct_class) -> StructPlan:
+    "Returns the StructPlan of an AnnotatedStruct class, creating it on first use"
+    plan = _struct_plans.get(struct_class)
+    if plan is None:
+        plan = StructPlan(struct_class)
+        _struct_plans[struct_class] = plan
+    return plan
+
 class AnnotatedStruct(Readable):
     """
     Defines a structure of binary data, which is defined by type hints.
 
     Reading the structure returns a copy of this object, rather than the object itself.
+    The type hints are compiled into a StructPlan the first time a class is used.
     """
     def __init__(self):
-        self.fields = []
-
-        hints = get_type_hints(self.__class__)
-        for name, readable in hints.items():
-            self.fields.append(name)
+        self.fields = list(compile_struct(self.__class__).names)
 
     def read(self, reader: StructReader):
-        result = copy.copy(self)
-
-        # Use the typehints to guide reading
-        hints = get_type_hints(self.__class__)
-        for name, readable in hints.items():
-            # As typehints are at the class level, we need to copy them if its a readable
-            if isinstance(readable, Readable):
-                readable = copy.copy(readable)
-
-            try:
-                value = reader.read_struct(readable)
-                setattr(result, name, value)
-            except Exception as ex:
-                classname = type(self).__name__
-                raise Exception(f"Failed to read prop {name} in {classname}") from ex
+        return compile_struct(self.__class__).read(self, reader)
 
-        return result
+    def layout(self):
+        return compile_struct(self.__class__).layout(self)
 
     def as_dict(self):
         return {
@@ -193,7 +362,18 @@ class MappedValue(Readable):
         self.warn = warn
 
     def read(self, reader: StructReader):
-        key = reader.read_struct(self.base)
+        return self.lookup(reader.read_struct(self.base))
+
+    def layout(self):
+        base = fixed_layout(self.base)
+        if base is None or base.count != 1:
+            return None
+        if base.convert is None:
+            return FixedLayout(base.fmt, 1, lambda values: self.lookup(values[0]))
+        return FixedLayout(base.fmt, 1, lambda values: self.lookup(base.convert(values)))
+
+    def lookup(self, key):
+        "Returns the mapped value of a key read from the data"
         try:
             return self.map[key]
         except KeyError:
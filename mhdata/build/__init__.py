@@ -5,4 +5,12 @@ This module takes the load results from the mhdata.load function,
 and can use it to create a build result
 """
 
-from .sql import build_sql_database
+from .sql import build_sql_database, rebuild_sql_database
+from .incremental import BuildRecord
+from .shards import build_sql_database_sharded
+from .update import update_sql_database, verify_sql_database
+from .optimize import optimize_database
+from .search import create_search_index, search_index_supported, search_unsupported_message
+from .snapshot import write_snapshot
+from .profile import BuildProfile
+from .cache import BuildCache, manifest_hash, read_manifest_hash, write_manifest_hash, clear_manifest_hash
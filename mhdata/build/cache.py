@@ -0,0 +1,173 @@
+"""
+A content-addressed cache of built databases.
+
+A build is identified by its manifest hash, which covers every file in source_data/,
+every file of the mhdata package (the schema mappings and the build code),
+the versions of the libraries that write the database, and the build options that change the output.
+The hash is stored in the built database, so a build whose output already matches can be skipped,
+and finished databases are kept in a cache directory under their hash, so they can be copied instead of rebuilt.
+The cache directory is kept under a maximum size by deleting the least recently used databases.
+"""
+
+import os
+import os.path
+import shutil
+import sqlite3
+import hashlib
+
+import sqlalchemy
+from sqlalchemy import Column, Text
+
+from mhdata.io import data_path
+
+# Bump whenever the way databases are built changes in a way not covered by the hashed files
+MANIFEST_VERSION = 1
+
+package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Table used to store the manifest hash in the built database. It is not part of the published schema.
+manifest_metadata = sqlalchemy.MetaData()
+
+manifest_table = sqlalchemy.Table('build_manifest', manifest_metadata,
+    Column('name', Text, primary_key=True),
+    Column('value', Text))
+
+def iter_files(root):
+    "Yields the path relative to root of every file under it in sorted order, skipping python caches"
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+        for filename in sorted(filenames):
+            if filename.endswith('.pyc'):
+                continue
+            yield os.path.relpath(os.path.join(dirpath, filename), root)
+
+def manifest_hash(options=None):
+    """Returns the sha1 hex digest identifying the output of a build.
+    Options is a dictionary of the build options that change the output, such as the page size."""
+    digest = hashlib.sha1()
+    digest.update(repr((MANIFEST_VERSION, sqlalchemy.__version__, sqlite3.sqlite_version)).encode('utf-8'))
+    digest.update(repr(sorted((options or {}).items())).encode('utf-8'))
+
+    for name, root in [('source_data', data_path), ('mhdata', package_path)]:
+        for relpath in iter_files(root):
+            # Paths are normalized so the hash is the same on every platform
+            digest.update(f'{name}/{relpath.replace(os.sep, "/")}\0'.encode('utf-8'))
+            with open(os.path.join(root, relpath), 'rb') as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+
+    return digest.hexdigest()
+
+def read_manifest_hash(filename):
+    "Returns the manifest hash stored in the database at filename, or None if it has none"
+    if not os.path.exists(filename):
+        return None
+
+    engine = sqlalchemy.create_engine(f'sqlite:///{filename}')
+    try:
+        with engine.connect() as connection:
+            if not sqlalchemy.inspect(connection).has_table(manifest_table.name):
+                return None
+            query = sqlalchemy.select(manifest_table.c.value).where(manifest_table.c.name == 'hash')
+            return connection.execute(query).scalar()
+    except sqlalchemy.exc.DatabaseError:
+        # Not a database, or a corrupt one
+        return None
+    finally:
+        engine.dispose()
+
+def write_manifest_hash(filename, value):
+    "Stores the manifest hash in the database at filename"
+    engine = sqlalchemy.create_engine(f'sqlite:///{filename}')
+    with engine.begin() as connection:
+        manifest_metadata.create_all(connection)
+        connection.execute(manifest_table.delete())
+        connection.execute(manifest_table.insert(), [{ 'name': 'hash', 'value': value }])
+    engine.dispose()
+
+def clear_manifest_hash(filename):
+    """Removes the manifest hash from the database at filename, if it has one.
+    Used when a database is changed by a build that didn't compute its hash"""
+    if not os.path.exists(filename):
+        return
+
+    engine = sqlalchemy.create_engine(f'sqlite:///{filename}')
+    with engine.begin() as connection:
+        if sqlalchemy.inspect(connection).has_table(manifest_table.name):
+            connection.execute(manifest_table.delete())
+    engine.dispose()
+
+class BuildCache:
+    """A directory of built databases, stored by manifest hash.
+    If max_size (in bytes) is given, the least recently used databases are deleted to stay under it."""
+
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key + '.db')
+
+    def get(self, key, output_filename):
+        """Copies the database cached under key to output_filename.
+        Returns false if there is no such database"""
+        cache_path = self._cache_path(key)
+        if not os.path.exists(cache_path):
+            return False
+
+        # Copy then rename, so an interrupted copy never leaves a partial output
+        temp_path = f'{output_filename}.{os.getpid()}.tmp'
+        shutil.copyfile(cache_path, temp_path)
+        os.replace(temp_path, output_filename)
+
+        # Mark the entry as recently used
+        os.utime(cache_path)
+        return True
+
+    def put(self, key, filename):
+        "Stores a copy of the database at filename under key, then evicts old entries"
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = self._cache_path(key)
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        shutil.copyfile(filename, temp_path)
+        os.replace(temp_path, cache_path)
+        self.evict(keep=key)
+
+    def entries(self):
+        "Returns a list of (last used time, size, path) of every cached database, oldest first"
+        if not os.path.isdir(self.cache_dir):
+            return []
+
+        results = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.db'):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            stat = os.stat(path)
+            results.append((stat.st_mtime, stat.st_size, path))
+        return sorted(results)
+
+    def evict(self, keep=None):
+        """Deletes the least recently used databases until the cache is under the maximum size.
+        The database stored under keep is never deleted. Returns the number of deleted databases."""
+        if self.max_size is None:
+            return 0
+
+        entries = self.entries()
+        total = sum(size for (_, size, _) in entries)
+        keep_path = self._cache_path(keep) if keep else None
+
+        deleted = 0
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            if path == keep_path:
+                continue
+            os.remove(path)
+            total -= size
+            deleted += 1
+        return deleted
+
+    def clear(self):
+        "Deletes all cached databases"
+        for _, _, path in self.entries():
+            os.remove(path)
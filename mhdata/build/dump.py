@@ -0,0 +1,56 @@
+"""
+Dumps the contents of a database as comparable values, used to check that two ways to build a database agree.
+"""
+
+import sqlite3
+import contextlib
+
+import mhdata.sql as db
+from .ids import sequence_columns
+
+def dump_database(filename, *, by_content=False):
+    """Returns the (schema, data) lines of the database.
+    If by_content is true, surrogate ids are replaced using dump_by_content"""
+    with contextlib.closing(sqlite3.connect(str(filename))) as conn:
+        lines = list(conn.iterdump())
+        data = dump_by_content(conn) if by_content else [l for l in lines if not l.startswith('CREATE')]
+    # Index creation order varies between runs, so the schema is compared unordered
+    return sorted(l for l in lines if l.startswith('CREATE')), data
+
+def dump_by_content(conn):
+    """Returns the sorted rows of every table, with the surrogate ids of IdAllocator replaced.
+    Rebuilt steps number their rows after the existing ones, so only the content of the rows can match a full build.
+    Recipe ids become the row that owns the recipe, and other ids their order in their sequence, as each is built by one step"""
+    def references(column):
+        return [(t, c) for t in db.Base.metadata.sorted_tables for c in t.columns
+                if c is column or any(fk.column is column for fk in c.foreign_keys)]
+
+    replacements = {}
+    for name, attribute in sequence_columns.items():
+        columns = references(attribute.property.columns[0])
+        if name == 'recipe':
+            owners = {}
+            for table, column in columns:
+                if table.name == 'recipe_item':
+                    continue
+                keys = ', '.join(f'"{c.name}"' for c in table.primary_key.columns)
+                for value, *key in conn.execute(f'SELECT "{column.name}", {keys} FROM "{table.name}"'):
+                    owners[value] = (table.name, column.name, *key)
+        else:
+            values = set()
+            for table, column in columns:
+                values.update(v for (v,) in conn.execute(f'SELECT "{column.name}" FROM "{table.name}"'))
+            owners = { value: rank for (rank, value) in enumerate(sorted(v for v in values if v is not None)) }
+        for table, column in columns:
+            replacements[(table.name, column.name)] = owners
+
+    result = {}
+    for table in db.Base.metadata.sorted_tables:
+        names = [c.name for c in table.columns]
+        rows = []
+        for row in conn.execute(f'SELECT * FROM "{table.name}"'):
+            rows.append(repr(tuple(
+                replacements[(table.name, name)].get(value, value) if (table.name, name) in replacements else value
+                for name, value in zip(names, row))))
+        result[table.name] = sorted(rows)
+    return result
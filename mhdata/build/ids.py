@@ -0,0 +1,50 @@
+"""
+Allocates the surrogate ids of the build in memory.
+
+Rows without an id in the source data (recipes, location items, hitzones, rewards...) are numbered
+by an IdAllocator shared by every build step, instead of by the database. Ids are handed out
+in build order, so a build always gives the same ids, and no step has to flush or query the session to get them.
+"""
+
+from sqlalchemy import func
+import mhdata.sql as db
+
+# The column numbered by each sequence. Recipes are shared by the armor, weapon, kinsect, and charm steps
+sequence_columns = {
+    'recipe': db.RecipeItem.recipe_id,
+    'location_item': db.LocationItem.id,
+    'location_camp': db.LocationCamp.id,
+    'monster_hitzone': db.MonsterHitzone.id,
+    'monster_break': db.MonsterBreak.id,
+    'monster_reward': db.MonsterReward.id,
+    'monster_habitat': db.MonsterHabitat.id,
+    'weapon_melody': db.WeaponMelody.id,
+    'quest_reward': db.QuestReward.id,
+}
+
+class IdAllocator:
+    "Hands out consecutive ids for each sequence of sequence_columns, starting at 1"
+
+    def __init__(self, start=None):
+        self._next = { name: 1 for name in sequence_columns }
+        self._next.update(start or {})
+        self._start = dict(self._next)
+
+    @classmethod
+    def from_database(cls, session):
+        """Returns an allocator continuing after the largest ids of an existing database.
+        Used when adding rows to a database, such as when rebuilding some of its steps"""
+        start = {}
+        for name, column in sequence_columns.items():
+            start[name] = (session.query(func.max(column)).scalar() or 0) + 1
+        return cls(start)
+
+    def next_id(self, sequence):
+        "Returns the next id of the sequence"
+        result = self._next[sequence]
+        self._next[sequence] = result + 1
+        return result
+
+    def allocated(self, sequence):
+        "Returns the number of ids handed out for the sequence, including ids not used by any row"
+        return self._next[sequence] - self._start[sequence]
@@ -0,0 +1,86 @@
+"""
+Support for rebuilding parts of an existing database.
+
+During a build, a BuildRecord remembers the maps read and the rows inserted by every build step.
+When maps are reloaded, only the steps that read them have to run again:
+their rows are deleted and the steps run against the existing database.
+"""
+
+import collections
+import contextlib
+
+import sqlalchemy
+from sqlalchemy import event
+
+from mhdata.sql import BulkSession
+
+class AccessRecorder:
+    "Wraps loaded data, recording the names of the attributes that are read"
+    def __init__(self, data):
+        self._data = data
+        self.accessed = set()
+
+    def __getattr__(self, name):
+        value = getattr(self._data, name)
+        self.accessed.add(name)
+        return value
+
+@contextlib.contextmanager
+def track_rows(session):
+    """Records the rows inserted by the session within the block.
+    Yields a dictionary of table -> list of primary key tuples"""
+    if isinstance(session, BulkSession):
+        with session.track_rows() as rows:
+            yield rows
+        return
+
+    rows = collections.defaultdict(list)
+
+    def on_persistent(session, instance):
+        state = sqlalchemy.inspect(instance)
+        rows[state.mapper.local_table].append(state.identity)
+
+    event.listen(session, 'pending_to_persistent', on_persistent)
+    try:
+        yield rows
+    finally:
+        event.remove(session, 'pending_to_persistent', on_persistent)
+
+class BuildRecord:
+    "The maps read and the rows inserted by each step of a build"
+
+    def __init__(self):
+        # Mapping of step name -> names of the maps it read, in build order
+        self.maps = collections.OrderedDict()
+
+        # Mapping of step name -> { table: [primary keys] }
+        self.rows = {}
+
+    @contextlib.contextmanager
+    def record_step(self, session, name, mhdata):
+        """Records the maps read and rows inserted by a build step within the block.
+        Yields the data that should be passed to the build step."""
+        recorder = AccessRecorder(mhdata)
+        with track_rows(session) as rows:
+            yield recorder
+            session.flush()
+
+        self.maps[name] = recorder.accessed
+        self.rows[name] = dict(rows)
+
+    def affected_steps(self, map_names):
+        "Returns the names of the steps that read any of the maps, in build order"
+        map_names = set(map_names)
+        return [name for (name, maps) in self.maps.items() if not maps.isdisjoint(map_names)]
+
+    def delete_rows(self, session, name, chunk_size=500):
+        "Deletes the rows inserted by a build step"
+        for table, keys in self.rows.pop(name, {}).items():
+            columns = list(table.primary_key.columns)
+            for start in range(0, len(keys), chunk_size):
+                chunk = keys[start:start+chunk_size]
+                if len(columns) == 1:
+                    condition = columns[0].in_([key[0] for key in chunk])
+                else:
+                    condition = sqlalchemy.tuple_(*columns).in_(chunk)
+                session.execute(table.delete().where(condition))
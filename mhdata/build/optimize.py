@@ -0,0 +1,62 @@
+"""
+Post-build stage that prepares a finished database for reading.
+
+Indexes used by the lookups of the app are created here instead of in the mappings,
+as building each index once after the data is loaded is faster than updating it on every insert.
+Afterwards the database is analyzed for the query planner, and vacuumed using the requested page size.
+"""
+
+import mhdata.sql as db
+
+def text_name_indexes():
+    "Returns an index on (lang_id, name) for every translation table, used to look up entries by name"
+    results = []
+    for table in db.Base.metadata.sorted_tables:
+        if table.name.endswith('_text') and 'lang_id' in table.c and 'name' in table.c:
+            results.append((table.name, ('lang_id', 'name')))
+    return results
+
+# Indexes created after the build, as (table name, columns) tuples.
+# Columns that are the first column of a primary key or already declared with index=True are not included.
+# Each index is at least twice as fast as a scan for its lookups (see the queries benchmark).
+# Lookups on small tables like item_combination and weapon_skill, and on weapon_type,
+# which matches hundreds of weapons, are not faster with an index and have none.
+query_indexes = text_name_indexes() + [
+    ('recipe_item', ('item_id',)),
+    ('weapon', ('previous_weapon_id',)),
+    ('weapon', ('create_recipe_id',)),
+    ('weapon', ('upgrade_recipe_id',)),
+    ('armor', ('armorset_id',)),
+    ('armor', ('recipe_id',)),
+    ('armor_skill', ('skilltree_id',)),
+    ('charm_skill', ('skilltree_id',)),
+    ('charm', ('recipe_id',)),
+    ('quest_monster', ('monster_id',)),
+]
+
+def index_name(table_name, columns):
+    "Returns the name of a query index, using the same naming as the indexes in the mappings"
+    return f"ix_{table_name}_{'_'.join(columns)}"
+
+def create_query_indexes(connection):
+    "Creates every index in query_indexes that doesn't exist yet"
+    for table_name, columns in query_indexes:
+        column_list = ', '.join(f'"{c}"' for c in columns)
+        connection.exec_driver_sql(
+            f'CREATE INDEX IF NOT EXISTS "{index_name(table_name, columns)}" ON "{table_name}" ({column_list})')
+
+def optimize_database(output_filename, *, page_size=4096):
+    "Creates the query indexes, analyzes and vacuums the database at output_filename"
+    engine = db.open_database_engine(output_filename)
+    with engine.connect() as connection:
+        create_query_indexes(connection)
+        connection.exec_driver_sql("ANALYZE")
+        connection.commit()
+
+        # The page size of an existing database only changes when it is vacuumed.
+        # Both must run outside of a transaction
+        connection.exec_driver_sql(f"PRAGMA page_size={int(page_size)}")
+        connection.exec_driver_sql("VACUUM")
+    engine.dispose()
+
+    print("Optimized database")
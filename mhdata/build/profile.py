@@ -0,0 +1,140 @@
+"""
+Records where a build spends its time and memory.
+
+A BuildProfile measures named stages of the build (loading, processing, validating,
+each build step, and committing). Every stage records its wall and cpu time,
+the peak memory of the process, and if a session is given, the rows written per table
+and the number of session flushes. The report is written as JSON, so that builds can be compared over time.
+"""
+
+import collections
+import contextlib
+import json
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+from mhdata.sql import BulkSession
+from .incremental import track_rows
+
+try:
+    import resource
+except ImportError:
+    # Not available on windows
+    resource = None
+
+def peak_rss_kb():
+    "Returns the peak resident memory of the process in kilobytes, or None if unavailable"
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+@contextlib.contextmanager
+def count_flushes(session):
+    """Counts the flushes of a session within the block.
+    Yields a list holding the count, which is updated when the block exits"""
+    result = [0]
+    if isinstance(session, BulkSession):
+        start = session.flush_count
+        try:
+            yield result
+        finally:
+            result[0] = session.flush_count - start
+        return
+
+    def on_flush(session, flush_context):
+        result[0] += 1
+
+    event.listen(session, 'after_flush', on_flush)
+    try:
+        yield result
+    finally:
+        event.remove(session, 'after_flush', on_flush)
+
+def profile_stage(profile, name, session=None):
+    "Returns profile.stage(name, session), or a context that does nothing if profile is None"
+    if profile is None:
+        return contextlib.nullcontext()
+    return profile.stage(name, session)
+
+class BuildProfile:
+    """Measurements of the stages of a build, in the order they ran.
+
+    If trace_memory is true, python allocations are traced using tracemalloc,
+    and the peak traced memory of each stage is recorded. Tracing slows down the build considerably.
+    Before python 3.9, tracemalloc's peak can't be reset, so the peak is of the traced build up to the end of the stage."""
+
+    def __init__(self, *, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name, session=None):
+        """Measures the code within the block as a stage of the build.
+        If a session is given, the rows it inserts are counted, and it is flushed when the block exits."""
+        result = collections.OrderedDict(name=name)
+        self.stages.append(result)
+
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+        with contextlib.ExitStack() as stack:
+            rows = flushes = None
+            if session is not None:
+                rows = stack.enter_context(track_rows(session))
+                flushes = stack.enter_context(count_flushes(session))
+
+            start_wall = time.perf_counter()
+            start_cpu = time.process_time()
+            yield result
+            if session is not None:
+                session.flush()
+
+        result['wall_time'] = time.perf_counter() - start_wall
+        result['cpu_time'] = time.process_time() - start_cpu
+        result['peak_rss_kb'] = peak_rss_kb()
+        if tracing:
+            result['peak_traced_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        if session is not None:
+            result['flushes'] = flushes[0]
+            result['rows'] = { table.name: len(keys) for (table, keys) in rows.items() }
+
+    @contextlib.contextmanager
+    def run(self):
+        "Starts memory tracing for the duration of the block, if enabled"
+        if not self.trace_memory or tracemalloc.is_tracing():
+            yield self
+            return
+
+        tracemalloc.start()
+        try:
+            yield self
+        finally:
+            tracemalloc.stop()
+
+    def to_dict(self):
+        "Returns the report as a dictionary"
+        rows = collections.Counter()
+        for stage in self.stages:
+            rows.update(stage.get('rows', {}))
+
+        return {
+            'stages': self.stages,
+            'wall_time': sum(stage['wall_time'] for stage in self.stages),
+            'cpu_time': sum(stage['cpu_time'] for stage in self.stages),
+            'peak_rss_kb': peak_rss_kb(),
+            'rows': dict(sorted(rows.items()))
+        }
+
+    def write(self, filename):
+        "Writes the report as JSON to filename"
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def print_summary(self):
+        "Prints the time taken by each stage"
+        for stage in self.stages:
+            rows = sum(stage.get('rows', {}).values())
+            print(f"{stage['name']}: {stage['wall_time']:.2f}s wall, {stage['cpu_time']:.2f}s cpu, {rows} rows")
@@ -0,0 +1,88 @@
+"""
+Post-build stage that creates the full text search index of a database.
+The index is derived from the translation tables, and is recreated from scratch every time.
+See mhdata.query.search for the tables and how they are searched.
+"""
+
+import sqlite3
+
+import mhdata.sql as db
+from mhdata.query.search import entry_table, trigram_table, word_table
+
+# The fts5 trigram tokenizer was added in sqlite 3.34
+search_sqlite_version = (3, 34, 0)
+
+def search_index_supported():
+    "Returns true if the sqlite library used by python can create the search index"
+    return sqlite3.sqlite_version_info >= search_sqlite_version
+
+def search_unsupported_message():
+    required = '.'.join(str(v) for v in search_sqlite_version)
+    return f"The search index requires sqlite {required} or newer, but python uses sqlite {sqlite3.sqlite_version}"
+
+# Entity types included in the search, as (entity, text table).
+# Texts of parts of entities (such as hitzones and camps) are not included
+search_entities = [
+    ('item', 'item_text'),
+    ('location', 'location_text'),
+    ('monster', 'monster_text'),
+    ('skilltree', 'skilltree_text'),
+    ('armorset', 'armorset_text'),
+    ('armorset_bonus', 'armorset_bonus_text'),
+    ('armor', 'armor_text'),
+    ('weapon', 'weapon_text'),
+    ('decoration', 'decoration_text'),
+    ('charm', 'charm_text'),
+    ('kinsect', 'kinsect_text'),
+    ('tool', 'tool_text'),
+    ('quest', 'quest_text'),
+]
+
+def create_search_index(output_filename):
+    """Creates (or recreates) the search tables of the database at output_filename. Returns the number of entries.
+    Raises an exception if the sqlite version is too old, see search_index_supported"""
+    if not search_index_supported():
+        raise Exception(search_unsupported_message())
+
+    tables = db.Base.metadata.tables
+    engine = db.open_database_engine(output_filename)
+    with engine.begin() as connection:
+        for table in (trigram_table, word_table, entry_table):
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{table}"')
+
+        connection.exec_driver_sql(f'''
+            CREATE TABLE "{entry_table}" (
+                rowid INTEGER PRIMARY KEY, entity TEXT NOT NULL, id INTEGER NOT NULL,
+                lang_id TEXT NOT NULL, name TEXT, description TEXT)''')
+
+        for entity, table_name in search_entities:
+            has_description = 'description' in tables[table_name].c
+            description = 't.description' if has_description else 'NULL'
+            en_description = 'en.description' if has_description else 'NULL'
+
+            # Rows equal to the english row are fallbacks, and are skipped
+            connection.exec_driver_sql(f'''
+                INSERT INTO "{entry_table}" (entity, id, lang_id, name, description)
+                SELECT ?, t.id, t.lang_id, t.name, {description}
+                FROM "{table_name}" t LEFT JOIN "{table_name}" en ON en.id = t.id AND en.lang_id = 'en'
+                WHERE t.name IS NOT NULL
+                    AND (t.lang_id = 'en' OR en.id IS NULL OR t.name IS NOT en.name
+                        OR {description} IS NOT {en_description})
+                ORDER BY t.id, t.lang_id''', (entity,))
+
+        # Both indexes read their texts from the entry table. Descriptions are only split into words,
+        # as a trigram index of every description would be larger than the rest of the database
+        content = f"content='{entry_table}', content_rowid='rowid'"
+        connection.exec_driver_sql(f'''
+            CREATE VIRTUAL TABLE "{trigram_table}" USING fts5(name, {content}, tokenize='trigram')''')
+        connection.exec_driver_sql(f'''
+            CREATE VIRTUAL TABLE "{word_table}" USING fts5(name, description, {content},
+                tokenize='unicode61 remove_diacritics 2')''')
+        for table in (trigram_table, word_table):
+            connection.exec_driver_sql(f'INSERT INTO "{table}"("{table}") VALUES (\'rebuild\')')
+
+        count = connection.exec_driver_sql(f'SELECT COUNT(*) FROM "{entry_table}"').scalar()
+    engine.dispose()
+
+    print(f"Created search index with {count} entries")
+    return count
@@ -0,0 +1,100 @@
+"""
+Builds the SQL database in parallel, by running each build step in a worker process.
+
+Every step writes its rows into its own temporary database (a shard), created using the bulk engine.
+The shards are then merged into the output database in build order, using ATTACH and INSERT ... SELECT.
+
+Build steps write disjoint tables, except for recipe_item. Each shard numbers its recipes
+using a new IdAllocator, starting at 1. When merging, recipe ids are offset by the number of recipe ids
+handed out by the previous steps, which gives the same ids as building the steps one after another.
+The largest merged recipe id isn't enough, as some recipe ids (such as of armor without recipe items) have no rows.
+"""
+
+import os.path
+import tempfile
+import concurrent.futures
+
+import sqlalchemy.orm
+import mhdata.sql as db
+
+from .itemtracker import ItemTracker
+from .ids import IdAllocator
+from .sql import build_steps, build_languages
+
+recipe_column = db.RecipeItem.__table__.c.recipe_id
+
+def is_recipe_column(column):
+    "Returns true if the column contains recipe ids"
+    return column is recipe_column or any(fk.column is recipe_column for fk in column.foreign_keys)
+
+# The loaded data in a worker process, set by init_worker
+_worker_data = None
+
+def init_worker(mhdata):
+    global _worker_data
+    _worker_data = mhdata
+
+def build_shard(name, shard_filename):
+    """Runs a single build step into a new database at shard_filename.
+    Returns the ids of the items marked by the item tracker, and the number of recipe ids handed out"""
+    mhdata = _worker_data
+    sessionbuilder = db.bulk_sessionmaker(db.recreate_database(shard_filename, build_settings=True))
+
+    item_tracker = ItemTracker(mhdata)
+    unmarked = set(item_tracker.all_items.keys())
+    ids = IdAllocator()
+    with db.session_scope(sessionbuilder) as session:
+        build_steps[name](session, mhdata, item_tracker, ids)
+
+    return unmarked - set(item_tracker.all_items.keys()), ids.allocated('recipe')
+
+def merge_shard(connection, shard_filename, offset=0):
+    "Inserts every row of a shard into the database of the connection, adding offset to its recipe ids"
+    connection.exec_driver_sql("ATTACH DATABASE ? AS shard", (shard_filename,))
+
+    for table in db.Base.metadata.sorted_tables:
+        columns = []
+        for column in table.columns:
+            if offset and is_recipe_column(column):
+                columns.append(f'"{column.name}" + {offset}')
+            else:
+                columns.append(f'"{column.name}"')
+
+        connection.exec_driver_sql(
+            f'INSERT INTO main."{table.name}" SELECT {", ".join(columns)} FROM shard."{table.name}"')
+
+    # Databases can only be detached outside of a transaction
+    connection.commit()
+    connection.exec_driver_sql("DETACH DATABASE shard")
+
+def build_sql_database_sharded(output_filename, mhdata, *, workers=None):
+    """Builds a SQLite database and outputs to output_filename, building each step in a worker process.
+    Use workers=None to use one process per cpu. The result is the same as build_sql_database."""
+    engine = db.recreate_database_engine(output_filename, build_settings=True)
+    with db.session_scope(sqlalchemy.orm.sessionmaker(bind=engine)) as session:
+        build_languages(session)
+
+    item_tracker = ItemTracker(mhdata)
+
+    with tempfile.TemporaryDirectory() as shard_dir:
+        names = list(build_steps.keys())
+        shard_filenames = [os.path.join(shard_dir, f'{name}.db') for name in names]
+
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker, initargs=(mhdata,)) as executor:
+            # map() returns results in build order, so shards are merged while later ones are still building
+            results = executor.map(build_shard, names, shard_filenames)
+
+            with engine.connect() as connection:
+                recipe_offset = 0
+                for name, shard_filename, (marked, recipe_count) in zip(names, shard_filenames, results):
+                    merge_shard(connection, shard_filename, recipe_offset)
+                    recipe_offset += recipe_count
+                    for item_id in marked:
+                        item_tracker.mark_encountered_id(item_id)
+                    print(f"Merged {name}")
+                connection.commit()
+
+    engine.dispose()
+    item_tracker.print_unmarked()
+    print("Finished build")
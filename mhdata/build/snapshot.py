@@ -0,0 +1,166 @@
+"""
+Writes a columnar snapshot of the loaded data, for consumers that read whole tables.
+See mhdata.query.snapshot for the layout of the snapshot and how to read it.
+
+Every family is written by a streaming writer, which converts rows to record batches of batch_size rows.
+Column types are found by a first pass over the entries, so the rows are never all in memory.
+"""
+
+import os
+from decimal import Decimal
+
+from mhdata import cfg, typecheck
+from mhdata.query.snapshot import pa, require_pyarrow, snapshot_path, snapshot_families
+
+# Families written to the snapshot, as (family, data map attribute).
+# List fields are written as separate families, such as monster_rewards
+snapshot_maps = [
+    ('item', 'item_map'),
+    ('location', 'location_map'),
+    ('skill', 'skill_map'),
+    ('charm', 'charm_map'),
+    ('monster_reward_condition', 'monster_reward_conditions_map'),
+    ('monster', 'monster_map'),
+    ('armor', 'armor_map'),
+    ('armorset', 'armorset_map'),
+    ('armorset_bonus', 'armorset_bonus_map'),
+    ('weapon', 'weapon_map'),
+    ('weapon_melody', 'weapon_melodies'),
+    ('kinsect', 'kinsect_map'),
+    ('decoration', 'decoration_map'),
+    ('quest', 'quest_map'),
+    ('tool', 'tool_map'),
+]
+
+def is_translation(value):
+    "Returns true if the value is a dictionary of texts by language"
+    return typecheck.is_dict(value) and value and all(key in cfg.all_languages for key in value)
+
+def flatten_entry(entry, prefix='', row=None, lists=None):
+    """Flattens an entry into a (row, lists) pair.
+    Translations become a column per language, such as name_en, and other dictionaries
+    become a column per key, such as craft_item1_name. Lists are returned separately by field"""
+    row = {} if row is None else row
+    lists = {} if lists is None else lists
+
+    for key, value in entry.items():
+        name = prefix + key
+        if is_translation(value):
+            for lang in cfg.supported_languages:
+                row[f'{name}_{lang}'] = value.get(lang)
+        elif typecheck.is_dict(value):
+            flatten_entry(value, prefix=name + '_', row=row, lists=lists)
+        elif typecheck.is_flat_iterable(value):
+            lists[name] = value
+        else:
+            row[name] = value
+
+    return row, lists
+
+def family_rows(family, data_map):
+    "Yields the (family, row) pairs of every entry of the data map, including the rows of its list fields"
+    for entry in data_map.values():
+        row, lists = flatten_entry(entry)
+        yield family, row
+
+        for field, values in lists.items():
+            for value in values:
+                child_row, child_lists = flatten_entry(value if typecheck.is_dict(value) else {'value': value})
+                if child_lists:
+                    raise Exception(f"Unsupported nested list {field} in {family} {entry['id']}")
+                yield f'{family}_{field}', { f'{family}_id': entry['id'], **child_row }
+
+def arrow_type(types):
+    "Returns the arrow type of a column containing values of the python types"
+    if not types or str in types:
+        return pa.string()
+    if types == {bool}:
+        return pa.bool_()
+    if types <= {bool, int}:
+        return pa.int64()
+    if all(issubclass(t, (int, float, Decimal)) for t in types):
+        return pa.float64()
+    raise Exception("Unsupported column types " + ', '.join(t.__name__ for t in types))
+
+# Python conversion of the values of each arrow type. Columns mixing strings and numbers become strings
+_converters = {
+    'string': lambda value: value if isinstance(value, str) else str(value),
+    'bool': bool,
+    'int64': int,
+    'double': float
+}
+
+class SnapshotWriter:
+    "Writes rows to an Arrow IPC file as they are added, as a record batch every batch_size rows"
+
+    def __init__(self, filename, schema, batch_size=1024):
+        self.schema = schema
+        self.batch_size = batch_size
+        self.converters = [_converters[str(field.type)] for field in schema]
+        self.count = 0
+        self._rows = []
+        self._sink = pa.OSFile(filename, 'wb')
+        self._writer = pa.ipc.new_file(self._sink, schema)
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+
+        arrays = []
+        for field, convert in zip(self.schema, self.converters):
+            values = [row.get(field.name) for row in self._rows]
+            arrays.append(pa.array([None if v is None else convert(v) for v in values], type=field.type))
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+
+        self.count += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        self._sink.close()
+
+def write_family(directory, family, data_map, batch_size=1024):
+    "Writes the family and its list fields to the snapshot directory. Returns the number of rows of each file"
+    # Columns (and the types of their values) by family, in order of first appearance
+    columns = {}
+    for name, row in family_rows(family, data_map):
+        table_columns = columns.setdefault(name, {})
+        for key, value in row.items():
+            types = table_columns.setdefault(key, set())
+            if value is not None:
+                types.add(type(value))
+
+    writers = {}
+    try:
+        for name, table_columns in columns.items():
+            schema = pa.schema([(key, arrow_type(types)) for key, types in table_columns.items()])
+            writers[name] = SnapshotWriter(snapshot_path(directory, name), schema, batch_size)
+
+        for name, row in family_rows(family, data_map):
+            writers[name].write(row)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return { name: writer.count for name, writer in writers.items() }
+
+def write_snapshot(directory, mhdata, *, batch_size=1024):
+    """Writes a columnar snapshot of the loaded data to a directory, replacing any previous snapshot.
+    Returns the number of rows of each family"""
+    require_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    for family in snapshot_families(directory):
+        os.remove(snapshot_path(directory, family))
+
+    counts = {}
+    for family, attribute in snapshot_maps:
+        counts.update(write_family(directory, family, getattr(mhdata, attribute), batch_size))
+
+    print(f"Wrote snapshot of {len(counts)} families to {directory}")
+    return counts
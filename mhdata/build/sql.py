@@ -1,5 +1,5 @@
+import collections
 import sqlalchemy.orm
-from sqlalchemy import func
 import mhdata.sql as db
 
 from mhdata import cfg
@@ -9,6 +9,10 @@ from mhdata.load import datafn
 
 from .objectindex import ObjectIndex
 from .itemtracker import ItemTracker
+from .ids import IdAllocator
+from .incremental import BuildRecord
+from .profile import BuildProfile, profile_stage
+from .translations import TextRows
 
 def get_translated(obj, attr, lang):
     if attr not in obj:
@@ -16,49 +20,96 @@ def get_translated(obj, attr, lang):
     value = obj[attr].get(lang, None)
     return value or obj[attr]['en']
 
-def calculate_next_recipe_id(session):
-    current_max = session.query(func.max(db.RecipeItem.recipe_id)).scalar() 
-    if not current_max:
-        return 1
-    return current_max + 1
-
-def build_sql_database(output_filename, mhdata):
-    "Builds a SQLite database and outputs to output_filename"
-    sessionbuilder = db.recreate_database(output_filename)
+# Build steps in build order, registered using the build_step decorator.
+# Each step is called with the session, the loaded data, the item tracker,
+# and the IdAllocator numbering rows without an id of their own.
+build_steps = collections.OrderedDict()
+
+def build_step(name):
+    "Decorator to register a function that builds part of the database"
+    def deco(fn):
+        build_steps[name] = fn
+        return fn
+    return deco
+
+def build_sql_database(output_filename, mhdata, *,
+        record: BuildRecord = None, bulk=False, profile: BuildProfile = None):
+    """Builds a SQLite database and outputs to output_filename.
+    If a BuildRecord is given, it records the build so that parts of it can be rebuilt later.
+    If a BuildProfile is given, each build step and the commit are measured as stages.
+
+    If bulk is true, rows are written using bulk inserts instead of the ORM unit of work,
+    and the database uses build time settings. The resulting database is the same."""
+    sessionbuilder = db.recreate_database(output_filename, build_settings=bulk)
+    if bulk:
+        sessionbuilder = db.bulk_sessionmaker(sessionbuilder)
 
     with db.session_scope(sessionbuilder) as session:
-        # Add languages before starting the build
-        for language in cfg.supported_languages:
-            session.add(db.Language(
-                id=language,
-                name=cfg.all_languages[language],
-                is_complete=(language not in cfg.incomplete_languages)
-            ))
+        # Add languages before starting the build.
+        # They are flushed so that they aren't recorded as part of the first step
+        with profile_stage(profile, 'languages', session):
+            build_languages(session)
+        session.flush()
 
         # Create object used for detecting if an item is unmapped
         item_tracker = ItemTracker(mhdata)
+        ids = IdAllocator()
 
         # Build the individual components
         # These functions are defined lower down in the file
-        build_items(session, mhdata, item_tracker)
-        build_locations(session, mhdata, item_tracker)
-        build_monsters(session, mhdata, item_tracker)
-        build_skills(session, mhdata)
-        build_armor(session, mhdata)
-        build_weapons(session, mhdata)
-        build_kinsects(session, mhdata)
-        build_decorations(session, mhdata)
-        build_charms(session, mhdata)
-        build_tools(session, mhdata)
-        build_quests(session, mhdata, item_tracker)
+        for name, build_fn in build_steps.items():
+            with profile_stage(profile, name, session):
+                if record is None:
+                    build_fn(session, mhdata, item_tracker, ids)
+                    continue
+                with record.record_step(session, name, mhdata) as recorded_data:
+                    build_fn(session, recorded_data, item_tracker, ids)
 
         item_tracker.print_unmarked()
+
+        with profile_stage(profile, 'commit'):
+            session.commit()
         
     print("Finished build")
 
+def build_languages(session):
+    for language in cfg.supported_languages:
+        session.add(db.Language(
+            id=language,
+            name=cfg.all_languages[language],
+            is_complete=(language not in cfg.incomplete_languages)
+        ))
+
+def rebuild_sql_database(output_filename, mhdata, record: BuildRecord, map_names, *, bulk=False):
+    """Rebuilds the parts of an existing database that were built from the given maps.
+    The record must be from the build that created the database, and is updated by the rebuild.
+    If bulk is true, rows are written using bulk inserts.
+    Returns the names of the rebuilt steps."""
+    sessionbuilder = db.open_database(output_filename)
+    if bulk:
+        sessionbuilder = db.bulk_sessionmaker(sessionbuilder)
+    rebuilt_steps = record.affected_steps(map_names)
+
+    with db.session_scope(sessionbuilder) as session:
+        # Unlinked items are only reported by full builds
+        item_tracker = ItemTracker(mhdata)
+
+        # New rows are numbered after the existing ones, so they can't collide with rows of other steps
+        ids = IdAllocator.from_database(session)
 
-def build_items(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker):
+        for name in rebuilt_steps:
+            record.delete_rows(session, name)
+            with record.record_step(session, name, mhdata) as recorded_data:
+                build_steps[name](session, recorded_data, item_tracker, ids)
+            print(f"Rebuilt {name}")
+
+    return rebuilt_steps
+
+
+@build_step('items')
+def build_items(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
     # Save basic item data first
+    item_texts = TextRows(db.ItemText, { 'name': 'name', 'description': 'description' })
     for entry in mhdata.item_map.values():
         item = db.Item(id=entry.id)
         item.category = entry['category']
@@ -71,15 +122,11 @@ def build_items(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTrac
         item.icon_name = entry['icon_name']
         item.icon_color = entry['icon_color']
 
-        for language in cfg.supported_languages:
-            item.translations.append(db.ItemText(
-                lang_id=language,
-                name=get_translated(entry, 'name', language),
-                description=get_translated(entry, 'description', language),
-            ))
-
+        item_texts.add(entry.id, entry)
         session.add(item)
 
+    item_texts.write(session)
+
     # Now save item combination data
     for entry in mhdata.item_combinations:
         result_id = mhdata.item_map.id_of('en', entry['result'])
@@ -95,17 +142,13 @@ def build_items(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTrac
     
     print("Built Items")
 
-def build_locations(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker):
+@build_step('locations')
+def build_locations(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
+    location_texts = TextRows(db.Location, { 'name': 'name' })
     for order_id, entry in enumerate(mhdata.location_map.values()):
         location_name = entry['name']['en']
 
-        for language in cfg.supported_languages:
-            session.add(db.Location(
-                id=entry.id,
-                order_id=order_id,
-                lang_id=language,
-                name=get_translated(entry, 'name', language),
-            ))
+        location_texts.add(entry.id, entry, order_id=order_id)
 
         for item_entry in entry['items']:
             item_lang = item_entry['item_lang']
@@ -115,6 +158,7 @@ def build_locations(session : sqlalchemy.orm.Session, mhdata, item_tracker: Item
             item_tracker.mark_encountered_id(item_id)
 
             session.add(db.LocationItem(
+                id=ids.next_id('location_item'),
                 location_id=entry.id,
                 area=item_entry['area'],
                 rank=item_entry['rank'],
@@ -127,30 +171,34 @@ def build_locations(session : sqlalchemy.orm.Session, mhdata, item_tracker: Item
         for camp in entry['camps']:
             for language in cfg.supported_languages:
                 session.add(db.LocationCamp(
+                    id=ids.next_id('location_camp'),
                     location_id=entry.id,
                     lang_id = language,
                     name = get_translated(camp, 'name', language),
                     area = camp['area']
                 ))
+
+    location_texts.write(session)
             
     print("Built locations")
 
-def build_monsters(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker):
+@build_step('monsters')
+def build_monsters(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
     item_map = mhdata.item_map
     location_map = mhdata.location_map
     monster_map = mhdata.monster_map
     monster_reward_conditions_map = mhdata.monster_reward_conditions_map
 
     # Save conditions first
+    condition_texts = TextRows(db.MonsterRewardConditionText, { 'name': 'name' })
     for condition_id, entry in monster_reward_conditions_map.items():
-        for language in cfg.supported_languages:
-            session.add(db.MonsterRewardConditionText(
-                id=condition_id,
-                lang_id=language,
-                name=get_translated(entry, 'name', language),
-            ))
+        condition_texts.add(condition_id, entry)
+    condition_texts.write(session)
 
     # Save monsters
+    monster_texts = TextRows(db.MonsterText, { 'name': 'name', 'description': 'description' })
+    hitzone_texts = TextRows(db.MonsterHitzoneText, { 'name': 'hitzone' })
+    break_texts = TextRows(db.MonsterBreakText, { 'part_name': 'part' })
     for order_id, entry in enumerate(monster_map.values()):
         monster = db.Monster(
             id=entry.id,
@@ -194,18 +242,14 @@ def build_monsters(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemT
                     setattr(monster, 'alt_weakness_'+element, value)
 
         # Save language data
-        for language in cfg.supported_languages:
-            monster.translations.append(db.MonsterText(
-                lang_id=language,
-                name=get_translated(entry, 'name', language),
-                ecology=entry['ecology_en'],
-                description=get_translated(entry, 'description', language),
-                alt_state_description=alt_state_description
-            ))
+        monster_texts.add(entry.id, entry,
+            ecology=entry['ecology_en'],
+            alt_state_description=alt_state_description)
 
         # Save hitzones
         for hitzone_data in entry.get('hitzones', []):
             hitzone = db.MonsterHitzone(
+                id=ids.next_id('monster_hitzone'),
                 cut=hitzone_data['cut'],
                 impact=hitzone_data['impact'],
                 shot=hitzone_data['shot'],
@@ -216,30 +260,20 @@ def build_monsters(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemT
                 dragon=hitzone_data['dragon'],
                 ko=hitzone_data['ko'])
 
-            for language in cfg.supported_languages:
-                part_name = get_translated(hitzone_data, 'hitzone', language)
-                hitzone.translations.append(db.MonsterHitzoneText(
-                    lang_id=language,
-                    name=part_name
-                ))
-
+            hitzone_texts.add(hitzone.id, hitzone_data)
             monster.hitzones.append(hitzone)
 
         # Save breaks
         for break_data in entry.get('breaks', []):
             breakzone = db.MonsterBreak(
+                id=ids.next_id('monster_break'),
                 flinch=break_data['flinch'],
                 wound=break_data['wound'],
                 sever=break_data['sever'],
                 extract=break_data['extract']
             )
 
-            for language in cfg.supported_languages:
-                breakzone.translations.append(db.MonsterBreakText(
-                    lang_id=language,
-                    part_name=get_translated(break_data, 'part', language),
-                ))
-
+            break_texts.add(breakzone.id, break_data)
             monster.breaks.append(breakzone)
 
         # Save ailments
@@ -281,6 +315,7 @@ def build_monsters(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemT
             item_tracker.mark_encountered_id(item_id)
 
             monster.rewards.append(db.MonsterReward(
+                id=ids.next_id('monster_reward'),
                 condition_id=condition_id,
                 rank=rank,
                 item_id=item_id,
@@ -295,6 +330,7 @@ def build_monsters(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemT
             ensure(location_id, "Invalid location name " + location_name)
 
             monster.habitats.append(db.MonsterHabitat(
+                id=ids.next_id('monster_habitat'),
                 location_id=location_id,
                 start_area=habitat_data['start_area'],
                 move_area=habitat_data['move_area'],
@@ -304,11 +340,17 @@ def build_monsters(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemT
         # Complete - add to session
         session.add(monster)
 
+    monster_texts.write(session)
+    hitzone_texts.write(session)
+    break_texts.write(session)
+
     print("Built Monsters")
 
-def build_skills(session : sqlalchemy.orm.Session, mhdata):
+@build_step('skills')
+def build_skills(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
     skill_map = mhdata.skill_map
 
+    skilltree_texts = TextRows(db.SkillTreeText, { 'name': 'name', 'description': 'description' })
     for skill_entry in skill_map.values():
         skilltree = db.SkillTree(
             id=skill_entry.id,
@@ -317,13 +359,9 @@ def build_skills(session : sqlalchemy.orm.Session, mhdata):
             secret=skill_entry['secret'] or 0,
             unlocks_id=skill_map.id_of('en', skill_entry['unlocks']))
 
-        for language in cfg.supported_languages:
-            skilltree.translations.append(db.SkillTreeText(
-                lang_id=language,
-                name=get_translated(skill_entry, 'name', language),
-                description=get_translated(skill_entry, 'description', language)
-            ))
+        skilltree_texts.add(skill_entry.id, skill_entry)
 
+        for language in cfg.supported_languages:
             for effect in skill_entry['levels']:
                 skilltree.skills.append(db.Skill(
                     lang_id=language,
@@ -332,10 +370,13 @@ def build_skills(session : sqlalchemy.orm.Session, mhdata):
                 ))
 
         session.add(skilltree)
+
+    skilltree_texts.write(session)
     
     print("Built Skills")
 
-def build_armor(session : sqlalchemy.orm.Session, mhdata):
+@build_step('armor')
+def build_armor(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
     item_map = mhdata.item_map
     skill_map = mhdata.skill_map
     armorset_map = mhdata.armorset_map
@@ -348,13 +389,9 @@ def build_armor(session : sqlalchemy.orm.Session, mhdata):
 
     # Write entries from armor set bonuses
     # These are written first as they are "linked to"
+    bonus_texts = TextRows(db.ArmorSetBonusText, { 'name': 'name' })
     for bonus_entry in armorset_bonus_map.values():
-        for language in cfg.supported_languages:
-            session.add(db.ArmorSetBonusText(
-                id=bonus_entry.id,
-                lang_id=language,
-                name=get_translated(bonus_entry, 'name', language)
-            ))
+        bonus_texts.add(bonus_entry.id, bonus_entry)
         
         for skill_name, required in datafn.iter_setbonus_skills(bonus_entry):
             skill_id = skill_map.id_of('en', skill_name)
@@ -364,7 +401,10 @@ def build_armor(session : sqlalchemy.orm.Session, mhdata):
                 required=required
             ))
 
+    bonus_texts.write(session)
+
     # Write entries for armor sets
+    armorset_texts = TextRows(db.ArmorSetText, { 'name': 'name' })
     for set_id, entry in armorset_map.items():
         armorset_bonus_id = None
 
@@ -382,12 +422,7 @@ def build_armor(session : sqlalchemy.orm.Session, mhdata):
         if entry['monster']:
             armorset.monster_id = mhdata.monster_map.id_of('en', entry['monster'])
         
-        for language in cfg.supported_languages:
-            armorset.translations.append(db.ArmorSetText(
-                lang_id=language,
-                name=get_translated(entry, 'name', language)
-            ))
-
+        armorset_texts.add(set_id, entry)
         session.add(armorset)
 
         # Populate reverse map (to allow armor to link to armorset)
@@ -398,10 +433,10 @@ def build_armor(session : sqlalchemy.orm.Session, mhdata):
             armor_reverse_id = mhdata.armor_map.id_of('en', entry[part])
             armor_to_armorset[armor_reverse_id] = set_id
 
-    # Store recipe id to start from for armor
-    next_recipe_id = calculate_next_recipe_id(session)
+    armorset_texts.write(session)
 
     # Write entries for armor
+    armor_texts = TextRows(db.ArmorText, { 'name': 'name' })
     for order_id, entry in enumerate(armor_map.values()):
         armor_name_en = entry.name('en')
 
@@ -429,11 +464,7 @@ def build_armor(session : sqlalchemy.orm.Session, mhdata):
         armor.armorset_id = armorset_id
         armor.armorset_bonus_id = armorset_to_bonus.get(armorset_id, None)
 
-        for language in cfg.supported_languages:
-            armor.translations.append(db.ArmorText(
-                lang_id=language, 
-                name=get_translated(entry, 'name', language),
-            ))
+        armor_texts.add(entry.id, entry)
 
         # Armor Skills
         for skill, level in datafn.iter_skill_levels(entry['skills']):
@@ -443,22 +474,24 @@ def build_armor(session : sqlalchemy.orm.Session, mhdata):
                 level=level
             ))
 
-        # Armor Crafting
+        # Armor Crafting. Every armor has a recipe id, even without recipe items
+        recipe_id = ids.next_id('recipe')
         for item_name, quantity in datafn.iter_armor_recipe(entry):
             item_id = item_map.id_of('en', item_name)
             armor.craft_items.append(db.RecipeItem(
-                recipe_id=next_recipe_id,
+                recipe_id=recipe_id,
                 item_id=item_id,
                 quantity=quantity
             ))
 
-        next_recipe_id += 1
-
         session.add(armor)
 
+    armor_texts.write(session)
+
     print("Built Armor")
 
-def build_weapons(session : sqlalchemy.orm.Session, mhdata):
+@build_step('weapons')
+def build_weapons(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
     item_map = mhdata.item_map
     weapon_map = mhdata.weapon_map
 
@@ -519,8 +552,10 @@ def build_weapons(session : sqlalchemy.orm.Session, mhdata):
         session.add(ammo)
 
     # Save all weapon melodies
+    melody_texts = TextRows(db.WeaponMelodyText, { 'name': 'name', 'effect1': 'effect1', 'effect2': 'effect2' })
     for melody_entry in mhdata.weapon_melodies.values():
         melody = db.WeaponMelody(
+            id=ids.next_id('weapon_melody'),
             base_duration=melody_entry['base_duration'],
             base_extension=melody_entry['base_extension'],
             m1_duration=melody_entry['m1_duration'],
@@ -529,13 +564,7 @@ def build_weapons(session : sqlalchemy.orm.Session, mhdata):
             m2_extension=melody_entry['m2_extension']
         )
 
-        for language in cfg.supported_languages:
-            melody.translations.append(db.WeaponMelodyText(
-                lang_id=language,
-                name=get_translated(melody_entry, 'name', language),
-                effect1=get_translated(melody_entry, 'effect1', language),
-                effect2=get_translated(melody_entry, 'effect2', language)
-            ))
+        melody_texts.add(melody.id, melody_entry)
 
         for note_entry in melody_entry['notes']:
             melody.notes.append(db.WeaponMelodyNotes(
@@ -544,6 +573,8 @@ def build_weapons(session : sqlalchemy.orm.Session, mhdata):
 
         session.add(melody)
 
+    melody_texts.write(session)
+
     # Prepass to determine which weapons are "final"
     # All items that are a previous to another are "not final"
     all_final = set(weapon_map.keys())
@@ -556,10 +587,8 @@ def build_weapons(session : sqlalchemy.orm.Session, mhdata):
         except KeyError:
             pass
 
-    # Query next recipe id beforehand
-    next_recipe_id = calculate_next_recipe_id(session)
-
     # now iterate over actual weapons
+    weapon_texts = TextRows(db.WeaponText, { 'name': 'name' })
     for idx, entry in enumerate(weapon_map.values()):
         weapon_id = entry.id
         weapon_type = entry['weapon_type']
@@ -571,11 +600,7 @@ def build_weapons(session : sqlalchemy.orm.Session, mhdata):
         )
         
         # Add language translations
-        for language in cfg.supported_languages:
-            weapon.translations.append(db.WeaponText(
-                lang_id=language,
-                name=get_translated(entry, 'name', language)
-            ))
+        weapon_texts.add(weapon_id, entry)
 
         weapon.category = entry['category']
         weapon.rarity = entry['rarity']
@@ -616,23 +641,22 @@ def build_weapons(session : sqlalchemy.orm.Session, mhdata):
 
         # Add crafting/upgrade recipes
         for recipe in entry.get('craft', {}):
+            recipe_id = ids.next_id('recipe')
             recipe_type = recipe['type']
             if recipe_type == "Create":
                 weapon.craftable = True
-                weapon.create_recipe_id = next_recipe_id
+                weapon.create_recipe_id = recipe_id
             else:
-                weapon.upgrade_recipe_id = next_recipe_id
+                weapon.upgrade_recipe_id = recipe_id
                 
             for item, quantity in datafn.iter_recipe(recipe):
                 item_id = item_map.id_of("en", item)
                 session.add(db.RecipeItem(
-                    recipe_id=next_recipe_id,
+                    recipe_id=recipe_id,
                     item_id=item_id,
                     quantity=quantity
                 ))
 
-            next_recipe_id += 1
-
         # Bow data (if any)
         if entry.get("bow", None):
             bow_data = entry['bow']
@@ -664,9 +688,12 @@ def build_weapons(session : sqlalchemy.orm.Session, mhdata):
 
         session.add(weapon)
 
+    weapon_texts.write(session)
+
     print("Built Weapons")
 
-def build_kinsects(session: sqlalchemy.orm.Session, mhdata):
+@build_step('kinsects')
+def build_kinsects(session: sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
     # Prepass to determine which entries are "final"
     # Those that are a previous to another are "not final"
     all_final = set(mhdata.kinsect_map.keys())
@@ -679,10 +706,8 @@ def build_kinsects(session: sqlalchemy.orm.Session, mhdata):
         except KeyError:
             pass
 
-    # Store next recipe id ahead of time
-    next_recipe_id = calculate_next_recipe_id(session)
-
     # Save kinsects
+    kinsect_texts = TextRows(db.KinsectText, { 'name': 'name' })
     for entry in mhdata.kinsect_map.values():
         kinsect = db.Kinsect(
             id=entry.id,
@@ -697,36 +722,36 @@ def build_kinsects(session: sqlalchemy.orm.Session, mhdata):
         )
         
         # Add language translations
-        for language in cfg.supported_languages:
-            kinsect.translations.append(db.KinsectText(
-                lang_id=language,
-                name=get_translated(entry, 'name', language)
-            ))
+        kinsect_texts.add(entry.id, entry)
 
         # Save kinsect recipe
         recipe = entry.get('craft', None)
         if recipe:
+            recipe_id = ids.next_id('recipe')
             for item, quantity in datafn.iter_recipe(recipe):
                 item_id = mhdata.item_map.id_of("en", item)
                 ensure(item_id, f"Kinsect {entry.name('en')} refers to " +
                     f"item {item}, which doesn't exist.")
                 kinsect.craft_items.append(db.RecipeItem(
-                    recipe_id=next_recipe_id,
+                    recipe_id=recipe_id,
                     item_id=item_id,
                     quantity=quantity
                 ))
-            next_recipe_id += 1
 
         session.add(kinsect)
 
+    kinsect_texts.write(session)
+
     print("Built Kinsects")
 
-def build_decorations(session : sqlalchemy.orm.Session, mhdata):
+@build_step('decorations')
+def build_decorations(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
     "Performs the build process for decorations. Must be done after skills"
 
     skill_map = mhdata.skill_map
     decoration_map = mhdata.decoration_map
 
+    decoration_texts = TextRows(db.DecorationText, { 'name': 'name' })
     for decoration_id, entry in decoration_map.items():
         skills = list(datafn.iter_skill_levels(entry, amount=2, pad=True))
         ensure("chances" in entry, "Missing chance data for " + entry.name('en'))
@@ -749,24 +774,20 @@ def build_decorations(session : sqlalchemy.orm.Session, mhdata):
             sealed_feystone_percent=entry['chances']['sealed'],
         )
 
-        for language in cfg.supported_languages:
-            decoration.translations.append(db.DecorationText(
-                lang_id=language,
-                name=get_translated(entry, 'name', language)
-            ))
-
+        decoration_texts.add(decoration_id, entry)
         session.add(decoration)
 
+    decoration_texts.write(session)
+
     print("Built Decorations")
 
-def build_charms(session : sqlalchemy.orm.Session, mhdata):
+@build_step('charms')
+def build_charms(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
     item_map = mhdata.item_map
     skill_map = mhdata.skill_map
     charm_map = mhdata.charm_map
 
-    # Store next recipe id ahead of time
-    next_recipe_id = calculate_next_recipe_id(session)
-
+    charm_texts = TextRows(db.CharmText, { 'name': 'name' })
     for order_id, entry in enumerate(charm_map.values()):
         # Note: previous is ok to be None
         previous = charm_map.id_of('en', entry['previous_en'])
@@ -778,11 +799,7 @@ def build_charms(session : sqlalchemy.orm.Session, mhdata):
             rarity=entry['rarity']
         )
 
-        for language in cfg.supported_languages:
-            charm.translations.append(db.CharmText(
-                lang_id=language,
-                name=get_translated(entry, 'name', language)
-            ))
+        charm_texts.add(entry.id, entry)
 
         # Add charm skills
         for skill_en, level in datafn.iter_skill_levels(entry, amount=2):
@@ -797,23 +814,27 @@ def build_charms(session : sqlalchemy.orm.Session, mhdata):
 
         # Add Charm Recipe
         if entry.get('craft'):
+            recipe_id = ids.next_id('recipe')
             for item_en, quantity in datafn.iter_recipe(entry['craft'][0]):
                 item_id = item_map.id_of('en', item_en)
                 ensure(item_id, f"Charm {entry.name('en')} refers to " +
                     f"item {item_en}, which doesn't exist.")
 
                 charm.craft_items.append(db.RecipeItem(
-                    recipe_id=next_recipe_id,
+                    recipe_id=recipe_id,
                     item_id=item_id,
                     quantity=quantity
                 ))
-            next_recipe_id += 1
 
         session.add(charm)
 
+    charm_texts.write(session)
+
     print("Built Charms")
 
-def build_tools(session : sqlalchemy.orm.Session, mhdata):
+@build_step('tools')
+def build_tools(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
+    tool_texts = TextRows(db.ToolText, { 'name': 'name', 'name_base': 'name_base', 'description': 'description' })
     for order_id, tool_entry in enumerate(mhdata.tool_map.values()):
         tool = db.Tool(
             id=tool_entry.id,
@@ -827,19 +848,17 @@ def build_tools(session : sqlalchemy.orm.Session, mhdata):
             slot_3=tool_entry['slot_3'],
             icon_color=tool_entry['icon_color'])
 
-        for language in cfg.supported_languages:
-            tool.translations.append(db.ToolText(
-                lang_id=language,
-                name=get_translated(tool_entry, 'name', language),
-                name_base=get_translated(tool_entry, 'name_base', language),
-                description=get_translated(tool_entry, 'description', language)
-            ))
-
+        tool_texts.add(tool_entry.id, tool_entry)
         session.add(tool)
+
+    tool_texts.write(session)
     
     print("Built Tools")
 
-def build_quests(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker):
+@build_step('quests')
+def build_quests(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTracker, ids: IdAllocator):
+    quest_texts = TextRows(db.QuestText,
+        { 'name': 'name', 'objective': 'objective', 'description': 'description' }, fallback=False)
     for order_id, entry in enumerate(mhdata.quest_map.values()):
         stars = entry['stars']
         quest = db.Quest(
@@ -854,13 +873,7 @@ def build_quests(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTra
             zenny=entry['zenny']
         )
 
-        for language in cfg.supported_languages:
-            quest.translations.append(db.QuestText(
-                lang_id=language,
-                name=entry.name(language),
-                objective=entry['objective'][language],
-                description=entry['description'][language]
-            ))
+        quest_texts.add(entry.id, entry)
 
         for monster_entry in entry['monsters']:
             quest.monsters.append(db.QuestMonster(
@@ -873,6 +886,7 @@ def build_quests(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTra
             item_id = mhdata.item_map.id_of('en', reward_entry['item_en'])
             item_tracker.mark_encountered_id(item_id)
             quest.rewards.append(db.QuestReward(
+                id=ids.next_id('quest_reward'),
                 group=reward_entry['group'],
                 item_id=item_id,
                 stack=reward_entry['stack'],
@@ -881,4 +895,6 @@ def build_quests(session : sqlalchemy.orm.Session, mhdata, item_tracker: ItemTra
 
         session.add(quest)
 
+    quest_texts.write(session)
+
     print('Build Quests')
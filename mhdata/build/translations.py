@@ -0,0 +1,72 @@
+"""
+Builds the rows of translation tables without creating an object per language.
+
+Most rows of the database are translations, one per supported language for every entity.
+A TextRows object collects the rows of a single translation table as tuples,
+resolving the english fallback of each field once per entity,
+and writes every row to the session in one batch.
+"""
+
+from mhdata import cfg
+from mhdata.sql import BulkSession
+
+class TextRows:
+    """Collects the rows of a translation table.
+
+    Fields map a column name to the entry key holding the translations of that column.
+    Missing translations use the english value, same as get_translated.
+    If fallback is false, the translation of each language is used as is instead."""
+
+    def __init__(self, text_class, fields, *, fallback=True, languages=None):
+        self.text_class = text_class
+        self.columns = [c.name for c in text_class.__table__.columns]
+        self.fields = list(fields.items())
+        self.fallback = fallback
+        self.languages = list(languages or cfg.supported_languages)
+        self.rows = []
+
+    def _translations(self, entry, key):
+        "Returns the value of an entry field for every language, in language order"
+        if key not in entry:
+            return [None] * len(self.languages)
+
+        translations = entry[key]
+        if not self.fallback:
+            return [translations[lang] for lang in self.languages]
+
+        # Missing translations share the english string
+        english = None
+        results = []
+        for lang in self.languages:
+            value = translations.get(lang, None)
+            if not value:
+                if english is None:
+                    english = translations['en']
+                value = english
+            results.append(value)
+        return results
+
+    def add(self, entry_id, entry, **values):
+        """Adds the rows of an entry for every language.
+        Keyword arguments are column values that are the same in every language"""
+        columns = { 'id': entry_id }
+        columns.update(values)
+        for column, key in self.fields:
+            columns[column] = self._translations(entry, key)
+
+        translated = set(column for (column, _) in self.fields)
+        for i, language in enumerate(self.languages):
+            self.rows.append(tuple(
+                language if c == 'lang_id' else
+                columns[c][i] if c in translated else
+                columns.get(c, None)
+                for c in self.columns))
+
+    def write(self, session):
+        "Adds every collected row to the session"
+        if isinstance(session, BulkSession):
+            session.add_rows(self.text_class, self.rows)
+        else:
+            for row in self.rows:
+                session.add(self.text_class(**dict(zip(self.columns, row))))
+        self.rows = []
@@ -0,0 +1,274 @@
+"""
+Updates an existing database in place, instead of recreating it.
+
+The database keeps a content hash of every loaded entity, along with the maps each build step read
+and the tables it wrote. An update compares the hashes against the loaded data to find the changed maps,
+and runs the build steps that read them into a scratch database. Steps that write to the same table
+(such as the steps writing recipe_item) are always run together, so the scratch tables are complete.
+The scratch tables are then compared row by row with the existing ones,
+and only the inserted, updated, and deleted rows are written, in a single transaction.
+
+Changes to the build code are not detected, use a full build after changing it.
+"""
+
+import os.path
+import json
+import hashlib
+import tempfile
+from collections.abc import Mapping
+
+import sqlalchemy
+import sqlalchemy.orm
+from sqlalchemy import Column, Integer, Text
+import mhdata.sql as db
+from mhdata.io import DataMap
+from mhdata.io.functions import to_basic
+
+from .sql import build_sql_database, build_steps
+from .incremental import BuildRecord
+from .itemtracker import ItemTracker
+from .ids import IdAllocator
+
+# Tables used to track the state of the last build. These are not part of the published schema.
+update_metadata = sqlalchemy.MetaData()
+
+entity_hash_table = sqlalchemy.Table('build_entity_hash', update_metadata,
+    Column('map_name', Text, primary_key=True),
+    Column('entity_id', Text, primary_key=True),
+    Column('position', Integer),
+    Column('hash', Text))
+
+step_map_table = sqlalchemy.Table('build_step_map', update_metadata,
+    Column('step', Text, primary_key=True),
+    Column('map_name', Text, primary_key=True))
+
+step_table_table = sqlalchemy.Table('build_step_table', update_metadata,
+    Column('step', Text, primary_key=True),
+    Column('table_name', Text, primary_key=True))
+
+def entity_hashes(mhdata):
+    """Returns a mapping of map name -> { entity id: (position, hash) } for every loaded map.
+    The position is part of the result, as builds depend on the order of entries."""
+    results = {}
+    for map_name, value in vars(mhdata).items():
+        if isinstance(value, DataMap) or isinstance(value, Mapping):
+            entries = value.items()
+        else:
+            entries = enumerate(value)
+
+        hashes = {}
+        for position, (entity_id, entry) in enumerate(entries):
+            content = json.dumps(to_basic(entry, copy=False), default=str)
+            hashes[str(entity_id)] = (position, hashlib.sha1(content.encode('utf-8')).hexdigest())
+        results[map_name] = hashes
+    return results
+
+def step_units(step_tables):
+    """Splits the build steps into units of steps that write to the same tables, in build order.
+    Each unit is a list of step names"""
+    units = []
+    for name in build_steps.keys():
+        tables = set(step_tables.get(name, []))
+        unit = [name]
+        for other in list(units):
+            other_tables = set(t for step in other for t in step_tables.get(step, []))
+            if not tables.isdisjoint(other_tables):
+                units.remove(other)
+                unit = other + unit
+                tables |= other_tables
+        units.append(unit)
+
+    order = list(build_steps.keys())
+    return sorted((sorted(unit, key=order.index) for unit in units), key=lambda unit: order.index(unit[0]))
+
+def read_state(connection):
+    """Returns the (entity hashes, step maps, step tables) stored in the database,
+    or None if the database was not built with update tracking"""
+    inspector = sqlalchemy.inspect(connection)
+    if not all(inspector.has_table(table.name) for table in update_metadata.sorted_tables):
+        return None
+
+    hashes = {}
+    for map_name, entity_id, position, hash_value in connection.execute(sqlalchemy.select(entity_hash_table)):
+        hashes.setdefault(map_name, {})[entity_id] = (position, hash_value)
+
+    step_maps = {}
+    for step, map_name in connection.execute(sqlalchemy.select(step_map_table)):
+        step_maps.setdefault(step, set()).add(map_name)
+
+    step_tables = {}
+    for step, table_name in connection.execute(sqlalchemy.select(step_table_table)):
+        step_tables.setdefault(step, set()).add(table_name)
+
+    return hashes, step_maps, step_tables
+
+def write_state(connection, hashes, step_maps, step_tables):
+    "Replaces the build state stored in the database"
+    update_metadata.create_all(connection)
+    for table in update_metadata.sorted_tables:
+        connection.execute(table.delete())
+
+    entity_rows = [
+        { 'map_name': map_name, 'entity_id': entity_id, 'position': position, 'hash': hash_value }
+        for (map_name, entries) in hashes.items()
+        for (entity_id, (position, hash_value)) in entries.items()]
+    map_rows = [{ 'step': step, 'map_name': m } for (step, maps) in step_maps.items() for m in sorted(maps)]
+    table_rows = [{ 'step': step, 'table_name': t } for (step, tables) in step_tables.items() for t in sorted(tables)]
+
+    for table, rows in [(entity_hash_table, entity_rows), (step_map_table, map_rows), (step_table_table, table_rows)]:
+        if rows:
+            connection.execute(table.insert(), rows)
+
+def recorded_tables(record):
+    "Returns a mapping of step name -> names of the tables it wrote, from a BuildRecord"
+    return { name: set(table.name for table in rows.keys()) for (name, rows) in record.rows.items() }
+
+def table_rows(connection, table):
+    """Returns a dictionary of primary key -> row tuple, containing every row in the table.
+    Values are returned as stored by sqlite, without type conversions"""
+    columns = list(table.columns)
+    key_slots = [columns.index(c) for c in table.primary_key.columns]
+    column_names = ', '.join(f'"{c.name}"' for c in columns)
+
+    results = {}
+    for row in connection.exec_driver_sql(f'SELECT {column_names} FROM "{table.name}"'):
+        row = tuple(row)
+        results[tuple(row[i] for i in key_slots)] = row
+    return results
+
+def apply_table_diff(connection, table, old_rows, new_rows):
+    """Writes the differences between two dictionaries of rows (see table_rows) to the table.
+    Returns a (inserted, updated, deleted) tuple with the number of rows of each."""
+    columns = [f'"{c.name}"' for c in table.columns]
+    key_condition = ' AND '.join(f'"{c.name}" = ?' for c in table.primary_key.columns)
+
+    deleted = [key for key in old_rows.keys() if key not in new_rows]
+    inserted = [row for (key, row) in new_rows.items() if key not in old_rows]
+    updated = [row + key for (key, row) in new_rows.items() if key in old_rows and old_rows[key] != row]
+
+    if deleted:
+        connection.exec_driver_sql(f'DELETE FROM "{table.name}" WHERE {key_condition}', deleted)
+    if updated:
+        assignments = ', '.join(f'{c} = ?' for c in columns)
+        connection.exec_driver_sql(f'UPDATE "{table.name}" SET {assignments} WHERE {key_condition}', updated)
+    if inserted:
+        params = ', '.join('?' for c in columns)
+        connection.exec_driver_sql(f'INSERT INTO "{table.name}" ({", ".join(columns)}) VALUES ({params})', inserted)
+
+    return (len(inserted), len(updated), len(deleted))
+
+def build_update_tracked(output_filename, mhdata):
+    "Performs a full build, and stores the state used by later updates"
+    record = BuildRecord()
+    build_sql_database(output_filename, mhdata, record=record, bulk=True)
+
+    engine = db.open_database_engine(output_filename)
+    with engine.begin() as connection:
+        write_state(connection, entity_hashes(mhdata), record.maps, recorded_tables(record))
+    engine.dispose()
+
+def update_sql_database(output_filename, mhdata):
+    """Updates the database at output_filename to match the loaded data,
+    writing only the rows that changed since the last build or update.
+    If the database does not exist or was not built by this function, a full build is performed.
+    Returns the names of the build steps that ran."""
+    state = None
+    if os.path.exists(output_filename):
+        engine = db.open_database_engine(output_filename)
+        with engine.connect() as connection:
+            state = read_state(connection)
+        engine.dispose()
+
+    if state is None or set(state[1].keys()) != set(build_steps.keys()):
+        print("Database has no update information, performing a full build")
+        build_update_tracked(output_filename, mhdata)
+        return list(build_steps.keys())
+
+    old_hashes, step_maps, step_tables = state
+    hashes = entity_hashes(mhdata)
+    changed_maps = set(name for name in set(hashes) | set(old_hashes) if hashes.get(name) != old_hashes.get(name))
+    for map_name in sorted(changed_maps):
+        old_entries = old_hashes.get(map_name, {})
+        num_changed = sum(1 for (key, value) in hashes.get(map_name, {}).items() if old_entries.get(key) != value)
+        num_changed += sum(1 for key in old_entries if key not in hashes.get(map_name, {}))
+        print(f"Map {map_name} has {num_changed} changed entries")
+
+    units = [unit for unit in step_units(step_tables)
+        if any(not step_maps[step].isdisjoint(changed_maps) for step in unit)]
+    if not units:
+        print("Database is up to date")
+        return []
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        # Run every affected unit into an empty database. As no unit writes the tables of another,
+        # this gives the same rows as a full build
+        scratch_filename = os.path.join(scratch_dir, 'scratch.db')
+        scratch_engine = db.recreate_database_engine(scratch_filename, build_settings=True)
+        sessionbuilder = db.bulk_sessionmaker(sqlalchemy.orm.sessionmaker(bind=scratch_engine))
+        record = BuildRecord()
+        with db.session_scope(sessionbuilder) as session:
+            item_tracker = ItemTracker(mhdata)
+            ids = IdAllocator()
+            for unit in units:
+                for name in unit:
+                    with record.record_step(session, name, mhdata) as recorded_data:
+                        build_steps[name](session, recorded_data, item_tracker, ids)
+
+        # If a unit started writing to the tables of another unit, updating only this unit is invalid
+        new_tables = recorded_tables(record)
+        steps = [name for unit in units for name in unit]
+        other_tables = set(t for (name, tables) in step_tables.items() if name not in steps for t in tables)
+        if any(not tables.isdisjoint(other_tables) for tables in new_tables.values()):
+            scratch_engine.dispose()
+            print("Build steps now write to tables of other steps, performing a full build")
+            build_update_tracked(output_filename, mhdata)
+            return list(build_steps.keys())
+
+        tables_to_update = set(t for name in steps for t in step_tables.get(name, set()) | new_tables[name])
+
+        engine = db.open_database_engine(output_filename)
+        with scratch_engine.connect() as scratch, engine.begin() as connection:
+            totals = [0, 0, 0]
+            for table in db.Base.metadata.sorted_tables:
+                if table.name not in tables_to_update:
+                    continue
+                counts = apply_table_diff(connection, table, table_rows(connection, table), table_rows(scratch, table))
+                totals = [a + b for (a, b) in zip(totals, counts)]
+
+            step_maps.update(record.maps)
+            step_tables.update(new_tables)
+            write_state(connection, hashes, step_maps, step_tables)
+
+        engine.dispose()
+        scratch_engine.dispose()
+
+    print(f"Updated {', '.join(steps)}: {totals[0]} rows inserted, {totals[1]} updated, {totals[2]} deleted")
+    return steps
+
+def verify_sql_database(output_filename, mhdata):
+    """Compares the database at output_filename with a full build of the loaded data.
+    Prints the tables that differ, and returns true if every table has the same rows."""
+    matches = True
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        full_filename = os.path.join(scratch_dir, 'full.db')
+        build_sql_database(full_filename, mhdata, bulk=True)
+
+        engine = db.open_database_engine(output_filename)
+        full_engine = db.open_database_engine(full_filename)
+        with engine.connect() as connection, full_engine.connect() as full:
+            for table in db.Base.metadata.sorted_tables:
+                rows = table_rows(connection, table)
+                full_rows = table_rows(full, table)
+                if rows == full_rows:
+                    continue
+
+                matches = False
+                missing = sum(1 for key in full_rows if key not in rows)
+                extra = sum(1 for key in rows if key not in full_rows)
+                different = sum(1 for (key, row) in rows.items() if key in full_rows and full_rows[key] != row)
+                print(f"Table {table.name} differs from a full build: " +
+                    f"{missing} rows missing, {extra} extra, {different} different")
+        engine.dispose()
+        full_engine.dispose()
+
+    return matches
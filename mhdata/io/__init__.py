@@ -16,11 +16,23 @@ from .stitcher import DataStitcher
 from .datamap import DataMap, DataRow
 from .functions import merge_list
 
-from .csv import read_csv
+from .csv import read_csv, CsvCache
 
 import os.path
 data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../source_data')
 
+# Set this environment variable to a directory to enable the parsed csv cache
+CSV_CACHE_ENV = 'MHDATA_CSV_CACHE'
+
+def create_csv_cache():
+    "Creates a CsvCache if the MHDATA_CSV_CACHE environment variable is set, otherwise None"
+    import os
+
+    cache_dir = os.environ.get(CSV_CACHE_ENV, None)
+    if not cache_dir:
+        return None
+    return CsvCache(cache_dir)
+
 def create_reader():
     "Creates a DataReader with default settings"
     from mhdata import cfg
@@ -28,7 +40,8 @@ def create_reader():
 
     return DataReader(
         languages=list(cfg.supported_languages), 
-        data_path=data_path
+        data_path=data_path,
+        csv_cache=create_csv_cache()
     )
 
 def create_writer():
@@ -0,0 +1,119 @@
+"""
+An opt-in on-disk cache of parsed CSV files.
+
+Each cached file stores the rows returned by parse_csv (with empties already set to None)
+and the trim warnings that were found, serialized with pickle. Entries are keyed by
+the file's path, size, and modification time. If the size matches but the modification time
+does not (such as after a git checkout), the content hash is checked before discarding the entry.
+"""
+
+import os
+import os.path
+import sys
+import pickle
+import hashlib
+
+from .functions import parse_csv
+
+# Bump whenever the format of the cached rows changes
+CACHE_VERSION = 1
+
+def hash_file(location):
+    "Returns the sha1 hex digest of a file's contents"
+    with open(location, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+class CsvCache:
+    """Reads CSV files through a persistent cache stored in cache_dir.
+    Stale entries are reparsed and rewritten transparently."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_path(self, location, fieldnames):
+        key = repr((os.path.normcase(os.path.abspath(location)), fieldnames))
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + '.pickle')
+
+    def _read_entry(self, cache_path, stat, location):
+        """Returns the cached (rows, warnings) if the entry at cache_path is still fresh.
+        Returns None if the entry is missing or stale"""
+        try:
+            with open(cache_path, 'rb') as f:
+                header = pickle.load(f)
+                if header['version'] != CACHE_VERSION or header['python'] != sys.version_info[:2]:
+                    return None
+                if header['size'] != stat.st_size:
+                    return None
+                if header['mtime'] == stat.st_mtime_ns:
+                    return pickle.load(f)
+
+                # The file may have been touched without changing, so compare contents
+                if header['digest'] != hash_file(location):
+                    return None
+                rows, warnings = pickle.load(f)
+
+            # Refresh the entry so the next read can skip hashing
+            self._write_entry(cache_path, stat, header['digest'], rows, warnings)
+            return rows, warnings
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError):
+            return None
+
+    def _write_entry(self, cache_path, stat, digest, rows, warnings):
+        """Atomically writes a cache entry, so that concurrent builds never see a partial file.
+        If the cache can't be written, a warning is printed and the rows are left uncached"""
+        header = {
+            'version': CACHE_VERSION,
+            'python': sys.version_info[:2],
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'digest': digest
+        }
+
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump((rows, warnings), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"Warning: Could not write to the CSV cache at {self.cache_dir}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def parse_csv(self, location, fieldnames=None):
+        "Same as mhdata.io.csv.parse_csv, but uses the cache when possible"
+        if fieldnames is not None:
+            fieldnames = tuple(fieldnames)
+
+        stat = os.stat(location)
+        cache_path = self._cache_path(location, fieldnames)
+
+        cached = self._read_entry(cache_path, stat, location)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        digest = hash_file(location)
+        rows, warnings = parse_csv(location, fieldnames)
+        self._write_entry(cache_path, stat, digest, rows, warnings)
+        return rows, warnings
+
+    def read_csv(self, location, fieldnames=None):
+        "Same as mhdata.io.csv.read_csv, but uses the cache when possible"
+        rows, warnings = self.parse_csv(location, fieldnames)
+        for warning in warnings:
+            print(warning)
+        return rows
+
+    def clear(self):
+        "Deletes all cached entries"
+        if not os.path.isdir(self.cache_dir):
+            return
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.pickle'):
+                os.remove(os.path.join(self.cache_dir, filename))
@@ -16,8 +16,8 @@ def determine_fields(obj_list):
 
     return fields
 
-def validate_csv(obj_list, filename):
-    "Minor validation. Warning for any key/value without whitespace"
+def find_csv_warnings(obj_list, filename):
+    "Returns a list of warning messages for any key/value without whitespace"
     warn_keys = False
     warn_value_rows = []
     for row_idx, item in enumerate(obj_list):
@@ -32,13 +32,20 @@ def validate_csv(obj_list, filename):
             if value.startswith(" ") or value.endswith(" "):
                 warn_value_rows.append((row_idx + 1, column_idx + 1))
                 break
-                
+
+    warnings = []
     if warn_keys:
-        print("Warning: Some keys in CSV are not trimmed: " + filename)
+        warnings.append("Warning: Some keys in CSV are not trimmed: " + filename)
     if warn_value_rows:
         cell_strings = map(lambda c: "({0}, {1})".format(c[0], c[1]), warn_value_rows)
-        print("Warning: Some values in CSV are not trimmed: "
+        warnings.append("Warning: Some values in CSV are not trimmed: "
             + filename + " cells: " + ", ".join(cell_strings))
+    return warnings
+
+def validate_csv(obj_list, filename):
+    "Minor validation. Warning for any key/value without whitespace"
+    for warning in find_csv_warnings(obj_list, filename):
+        print(warning)
 
 @contextlib.contextmanager
 def open_resolved(path_or_file, mode, encoding):
@@ -69,19 +76,25 @@ def save_csv(obj_list, location, fields=None):
         writer.writerows(obj_list)
 
 
-def read_csv(location, fieldnames=None):
-    "Reads a csv file as an object list without additional processing"
+def parse_csv(location, fieldnames=None):
+    """Reads a csv file as an object list, setting empty cells to None.
+    Returns the rows and any warnings found, without printing them."""
     with open(location, encoding="utf-8") as f:
         reader = csv.DictReader(f, fieldnames=fieldnames)
         items = list(reader)
 
-        # CSV does not distinguish between empty string and null
-        # Set empties to null
-        for item in items:
-            for key, value in item.items():
-                if value == '':
-                    item[key] = None
+    # CSV does not distinguish between empty string and null
+    # Set empties to null
+    for item in items:
+        for key, value in item.items():
+            if value == '':
+                item[key] = None
+
+    return items, find_csv_warnings(items, location)
 
-        validate_csv(items, location)
-            
-        return items
+def read_csv(location, fieldnames=None):
+    "Reads a csv file as an object list without additional processing"
+    items, warnings = parse_csv(location, fieldnames)
+    for warning in warnings:
+        print(warning)
+    return items
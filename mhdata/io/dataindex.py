@@ -0,0 +1,128 @@
+"""
+Secondary indexes used by the DataMap to look up entries by field values.
+
+Indexes hold entry ids and are kept up to date by the DataMap that owns them.
+Field values are read from the DataRow, so nested fields like name_en are supported,
+but values must be hashable (or comparable, for sorted indexes).
+
+Each index remembers the key it stored an entry under, so that an entry can still be removed
+after one of its nested values was changed in place.
+"""
+
+import bisect
+import math
+
+class HashIndex:
+    "An index of entry ids by the values of one or more fields, used for equality lookups"
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._buckets = {}
+        self._keys_by_id = {}
+
+    def key_of(self, entry):
+        "Returns the index key for an entry, which is a tuple of its field values"
+        return tuple(entry.get(f, None) for f in self.fields)
+
+    def touches(self, key):
+        "Returns true if setting the given row key may change the values in this index"
+        return any(f == key or f.startswith(key + '_') for f in self.fields)
+
+    def add(self, entry):
+        key = self.key_of(entry)
+        try:
+            self._buckets.setdefault(key, {})[entry.id] = None
+        except TypeError:
+            raise TypeError(f"Cannot index unhashable value {key} for fields {self.fields}")
+        self._keys_by_id[entry.id] = key
+
+    def remove(self, entry):
+        key = self._keys_by_id.pop(entry.id, None)
+        bucket = self._buckets.get(key, None)
+        if bucket is None:
+            return
+        bucket.pop(entry.id, None)
+        if not bucket:
+            del self._buckets[key]
+
+    def lookup(self, key):
+        "Returns the ids of all entries matching the key tuple"
+        return self._buckets.get(tuple(key), {}).keys()
+
+    def values(self):
+        "Returns all distinct key tuples in the index"
+        return self._buckets.keys()
+
+
+class JoinIndex(HashIndex):
+    """A unique index used to join sub data onto a map, keyed by the stringified field values.
+    If the entry has a base_ version of a field, it is used instead.
+    The mapping of key -> id is available through the ids property"""
+
+    def key_of(self, entry):
+        items = []
+        for f in self.fields:
+            if f'base_{f}' in entry:
+                items.append(entry[f'base_{f}'])
+            else:
+                items.append(entry.get(f, None))
+        return tuple(str(i) for i in items)
+
+    def add(self, entry):
+        key = self.key_of(entry)
+        self._buckets[key] = entry.id
+        self._keys_by_id[entry.id] = key
+
+    def remove(self, entry):
+        key = self._keys_by_id.pop(entry.id, None)
+        if self._buckets.get(key, None) == entry.id:
+            del self._buckets[key]
+
+    def lookup(self, key):
+        return self._buckets.get(tuple(key), None)
+
+    @property
+    def ids(self):
+        "Returns a mapping of key tuple -> entry id"
+        return self._buckets
+
+
+class SortedIndex:
+    """An index of entry ids sorted by the value of a single field, used for range lookups.
+    Entries where the field is None are not included."""
+
+    def __init__(self, field):
+        self.fields = (field,)
+        self.field = field
+        self._keys = []
+        self._values_by_id = {}
+
+    def touches(self, key):
+        "Returns true if setting the given row key may change the values in this index"
+        return self.field == key or self.field.startswith(key + '_')
+
+    def add(self, entry):
+        value = entry.get(self.field, None)
+        if value is None:
+            return
+        bisect.insort(self._keys, (value, entry.id))
+        self._values_by_id[entry.id] = value
+
+    def remove(self, entry):
+        if entry.id not in self._values_by_id:
+            return
+        key = (self._values_by_id.pop(entry.id), entry.id)
+        idx = bisect.bisect_left(self._keys, key)
+        if idx < len(self._keys) and self._keys[idx] == key:
+            del self._keys[idx]
+
+    def range(self, low=None, high=None):
+        "Returns the ids of all entries where low <= value <= high, ordered by value. None means unbounded"
+        start = 0
+        end = len(self._keys)
+        if low is not None:
+            start = bisect.bisect_left(self._keys, (low,))
+        if high is not None:
+            # Ids are ints, so infinity sorts after every entry with the same value
+            end = bisect.bisect_right(self._keys, (high, math.inf))
+        return [entry_id for (_, entry_id) in self._keys[start:end]]
@@ -7,6 +7,7 @@ from collections.abc import Mapping, KeysView
 from mhdata.util import joindicts, extract_fields, typecheck
 
 from .datarow import DataRow
+from .dataindex import HashIndex, JoinIndex, SortedIndex
 from .functions import to_basic
 
 
@@ -35,11 +36,23 @@ class DataMap(collections.abc.Mapping):
     If languages is given, use those languages as the key languages.
     Key languages are used for associations and can be mapped, but require a uniqueness constraint.
     TODO: Allow existance check to work on non-key languages. Right now non-keys are "ignored".
+
+    Secondary indexes can be declared with add_index, and are used by where and where_range.
+    Indexes follow inserts, deletes, and values set on the rows. Changes made inside
+    nested values (like entry['name']['en'] = ...) are not tracked, use reindex() afterwards.
     """
 
     def __init__(self, data: typing.Mapping[int, dict] = None, languages=None, keys_ex=[], start_id=1):
         self._data = collections.OrderedDict()
         self._reverse_entries = {}
+        self._indexes = {}
+
+        # Insertion sequence of every entry, used to return index lookups in map order
+        self._order = {}
+        self._order_gen = itertools.count()
+
+        self._max_id = 0
+        self._max_id_stale = False
 
         # List of languages that the data map can innately handle.
         # This distinction is required as some languages have duplicate entries for certain items.
@@ -70,8 +83,113 @@ class DataMap(collections.abc.Mapping):
 
     @property
     def max_id(self):
-        "Gets the max id value stored. Runs in linear time every time."
-        return max((entry.id for entry in self._data.values()), default=0)
+        "Gets the max id value stored. Only recalculated if the max entry was deleted"
+        if self._max_id_stale:
+            self._max_id = max(self._data.keys(), default=0)
+            self._max_id_stale = False
+        return self._max_id
+
+    def _create_index(self, fields, kind):
+        "Internal: creates, populates, and registers a new index of a kind (hash, sorted, join)"
+        if kind == 'sorted':
+            index = SortedIndex(fields[0])
+        elif kind == 'join':
+            index = JoinIndex(fields)
+        else:
+            index = HashIndex(fields)
+
+        for entry in self._data.values():
+            index.add(entry)
+        self._indexes[(fields, kind)] = index
+        return index
+
+    def add_index(self, *fields, sorted=False):
+        """Declares a secondary index over one or more fields, and returns self.
+        Hash indexes are used by where() for equality lookups.
+        Sorted indexes support a single field, and are used by where_range()."""
+        if not fields:
+            raise ValueError("An index needs at least one field")
+        if sorted and len(fields) != 1:
+            raise ValueError("Sorted indexes only support a single field")
+
+        kind = 'sorted' if sorted else 'hash'
+        if (fields, kind) not in self._indexes:
+            self._create_index(fields, kind)
+        return self
+
+    def join_index(self, key_fields) -> JoinIndex:
+        """Returns the join index for the key fields, creating it if it doesn't exist.
+        Used by merge_list, so that every join on the same fields shares a single index"""
+        key_fields = tuple(key_fields)
+        index = self._indexes.get((key_fields, 'join'), None)
+        if index is None:
+            index = self._create_index(key_fields, 'join')
+        return index
+
+    def reindex(self):
+        "Rebuilds all secondary indexes. Required after changing nested values of indexed fields"
+        for fields, kind in list(self._indexes.keys()):
+            self._create_index(fields, kind)
+
+    def _find_hash_index(self, fields):
+        "Returns the hash index covering the most of the given fields, or None"
+        best = None
+        for (index_fields, kind), index in self._indexes.items():
+            if kind != 'hash' or not set(index_fields) <= fields:
+                continue
+            if best is None or len(index_fields) > len(best.fields):
+                best = index
+        return best
+
+    def _in_map_order(self, entry_ids):
+        return [self._data[i] for i in sorted(entry_ids, key=self._order.__getitem__)]
+
+    def where(self, **conditions) -> typing.List[DataRow]:
+        """Returns all entries whose fields equal the given values, in map order.
+        Uses the hash index that covers the most fields, and checks any remaining fields directly.
+        Without a matching index, this is a linear scan."""
+        index = self._find_hash_index(set(conditions.keys()))
+        if index is None:
+            candidates = self._data.values()
+            remaining = conditions
+        else:
+            key = tuple(conditions[f] for f in index.fields)
+            candidates = self._in_map_order(index.lookup(key))
+            remaining = { k:v for (k, v) in conditions.items() if k not in index.fields }
+
+        return [
+            entry for entry in candidates
+            if all(entry.get(k, None) == v for (k, v) in remaining.items())
+        ]
+
+    def where_range(self, field, low=None, high=None) -> typing.List[DataRow]:
+        """Returns all entries where low <= entry[field] <= high, ordered by that field.
+        A bound of None is unbounded. Entries where the field is None are never returned.
+        Without a sorted index on the field, this is a linear scan."""
+        index = self._indexes.get(((field,), 'sorted'), None)
+        if index is not None:
+            return [self._data[i] for i in index.range(low, high)]
+
+        results = []
+        for entry in self._data.values():
+            value = entry.get(field, None)
+            if value is None:
+                continue
+            if low is not None and value < low:
+                continue
+            if high is not None and value > high:
+                continue
+            results.append(entry)
+        results.sort(key=lambda e: e[field])
+        return results
+
+    def _unindex_field(self, entry, key):
+        """Internal: called by DataRow before a key is set or deleted.
+        Removes the entry from affected indexes and returns them, so they can be re-added"""
+        affected = [index for index in self._indexes.values() if index.touches(key)]
+        for index in affected:
+            index.remove(entry)
+        return affected
 
     def _generate_id(self):
         "Helper that creates a new id for a new object. Handles collisions"
@@ -127,8 +245,14 @@ class DataMap(collections.abc.Mapping):
         self._register_entry(new_entry)
         
         self._data[entry_id] = new_entry
+        self._order[entry_id] = next(self._order_gen)
         self._revaluate_idgen(entry_id)
 
+        if entry_id > self._max_id:
+            self._max_id = entry_id
+        for index in self._indexes.values():
+            index.add(new_entry)
+
         return new_entry
 
     def add_entry(self, entry_id: int, entry: dict):
@@ -225,6 +349,18 @@ class DataMap(collections.abc.Mapping):
                 raise
             return default
 
+    def __getstate__(self):
+        # The generators are recreated on unpickle, allowing maps to be sent between processes
+        state = self.__dict__.copy()
+        del state['_id_gen']
+        del state['_order_gen']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._id_gen = itertools.count(max(self._last_id + 1, self.start_id))
+        self._order_gen = itertools.count(max(self._order.values(), default=-1) + 1)
+
     def __getitem__(self, id) -> DataRow:
         return self._data[id]
 
@@ -236,7 +372,14 @@ class DataMap(collections.abc.Mapping):
 
     def __delitem__(self, id):
         entry = self._data[id]
+        for index in self._indexes.values():
+            index.remove(entry)
+
         del self._data[id]
+        del self._order[id]
+        if id == self._max_id:
+            self._max_id_stale = True
+
         for lang, val in entry.names():
             keys_ex = [entry[k] for k in (self.keys_ex or [])]
             key = (lang, val, *keys_ex)
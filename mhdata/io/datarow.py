@@ -1,17 +1,132 @@
-from collections.abc import MutableMapping, Iterable
+import sys
+import weakref
+from collections.abc import MutableMapping, Iterable, ItemsView, ValuesView
 from .functions import to_basic
 
+def _intern(key):
+    return sys.intern(key) if type(key) is str else key
+
+class RowLayout:
+    """The shared key table of DataRow objects.
+    Maps each key to the slot that holds its value in the row's value list.
+
+    Layouts are interned by their keys, so every row with the same keys in the same order
+    shares a single layout. Adding or removing keys moves the row to another layout,
+    and these transitions are cached on the layout.
+
+    The registry and the transitions hold weak references, so layouts no longer used by any row are freed.
+    Plain dictionaries of weakref.ref are used, as they are much faster to read than a WeakValueDictionary.
+    """
+
+    __slots__ = ('keys', 'slots', '_added', '_removed', '_nested', '__weakref__')
+
+    # Mapping of keys -> weak reference to the layout. Entries are removed when their layout is freed
+    _layouts = {}
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.slots = { k:i for (i, k) in enumerate(keys) }
+        self._added = {}
+        self._removed = {}
+        self._nested = {}
+
+    @classmethod
+    def of(cls, keys):
+        "Returns the shared layout for a sequence of keys"
+        keys = tuple(keys)
+        ref = cls._layouts.get(keys, None)
+        layout = ref() if ref is not None else None
+        if layout is None:
+            keys = tuple(_intern(k) for k in keys)
+            layout = cls(keys)
+            cls._layouts[keys] = weakref.ref(layout, cls._make_remover(keys))
+        return layout
+
+    @classmethod
+    def _make_remover(cls, keys):
+        "Returns the weakref callback that removes the registry entry of a freed layout"
+        def remove(ref):
+            if cls._layouts.get(keys, None) is ref:
+                del cls._layouts[keys]
+        return remove
+
+    @staticmethod
+    def _transition(transitions, key):
+        ref = transitions.get(key, None)
+        return ref() if ref is not None else None
+
+    def with_key(self, key):
+        "Returns the layout where key is added to the end"
+        layout = self._transition(self._added, key)
+        if layout is None:
+            layout = RowLayout.of(self.keys + (key,))
+            self._added[key] = weakref.ref(layout)
+        return layout
+
+    def without_key(self, key):
+        "Returns the layout where key is removed"
+        layout = self._transition(self._removed, key)
+        if layout is None:
+            layout = RowLayout.of(k for k in self.keys if k != key)
+            self._removed[key] = weakref.ref(layout)
+        return layout
+
+    def nested_slot(self, key):
+        """Returns a (slot, subkey) tuple if key may refer to a value nested in one of the slots,
+        such as name_en referring to name['en']. Otherwise returns None.
+        Only found slots are cached, so looking up arbitrary keys doesn't grow the layout"""
+        result = self._nested.get(key, None)
+        if result is not None:
+            return result
+
+        if isinstance(key, str) and '_' in key:
+            key1, key2 = key.rsplit('_', 1)
+            slot = self.slots.get(key1, None)
+            if slot is not None:
+                result = self._nested[key] = (slot, key2)
+        return result
+
+    def __reduce__(self):
+        # Unpickled layouts are reinterned
+        return (RowLayout.of, (self.keys,))
+
+    def __repr__(self):
+        return f"RowLayout({self.keys})"
+
+
+class DataRowItems(ItemsView):
+    "Items view of a DataRow that reads the slots directly"
+    def __iter__(self):
+        row = self._mapping
+        return zip(row._layout.keys, row._values)
+
+class DataRowValues(ValuesView):
+    "Values view of a DataRow that reads the slots directly"
+    def __iter__(self):
+        return iter(self._mapping._values)
+
+
 class DataRow(MutableMapping):
     """Defines a single row of a datamap object.
     These objects are regular dictionaries that can also get translated names.
+
+    Values are stored in a list, and the keys are stored in a RowLayout shared with other rows.
     """
 
+    __slots__ = ('_parent', '_layout', '_values')
+
     def __init__(self, parent, row_id: int, datarowdict: dict):
         self._parent = parent
-        self._data = { 'id': row_id }
+
+        keys = ['id']
+        values = [row_id]
         for key, value in datarowdict.items():
             if key != 'id':
-                self._data[key] = value
+                keys.append(key)
+                values.append(value)
+
+        self._layout = RowLayout.of(keys)
+        self._values = values
 
     @property
     def id(self):
@@ -34,48 +149,86 @@ class DataRow(MutableMapping):
             self[key] = value
             return
 
-        keys_to_move = []
-        found_item = False
-        for item_key in self._data.keys():
-            if found_item:
-                keys_to_move.append(item_key)
-            elif item_key == after:
-                found_item = True
+        keys = self._layout.keys
+        keys_to_move = keys[keys.index(after)+1:] if after in keys else ()
 
         self[key] = value
 
         # Move every entry to the end of the list
-        for item_key in keys_to_move:
-            value = self._data[item_key]
-            del self._data[item_key]
-            self._data[item_key] = value
-
-    def to_dict(self):
-        return to_basic(self)
+        if keys_to_move:
+            moved = set(keys_to_move)
+            new_keys = [k for k in self._layout.keys if k not in moved]
+            new_keys.extend(keys_to_move)
+
+            slots = self._layout.slots
+            self._values = [self._values[slots[k]] for k in new_keys]
+            self._layout = RowLayout.of(new_keys)
+
+    def items(self):
+        return DataRowItems(self)
+
+    def values(self):
+        return DataRowValues(self)
+
+    def to_dict(self, *, copy=True):
+        """Returns the row as a basic dictionary.
+        If copy is False, nested dictionaries and lists are shared with the row"""
+        return to_basic(self, copy=copy)
+
+    def _set(self, key, value):
+        "Internal: sets a value without updating the parent indexes"
+        slot = self._layout.slots.get(key, None)
+        if slot is None:
+            self._layout = self._layout.with_key(key)
+            self._values.append(value)
+        else:
+            self._values[slot] = value
+
+    def _delete(self, key):
+        "Internal: deletes a value without updating the parent indexes"
+        slot = self._layout.slots[key]
+        self._layout = self._layout.without_key(key)
+        del self._values[slot]
 
     def __getitem__(self, key: str):
-        if key in self._data:
-            return self._data[key]
-        elif '_' in key:
-            key1, key2 = key.rsplit('_', 1)
-            if key1 in self._data:
-                nested = self._data[key1]
-                if isinstance(nested, Iterable) and key2 in nested:
-                    return nested[key2]
-            
+        layout = self._layout
+        slot = layout.slots.get(key, None)
+        if slot is not None:
+            return self._values[slot]
+
+        nested = layout.nested_slot(key)
+        if nested is not None:
+            slot, subkey = nested
+            value = self._values[slot]
+            if isinstance(value, Iterable) and subkey in value:
+                return value[subkey]
+
         raise KeyError(f'No entry with {key} found in data row')
 
     def __setitem__(self, key, value):
-        self._data[key] = value
+        if not self._parent._indexes:
+            self._set(key, value)
+            return
+
+        # Keep the parent's secondary indexes in sync
+        affected = self._parent._unindex_field(self, key)
+        self._set(key, value)
+        for index in affected:
+            index.add(self)
 
     def __delitem__(self, key):
-        del self._data[key]
+        if key not in self._layout.slots:
+            raise KeyError(key)
+        affected = self._parent._unindex_field(self, key) if self._parent._indexes else []
+        self._delete(key)
+        for index in affected:
+            index.add(self)
 
     def __iter__(self):
-        return self._data.__iter__()
+        return iter(self._layout.keys)
 
     def __len__(self):
-        return self._data.__len__()
+        return len(self._values)
 
     def __repr__(self):
         # Show the repr of the shallow copy
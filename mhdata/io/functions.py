@@ -6,23 +6,66 @@ import re
 import mhdata.typecheck as typecheck
 import mhdata.util as util
 
-def to_basic(obj, *, stack=[]):
+# Types that to_basic returns as is
+_scalar_types = frozenset((str, int, float, bool, type(None)))
+
+def to_basic(obj, *, copy=True):
     """Converts an object to its most basic form, recursively.
-    Does not prevent infinite recursion, careful with usage.
+    Mappings are converted to dictionaries and other iterables (except strings) to lists.
+    Raises an exception if a cyclical reference is detected.
+
+    If copy is False, dictionaries and lists that are already basic are returned as is,
+    so the result may share parts with the original object.
     """
+    return _to_basic(obj, set(), copy)
+
+def _to_basic(obj, active: set, copy):
+    "Internal: to_basic, where active contains the ids of the containers being converted"
+    obj_type = type(obj)
+    if obj_type in _scalar_types:
+        return obj
+
+    if obj_type is dict:
+        is_mapping = True
+    elif obj_type is list:
+        is_mapping = False
+    elif isinstance(obj, abc.Mapping):
+        is_mapping = True
+    elif isinstance(obj, str) or not isinstance(obj, abc.Iterable):
+        return obj
+    else:
+        is_mapping = False
+
     obj_id = id(obj)
-    if obj_id in stack:
+    if obj_id in active:
         raise Exception("Cyclical reference detected")
+    active.add(obj_id)
 
-    if isinstance(obj, abc.Mapping):
-        # This can be converted to a dictionary
-        return { k:to_basic(v, stack=stack+[obj_id]) for (k, v) in obj.items() }
-    elif isinstance(obj, str):
-        return obj
-    elif isinstance(obj, abc.Iterable):
-        return [to_basic(v, stack=stack+[obj_id]) for v in obj]
+    if is_mapping:
+        if copy or obj_type is not dict:
+            result = { k:_to_basic(v, active, copy) for (k, v) in obj.items() }
+        else:
+            result = obj
+            for k, v in obj.items():
+                converted = _to_basic(v, active, copy)
+                if converted is not v:
+                    if result is obj:
+                        result = obj.copy()
+                    result[k] = converted
     else:
-        return obj
+        if copy or obj_type is not list:
+            result = [_to_basic(v, active, copy) for v in obj]
+        else:
+            result = obj
+            for i, v in enumerate(obj):
+                converted = _to_basic(v, active, copy)
+                if converted is not v:
+                    if result is obj:
+                        result = obj.copy()
+                    result[i] = converted
+
+    active.discard(obj_id)
+    return result
 
 def derive_lang(field):
     if field in ['base_id', 'id']:
@@ -43,6 +86,8 @@ def merge_list(base, rows: typing.Iterable[dict], key=None, groups=[], many=Fals
     """Routine to merge lists of dictionaries together using one or more keys.
     The keys used are determined by first sequential key of the first row.
     If the key is an id, it will join on that, but if it is a name, it will join on that and key_ex fields.
+
+    The base must be a DataMap, as the join uses (and keeps) its join index for the key fields.
     """
     def create_key_fields(data_map, column_name):
         lang = derive_lang(column_name)
@@ -98,17 +143,19 @@ def merge_list(base, rows: typing.Iterable[dict], key=None, groups=[], many=Fals
         if not many and len(entry) > 1:
             raise ValueError(f"Key {row_key} has too many matching entries in sub data")
 
-    # Group base
-    base = { derive_key(e):e for e in base.values() }
+    # Group base. The join index is cached on the map, and shared by every join on the same keys
+    base_ids = base.join_index(key_fields).ids
     "Test the keys to see that sub's keys exist in base"
-    unlinked = [k for k in keyed_data.keys() if k not in base.keys()]
+    unlinked = keyed_data.keys() - base_ids.keys()
     if unlinked:
+        unlinked = [k for k in keyed_data.keys() if k in unlinked]
         raise Exception(
             "Several entries in sub data map cannot be joined. Their keys are " +
             ','.join('None' if e is None else str(e) for e in unlinked))
 
-    for data_key, data_entries in keyed_data.items():
-        base_entry = base[data_key]
+    # Resolve entries before merging, as merging can change the keys in the index
+    joined = [(base[base_ids[k]], entries) for (k, entries) in keyed_data.items()]
+    for base_entry, data_entries in joined:
         if key:
             if many:
                 base_entry[key] = data_entries
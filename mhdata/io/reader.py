@@ -1,6 +1,7 @@
 import os
 import re
 import collections.abc
+import contextlib
 import typing
 import json
 import re
@@ -11,7 +12,7 @@ from .datamap import DataMap
 from mhdata.util import group_fields
 from .functions import merge_list, fix_id
 
-from mhdata.io.csv import read_csv
+from mhdata.io.csv import read_csv, CsvCache
 
 def apply_schema_to_map(map, schema):
     "Internal helper to apply a marshmallow schema to the values of a map."
@@ -27,24 +28,57 @@ def apply_schema_to_map(map, schema):
         raise Exception(str(errors))
     return map
 
+def file_stamp(path):
+    "Returns a value that changes when the file at path changes, or None if it doesn't exist"
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
 class DataReader:
     """A class used to deserialize objects from the data files.
     The languages parameters sets the expected languages,
     and the required languages sets the ones that are validated for existance.
+
+    If a csv_cache is given, parsed CSV files are read through it.
     """
 
     def __init__(self, *,
             languages: typing.List,
-            data_path: str):
+            data_path: str,
+            csv_cache: CsvCache = None):
         self.languages = languages
         self.data_path = data_path
+        self.csv_cache = csv_cache
+        self._recordings = []
 
     def get_data_path(self, *rel_path):
         """Returns a file path to a file stored in the data folder using one or more
         path components. Used internally
         """
-        data_dir = os.path.join(self.data_path, *rel_path)
-        return os.path.normpath(data_dir)
+        data_dir = os.path.normpath(os.path.join(self.data_path, *rel_path))
+        for files in self._recordings:
+            if data_dir not in files:
+                files[data_dir] = file_stamp(data_dir)
+        return data_dir
+
+    @contextlib.contextmanager
+    def record_files(self):
+        """Records the data files accessed within the block.
+        Yields a dictionary of path -> file_stamp, taken when each file is first accessed"""
+        files = {}
+        self._recordings.append(files)
+        try:
+            yield files
+        finally:
+            self._recordings.remove(files)
+
+    def _read_csv(self, location):
+        "Internal helper to read a csv file, using the csv cache if there is one"
+        if self.csv_cache:
+            return self.csv_cache.read_csv(location)
+        return read_csv(location)
 
     def _validate_base_map(self, fname, basemap: DataMap, languages, error=True):
         languages_with_errors = set()
@@ -64,7 +98,7 @@ class DataReader:
         """Loads a simple csv without processing. 
         Accepts marshmallow schema to transform and validate it"""
         data_file = self.get_data_path(data_file)
-        data = read_csv(data_file)
+        data = self._read_csv(data_file)
 
         if schema:
             # When version 3 is released, this api will change
@@ -120,7 +154,7 @@ class DataReader:
         data_file = self.get_data_path(data_file)
         groups = ['name'] + groups
 
-        rows = [group_fields(row, groups=groups) for row in read_csv(data_file)]
+        rows = [group_fields(row, groups=groups) for row in self._read_csv(data_file)]
 
         basemap = DataMap(languages=languages, keys_ex=keys_ex)
         basemap.extend(rows)
@@ -84,21 +84,17 @@ class DataStitcher:
 
         data = self.reader.load_json(self._get_filename(data_file))
 
-        def derive_key(d):
-            return d[join]
-
         # validation, make sure it links
-        entry_map = { str(e[join]):e for e in self.data_map.values() }
-        converted_keys = [str(k) for k in data.keys()]
-        unlinked = [k for k in converted_keys if k not in entry_map.keys()]
+        entry_ids = self.data_map.join_index([join]).ids
+        unlinked = [k for k in data.keys() if (str(k),) not in entry_ids]
         if unlinked:
             raise Exception(
                 "Several invalid names found in sub data map. Invalid entries are " +
                 ','.join('None' if e is None else str(e) for e in unlinked))
 
         # validation complete, it may not link to all base entries but thats ok
-        for data_key, data_entry in data.items():
-            base_entry = entry_map[str(data_key)]
+        joined = [(self.data_map[entry_ids[(str(k),)]], v) for (k, v) in data.items()]
+        for base_entry, data_entry in joined:
             
             if key:
                 base_entry[key] = data_entry
@@ -153,7 +149,8 @@ class DataStitcher:
         if schema:
             results = DataMap(languages=self.languages, keys_ex=self.keys_ex)
             for entry in self.data_map.values():
-                data = entry.to_dict()
+                # The stitched map is discarded, so the schema can read its values without copies
+                data = entry.to_dict(copy=False)
                 (converted, errors) = schema.load(data, many=False) # converted
 
                 if errors:
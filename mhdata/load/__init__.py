@@ -8,18 +8,52 @@ to perform post processing and validation. Use the datafn submodule's
 collection of helper functions to better read this data.
 """
 
-from .loaddata import load_data
+import contextlib
+
+from .loaddata import load_data, loaders, LazyData, ReloadableData
 from .validate import validate
 
-def load_data_processed():
-    "Loads data from source_data/ folder, and validates and post-processes it"
+def load_data_processed(*, lazy=False, profile=None, **kwargs):
+    """Loads data from source_data/ folder, and validates and post-processes it.
+    Keyword arguments are passed to load_data.
+
+    If lazy is true, each map is loaded and post-processed on first access.
+    Validation spans every map, so it is skipped in lazy mode and left to the caller.
+
+    If a profile (such as mhdata.build.BuildProfile) is given,
+    loading, processing, and validating are measured as stages. It is ignored in lazy mode.
+    """
     from . import process
 
-    mhdata = load_data()
-    process.copy_skill_descriptions(mhdata.skill_map)
-    process.extend_decoration_chances(mhdata.decoration_map)
+    if lazy:
+        return LazyData(loaders, steps=process.steps, timings=kwargs.get('timings', None))
+
+    def stage(name):
+        return profile.stage(name) if profile is not None else contextlib.nullcontext()
+
+    with stage('load'):
+        mhdata = load_data(**kwargs)
+    with stage('process'):
+        process.run_steps(mhdata)
+
+    with stage('validate'):
+        valid = validate(mhdata)
+    if not valid:
+        raise Exception("Validation Failed")
+
+    return mhdata
+
+def load_data_reloadable():
+    """Loads, validates, and post-processes data like load_data_processed,
+    but returns a ReloadableData object with the result in its data attribute.
+
+    Call reload() on the result to load the maps affected by changed source files again.
+    Reloaded data has to be validated by the caller.
+    """
+    from . import process
 
-    if not validate(mhdata):
+    reloadable = ReloadableData(loaders, steps=process.steps)
+    if not validate(reloadable.load()):
         raise Exception("Validation Failed")
 
-    return mhdata
\ No newline at end of file
+    return reloadable
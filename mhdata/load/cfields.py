@@ -8,12 +8,18 @@ from marshmallow import fields, ValidationError, Schema, pre_load, post_dump, pr
 from mhdata.util import group_fields, ungroup_fields
 from mhdata import cfg
 
-def choice_check(*items):
-    def validate_fn(check):
-        if check not in items:
-            item_str = ", ".join(map(lambda i: i or "None", items))
+class ChoiceCheck:
+    "Validator that fails if the value is not one of the given items"
+    def __init__(self, items):
+        self.items = items
+
+    def __call__(self, check):
+        if check not in self.items:
+            item_str = ", ".join(map(lambda i: i or "None", self.items))
             raise ValidationError(f"Value {check} not one of ({item_str})")
-    return validate_fn
+
+def choice_check(*items):
+    return ChoiceCheck(items)
 
 
 def ValidatedStr(*items, **kwargs):
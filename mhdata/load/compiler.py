@@ -0,0 +1,296 @@
+"""
+Compiles marshmallow schemas into generated python functions that load data.
+
+A compiled loader performs the same conversions as Schema.load for the field types
+used by this project, with each field unrolled into straight line code
+and the pre_load grouping of BaseSchema cached per key.
+
+Compiled loaders only handle valid data. If anything unexpected happens
+(a failed validation, a value of the wrong type, an exception in a validator),
+the data is loaded again using the schema itself, so that the errors are exactly the ones marshmallow gives.
+Schemas using features the compiler does not understand are always loaded by marshmallow.
+"""
+
+import sys
+import itertools
+from collections.abc import Mapping
+
+from marshmallow import fields, missing
+from marshmallow.decorators import PRE_LOAD, POST_LOAD, VALIDATES, VALIDATES_SCHEMA
+from marshmallow.schema import UnmarshalResult
+from marshmallow.utils import is_collection
+from marshmallow.validate import Validator
+
+from .cfields import BaseSchema, NullableBool, ExcelBool, NestedPrefix, ChoiceCheck
+
+class Unsupported(Exception):
+    "Raised while compiling a schema that uses features the compiler does not handle"
+    pass
+
+class Fallback(Exception):
+    "Raised by compiled code when the data has to be loaded by marshmallow instead"
+    pass
+
+
+class Grouper:
+    """Compiled form of BaseSchema.group_fields.
+    Remembers which group each key belongs to, instead of checking every group for every key"""
+
+    def __init__(self, groups):
+        self.groups = tuple(groups)
+        self._targets = {}
+
+    def _target(self, targets, active, key):
+        if not isinstance(key, str):
+            raise Fallback()
+        target = None
+        for group in active:
+            if key.startswith(group + '_'):
+                target = (group, sys.intern(key[len(group)+1:]))
+                break
+        targets[key] = target
+        return target
+
+    def __call__(self, data):
+        # Groups that are already grouped are skipped, same as check_not_grouped
+        active = tuple(g for g in self.groups if not (g in data and isinstance(data[g], Mapping)))
+        if not active:
+            return data
+
+        targets = self._targets.get(active, None)
+        if targets is None:
+            targets = self._targets[active] = {}
+
+        result = {}
+        for key, value in data.items():
+            try:
+                target = targets[key]
+            except KeyError:
+                target = self._target(targets, active, key)
+
+            if target is None:
+                result[key] = value
+            else:
+                result.setdefault(target[0], {})[target[1]] = value
+        return result
+
+
+class SchemaCompiler:
+    """Generates the source code of the loaders for a schema and its nested schemas.
+    Each schema and field becomes a function in a shared namespace"""
+
+    def __init__(self):
+        self.namespace = {
+            'Mapping': Mapping,
+            'missing': missing,
+            'is_collection': is_collection,
+            'Fallback': Fallback
+        }
+        self.lines = []
+        self._counter = itertools.count()
+        self._schemas = {}
+
+    def _name(self, prefix):
+        return f'{prefix}_{next(self._counter)}'
+
+    def _constant(self, prefix, value):
+        name = self._name(prefix)
+        self.namespace[name] = value
+        return name
+
+    def compile(self, schema):
+        "Returns a function that loads a single item using the schema"
+        name = self.add_schema(schema)
+        source = '\n'.join(self.lines)
+        exec(compile(source, f'<compiled {type(schema).__name__}>', 'exec'), self.namespace)
+        self.source = source
+        return self.namespace[name]
+
+    def add_schema(self, schema):
+        "Generates the function for a schema, returning its name"
+        key = id(schema)
+        if key in self._schemas:
+            if self._schemas[key] is None:
+                raise Unsupported("Recursive schemas are not supported")
+            return self._schemas[key]
+        self._schemas[key] = None
+
+        if schema.partial:
+            raise Unsupported("Partial loading is not supported")
+
+        processors = schema.__processors__
+        for tag in [(PRE_LOAD, True), (POST_LOAD, False), (POST_LOAD, True), (VALIDATES_SCHEMA, True)]:
+            if processors.get(tag):
+                raise Unsupported(f"{tag} processors are not supported")
+
+        pre_load = processors.get((PRE_LOAD, False), [])
+        if pre_load and (pre_load != ['group_fields'] or type(schema).group_fields is not BaseSchema.group_fields):
+            raise Unsupported("Only the group_fields pre_load processor is supported")
+
+        body = []
+        body.append("if not isinstance(data, Mapping): raise Fallback()")
+        body.append("original = data")
+        if pre_load:
+            groups = list(schema.__groups__ or []) + schema.identify_prefixes()
+            grouper = self._constant('group', Grouper(groups))
+            body.append(f"data = {grouper}(data)")
+
+        body.append(f"result = {self._constant('dict_class', schema.dict_class)}()")
+
+        for attr_name, field in schema.fields.items():
+            if field.dump_only:
+                continue
+            if field.load_from or field.attribute:
+                raise Unsupported("load_from and attribute are not supported")
+
+            fn = self.add_field(field)
+            default = field.missing
+            if default is not missing and not callable(default):
+                body.append(f"value = data.get({attr_name!r}, {self._constant('default', default)})")
+                body.append(f"result[{attr_name!r}] = {fn}(value)")
+                continue
+
+            body.append(f"value = data.get({attr_name!r}, missing)")
+            if default is not missing:
+                body.append(f"if value is missing: value = {self._constant('default', default)}()")
+                body.append(f"result[{attr_name!r}] = {fn}(value)")
+            elif field.required:
+                body.append(f"if value is missing: raise Fallback()")
+                body.append(f"result[{attr_name!r}] = {fn}(value)")
+            else:
+                body.append(f"if value is not missing: result[{attr_name!r}] = {fn}(value)")
+
+        for attr_name in processors.get((VALIDATES, False), []):
+            validator = getattr(schema, attr_name)
+            field_name = validator.__marshmallow_kwargs__[(VALIDATES, False)]['field_name']
+            if field_name not in schema.fields:
+                raise Unsupported(f"Validator for unknown field {field_name}")
+            fn = self._constant('validates', validator)
+            body.append(f"if {field_name!r} in result: {fn}(result[{field_name!r}])")
+
+        for attr_name in processors.get((VALIDATES_SCHEMA, False), []):
+            validator = getattr(schema, attr_name)
+            kwargs = validator.__marshmallow_kwargs__[(VALIDATES_SCHEMA, False)]
+            args = 'result, original' if kwargs.get('pass_original', False) else 'result'
+            fn = self._constant('validates_schema', validator)
+            body.append(f"if {fn}({args}) is False: raise Fallback()")
+
+        body.append("return result")
+
+        name = self._name(f'load_{type(schema).__name__}')
+        self._add_function(name, 'data', body)
+        self._schemas[key] = name
+        return name
+
+    def add_field(self, field):
+        """Generates a function for a field that performs the same work as field.deserialize.
+        The function is called with the value if present, and returns the deserialized value"""
+        field_type = type(field)
+        body = []
+
+        if field_type in (NullableBool, ExcelBool) and field.null_is_false:
+            body.append("if value is None: return False")
+        if field.allow_none is True:
+            body.append("if value is None: return None")
+        else:
+            body.append("if value is None: raise Fallback()")
+
+        if field_type is fields.Integer:
+            body.append("value = int(value)")
+        elif field_type is fields.String:
+            body.append("if type(value) is not str: raise Fallback()")
+        elif field_type in (fields.Boolean, NullableBool, ExcelBool):
+            if not field.truthy:
+                body.append("value = bool(value)")
+            else:
+                truthy = self._constant('truthy', frozenset(field.truthy))
+                falsy = self._constant('falsy', frozenset(field.falsy))
+                body.append(f"if value in {truthy}: value = True")
+                body.append(f"elif value in {falsy}: value = False")
+                body.append("else: raise Fallback()")
+        elif field_type is fields.Dict:
+            body.append("if not isinstance(value, Mapping): raise Fallback()")
+        elif field_type is fields.List:
+            item_fn = self.add_field(field.container)
+            body.append("if not is_collection(value): raise Fallback()")
+            body.append(f"value = [{item_fn}(each) for each in value]")
+        elif field_type in (fields.Nested, NestedPrefix):
+            schema_fn = self.add_schema(field.schema)
+            if field.schema.many:
+                body.append("if not is_collection(value): raise Fallback()")
+                body.append(f"value = [{schema_fn}(each) for each in value]")
+            else:
+                body.append(f"value = {schema_fn}(value)")
+        else:
+            raise Unsupported(f"Field type {field_type.__name__} is not supported")
+
+        for validator in field.validators:
+            if isinstance(validator, ChoiceCheck):
+                # Values of string fields are always hashable, so a set gives the same result
+                items = frozenset(validator.items) if field_type is fields.String else validator.items
+                body.append(f"if value not in {self._constant('choices', items)}: raise Fallback()")
+            elif isinstance(validator, Validator):
+                body.append(f"{self._constant('validator', validator)}(value)")
+            else:
+                body.append(f"if {self._constant('validator', validator)}(value) is False: raise Fallback()")
+
+        body.append("return value")
+
+        name = self._name(f'field_{field.name}')
+        self._add_function(name, 'value', body)
+        return name
+
+    def _add_function(self, name, arg, body):
+        self.lines.append(f"def {name}({arg}):")
+        self.lines.extend('    ' + line for line in body)
+        self.lines.append('')
+
+
+# Loader functions of plain schema instances, by schema class
+_compiled_loaders = {}
+
+class CompiledSchema:
+    """Wraps a marshmallow schema, loading data using a compiled loader.
+    The load function returns the same results as the schema's load function.
+    If the schema cannot be compiled, every load is performed by the schema."""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.loader = None
+
+        # Only and exclude change the fields, so those schemas aren't shared
+        cacheable = not schema.only and not schema.exclude
+        schema_type = type(schema)
+        if cacheable and schema_type in _compiled_loaders:
+            self.loader = _compiled_loaders[schema_type]
+            return
+
+        try:
+            self.loader = SchemaCompiler().compile(schema)
+        except Unsupported:
+            self.loader = None
+        if cacheable:
+            _compiled_loaders[schema_type] = self.loader
+
+    @property
+    def compiled(self):
+        "Returns true if loads are performed by a compiled loader"
+        return self.loader is not None
+
+    def load(self, data, many=None, partial=None):
+        "Same as Schema.load"
+        many = self.schema.many if many is None else bool(many)
+        if self.loader is not None and not partial:
+            try:
+                if not many:
+                    return UnmarshalResult(self.loader(data), {})
+                if is_collection(data):
+                    return UnmarshalResult([self.loader(item) for item in data], {})
+            except Exception:
+                pass # marshmallow will raise or report the error
+
+        return self.schema.load(data, many=many, partial=partial)
+
+def compile_schema(schema):
+    "Returns a CompiledSchema for the marshmallow schema instance"
+    return CompiledSchema(schema)
@@ -1,19 +1,36 @@
 import os.path
+import time
+import collections
+import concurrent.futures
 from os.path import abspath, join, dirname
 from types import SimpleNamespace
 
 from mhdata import cfg
 from mhdata.io import DataMap, DataReader, DataStitcher, create_reader
 from mhdata.io.csv import read_csv
+from mhdata.io.reader import file_stamp
 
 from . import schema
+from .compiler import compile_schema
 
 reader = create_reader()
 
+# Mapping of attribute name -> function that loads it, in load order.
+# Each loader is independent of the others, and is registered using the loader decorator
+loaders = collections.OrderedDict()
+
+def loader(name):
+    "Decorator to register a function that loads the data for an attribute of the load_data result"
+    def deco(fn):
+        loaders[name] = fn
+        return fn
+    return deco
+
 def transform_dmap(dmap: DataMap, obj_schema):
-    """Returns a new datamap, 
+    """Returns a new datamap,
     where the items in the original have run through the marshmallow schema."""
     results = DataMap()
+    obj_schema = compile_schema(obj_schema)
     for entry_id, entry in dmap.items():
         data = entry.to_dict()
         (converted, errors) = obj_schema.load(data, many=False) # converted
@@ -24,45 +41,50 @@ def transform_dmap(dmap: DataMap, obj_schema):
         results.add_entry(entry_id, converted)
     return results
 
-def load_data():
-    """Loads all data from the source_data/ directory
-    
-    All data is merged together using data stitchers and run through a schema.
-    The schemas perform additional type transformations, column merging into dicts (groups),
-    and minor validations.
-    """
-    result = SimpleNamespace()
-
-    result.item_map = (DataStitcher(reader, dir="items")
+@loader('item_map')
+def load_item_map():
+    return (DataStitcher(reader, dir="items")
                     .base_csv("item_base.csv")
                     .translate("item_base_translations.csv")
-                    .get(schema=schema.ItemSchema()))
+                    .get(schema=compile_schema(schema.ItemSchema())))
 
-    result.item_combinations = reader.load_list_csv(
+@loader('item_combinations')
+def load_item_combinations():
+    return reader.load_list_csv(
         'items/item_combination_list.csv',
-        schema=schema.ItemCombinationSchema())
+        schema=compile_schema(schema.ItemCombinationSchema()))
 
-    result.location_map = (DataStitcher(reader, dir="locations/")
+@loader('location_map')
+def load_location_map():
+    return (DataStitcher(reader, dir="locations/")
                     .base_csv('location_base.csv')
                     .add_csv("location_items.csv", key="items")
                     .add_csv("location_camps.csv", key="camps")
-                    .get(schema=schema.LocationSchema()))
+                    .get(schema=compile_schema(schema.LocationSchema())))
 
-    result.skill_map = (DataStitcher(reader, dir="skills/")
+@loader('skill_map')
+def load_skill_map():
+    return (DataStitcher(reader, dir="skills/")
                     .base_csv("skill_base.csv")
                     .translate('skill_base_translations.csv')
                     .add_csv("skill_levels.csv", key="levels")
-                    .get(schema=schema.SkillSchema()))
+                    .get(schema=compile_schema(schema.SkillSchema())))
 
-    result.charm_map = (DataStitcher(reader, dir="charms/")
+@loader('charm_map')
+def load_charm_map():
+    return (DataStitcher(reader, dir="charms/")
                     .base_csv("charm_base.csv")
                     .translate('charm_base_translations.csv')
                     .add_csv("charm_craft.csv", key="craft")
-                    .get(schema=schema.CharmSchema()))
+                    .get(schema=compile_schema(schema.CharmSchema())))
 
-    result.monster_reward_conditions_map = reader.load_base_csv("monsters/reward_conditions_base.csv", ['en'])
+@loader('monster_reward_conditions_map')
+def load_monster_reward_conditions_map():
+    return reader.load_base_csv("monsters/reward_conditions_base.csv", ['en'])
 
-    result.monster_map = (DataStitcher(reader, dir="monsters/")
+@loader('monster_map')
+def load_monster_map():
+    return (DataStitcher(reader, dir="monsters/")
                     .base_csv("monster_base.csv")
                     .translate("monster_base_translations.csv")
                     .add_csv("monster_weaknesses.csv", key="weaknesses")
@@ -71,68 +93,255 @@ def load_data():
                     .add_csv_ext("monster_ailments.csv", key="ailments")
                     .add_csv("monster_habitats.csv", key="habitats")
                     .add_csv("monster_rewards.csv", key="rewards")
-                    .get(schema=schema.MonsterSchema()))
+                    .get(schema=compile_schema(schema.MonsterSchema())))
 
-    result.armor_map = (DataStitcher(reader, dir="armors/")
+@loader('armor_map')
+def load_armor_map():
+    return (DataStitcher(reader, dir="armors/")
                     .base_csv("armor_base.csv")
                     .translate("armor_base_translations.csv")
                     .add_csv_ext("armor_craft_ext.csv", key="craft")
                     .add_csv_ext("armor_skills_ext.csv", key="skills")
-                    .get(schema=schema.ArmorSchema()))
+                    .get(schema=compile_schema(schema.ArmorSchema())))
 
-    result.armorset_map = (DataStitcher(reader, dir="armors/")
+@loader('armorset_map')
+def load_armorset_map():
+    return (DataStitcher(reader, dir="armors/")
                     .base_csv("armorset_base.csv")
                     .translate("armorset_base_translations.csv")
-                    .get(schema=schema.ArmorSetSchema()))
+                    .get(schema=compile_schema(schema.ArmorSetSchema())))
 
-    result.armorset_bonus_map = (DataStitcher(reader, dir="armors/")
+@loader('armorset_bonus_map')
+def load_armorset_bonus_map():
+    return (DataStitcher(reader, dir="armors/")
                     .base_csv("armorset_bonus_base.csv")
                     .translate("armorset_bonus_base_translations.csv")
-                    .get(schema=schema.ArmorSetBonus()))
+                    .get(schema=compile_schema(schema.ArmorSetBonus())))
 
+@loader('weapon_ammo_map')
+def load_weapon_ammo_map():
     # Load Ammo config.
-    result.weapon_ammo_map = reader.load_keymap_csv("weapons/weapon_ammo.csv", schema.WeaponAmmoSchema())
+    return reader.load_keymap_csv("weapons/weapon_ammo.csv", compile_schema(schema.WeaponAmmoSchema()))
 
-    # Load weapon data
-    result.weapon_map = (DataStitcher(reader, dir="weapons/", keys_ex=['weapon_type'])
+@loader('weapon_map')
+def load_weapon_map():
+    return (DataStitcher(reader, dir="weapons/", keys_ex=['weapon_type'])
                     .base_csv("weapon_base.csv")
                     .translate('weapon_base_translations.csv')
                     .add_csv_ext("weapon_sharpness.csv", key="sharpness")
                     .add_csv_ext("weapon_bow_ext.csv", key="bow")
                     .add_csv("weapon_craft.csv", key="craft")
-                    .get(schema=schema.WeaponSchema()))
+                    .get(schema=compile_schema(schema.WeaponSchema())))
 
+@loader('weapon_melodies')
+def load_weapon_melodies():
     # Load weapon hunting horn songs
-    result.weapon_melodies = (DataStitcher(reader, dir="weapons")
+    return (DataStitcher(reader, dir="weapons")
                     .base_csv("weapon_melody_base.csv")
                     .translate('weapon_melody_base_translations.csv')
                     .add_csv("weapon_melody_notes.csv", key='notes')
-                    .get(schema=schema.WeaponMelodySchema()))
+                    .get(schema=compile_schema(schema.WeaponMelodySchema())))
 
-    # Load Kinsects
-    result.kinsect_map = (DataStitcher(reader, dir='weapons/')
+@loader('kinsect_map')
+def load_kinsect_map():
+    return (DataStitcher(reader, dir='weapons/')
                     .base_csv('kinsect_base.csv')
                     .translate('kinsect_base_translations.csv')
                     .add_csv_ext('kinsect_craft_ext.csv', key='craft')
-                    .get(schema=schema.KinsectSchema()))
+                    .get(schema=compile_schema(schema.KinsectSchema())))
 
-    # Load decoration data
-    result.decoration_map = (DataStitcher(reader, dir="decorations/")
+@loader('decoration_map')
+def load_decoration_map():
+    return (DataStitcher(reader, dir="decorations/")
                     .base_csv("decoration_base.csv")
                     .translate('decoration_base_translations.csv')
-                    .get(schema=schema.DecorationSchema()))
+                    .get(schema=compile_schema(schema.DecorationSchema())))
 
-    # Load Quest data
-    result.quest_map = (DataStitcher(reader, dir="quests/", use_id=True)
+@loader('quest_map')
+def load_quest_map():
+    return (DataStitcher(reader, dir="quests/", use_id=True)
                     .base_csv("quest_base.csv")
                     .translate('quest_base_translations.csv')
                     .add_csv('quest_monsters.csv', key='monsters')
                     .add_csv('quest_rewards.csv', key='rewards')
-                    .get(schema=schema.QuestSchema()))
+                    .get(schema=compile_schema(schema.QuestSchema())))
 
-    result.tool_map = (DataStitcher(reader, dir="tools/")
+@loader('tool_map')
+def load_tool_map():
+    return (DataStitcher(reader, dir="tools/")
                 .base_csv("tool_base.csv")
                 .translate('tool_base_translations.csv')
-                .get(schema=schema.ToolSchema()))
+                .get(schema=compile_schema(schema.ToolSchema())))
+
+class LazyData:
+    """A namespace of loaded data, where each map is loaded on first attribute access and then memoized.
+
+    Steps are (fn, dependencies) tuples that post-process the loaded data.
+    A step runs once, right after the first of its dependencies is loaded,
+    and is called with every map in its dependencies (loading them if necessary).
+    """
+
+    def __init__(self, loaders, *, steps=[], timings=None):
+        self._loaders = loaders
+        self._pending_steps = list(steps)
+        self._timings = timings
+
+    def is_loaded(self, name):
+        "Returns true if the map has already been loaded"
+        return name in self.__dict__
+
+    def load_all(self):
+        "Loads all maps that have not been loaded yet, and returns self"
+        for name in self._loaders.keys():
+            getattr(self, name)
+        return self
+
+    def __getattr__(self, name):
+        # Only called when the attribute hasn't been loaded yet
+        if name.startswith('_') or name not in self._loaders:
+            raise AttributeError(f"No data named {name}")
+
+        _, value, elapsed = run_loader(name, self._loaders)
+        self.__dict__[name] = value
+        if self._timings is not None:
+            self._timings[name] = elapsed
+
+        # Steps are removed before running, so that loading their other dependencies cannot rerun them
+        ready_steps = [s for s in self._pending_steps if name in s[1]]
+        self._pending_steps = [s for s in self._pending_steps if name not in s[1]]
+        for fn, dependencies in ready_steps:
+            fn(*(getattr(self, d) for d in dependencies))
+
+        return value
+
+class ReloadableData:
+    """Loads data while remembering the source files read by each map,
+    so that only the maps affected by changed files are loaded again.
+
+    Steps are (fn, dependencies) tuples, same as LazyData. Maps that share a step
+    are always loaded together, and their steps run again after every load.
+    The loaded maps are attributes of the data attribute.
+    """
+
+    def __init__(self, loaders=loaders, *, steps=[], reader=reader):
+        self.data = SimpleNamespace()
+        self._loaders = loaders
+        self._steps = list(steps)
+        self._reader = reader
+
+        # Mapping of map name -> { path: file_stamp } of the files it was loaded from
+        self._sources = {}
+
+    def _groups(self, names):
+        "Splits names into groups of maps that have to be loaded together, in load order"
+        remaining = set(names)
+        groups = []
+        for name in self._loaders.keys():
+            if name not in remaining:
+                continue
+
+            group = { name }
+            expanded = True
+            while expanded:
+                expanded = False
+                for _, dependencies in self._steps:
+                    if not group.isdisjoint(dependencies) and not group.issuperset(dependencies):
+                        group.update(dependencies)
+                        expanded = True
+
+            groups.append(group)
+            remaining -= group
+        return groups
+
+    def _load_group(self, group):
+        "Loads a group of maps and runs their steps, returning (values, sources) without storing them"
+        values = {}
+        sources = {}
+        for name in self._loaders.keys():
+            if name in group:
+                with self._reader.record_files() as files:
+                    values[name] = self._loaders[name]()
+                sources[name] = files
+
+        for fn, dependencies in self._steps:
+            if group.isdisjoint(dependencies):
+                continue
+            with self._reader.record_files() as files:
+                fn(*(values[d] for d in dependencies))
+            for name in dependencies:
+                sources[name].update(files)
+
+        return values, sources
+
+    def _store(self, values, sources):
+        for name, value in values.items():
+            setattr(self.data, name, value)
+        self._sources.update(sources)
+
+    def load(self):
+        "Loads every map and returns the data"
+        for group in self._groups(self._loaders.keys()):
+            self._store(*self._load_group(group))
+        return self.data
+
+    def changed(self):
+        "Returns the names of the maps that read a file that changed since they were loaded"
+        return set(name for (name, files) in self._sources.items()
+            if any(file_stamp(path) != stamp for (path, stamp) in files.items()))
+
+    def reload(self):
+        """Loads the maps affected by changed files again, and returns the names of the reloaded maps.
+        If a map fails to load, the error is printed and the previous data is kept until its files change again."""
+        reloaded = set()
+        for group in self._groups(self.changed()):
+            try:
+                values, sources = self._load_group(group)
+            except Exception as ex:
+                print(f"Error while reloading {', '.join(sorted(group))}: {ex}")
+                for name in group:
+                    self._sources[name] = { path:file_stamp(path) for path in self._sources[name] }
+                continue
+
+            self._store(values, sources)
+            reloaded.update(group)
+        return reloaded
+
+def run_loader(name, loaders=loaders):
+    "Runs a single registered loader, returning a (name, result, elapsed seconds) tuple"
+    start = time.perf_counter()
+    result = loaders[name]()
+    return (name, result, time.perf_counter() - start)
+
+def load_data(*, lazy=False, workers=1, timings=None):
+    """Loads all data from the source_data/ directory
+
+    All data is merged together using data stitchers and run through a schema.
+    The schemas perform additional type transformations, column merging into dicts (groups),
+    and minor validations.
+
+    Each map is loaded independently. If workers is greater than 1, maps are loaded
+    in a process pool of that size. Use workers=None to use one process per cpu.
+    The result is the same regardless of the number of workers.
+
+    If lazy is true, a LazyData object is returned instead, and maps are only loaded when accessed.
+    The workers argument is ignored in lazy mode.
+
+    If a timings dictionary is given, it is filled with the seconds taken per map.
+    """
+    if lazy:
+        return LazyData(loaders, timings=timings)
+
+    if workers is not None and workers <= 1:
+        completed = [run_loader(name) for name in loaders.keys()]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            # map() returns results in submission order, which keeps the result deterministic
+            completed = list(executor.map(run_loader, loaders.keys()))
+
+    result = SimpleNamespace()
+    for name, value, elapsed in completed:
+        setattr(result, name, value)
+        if timings is not None:
+            timings[name] = elapsed
 
-    return result
\ No newline at end of file
+    return result
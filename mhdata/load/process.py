@@ -2,14 +2,30 @@
 Additional import step processes isolated to a separate file.
 """
 
-from mhdata.io import DataMap, data_path
-from mhdata.io.csv import read_csv
+from mhdata.io import DataMap
 from decimal import *
 
-from os.path import join
-
 from mhdata import cfg
 
+from .loaddata import reader
+
+# List of (function, dependencies) tuples, registered using the process_step decorator
+steps = []
+
+def process_step(*dependencies):
+    """Decorator to register a post-processing step of load_data_processed.
+    Dependencies are the names of the maps the step receives as arguments, in order."""
+    def deco(fn):
+        steps.append((fn, dependencies))
+        return fn
+    return deco
+
+def run_steps(mhdata):
+    "Runs every registered process step against fully loaded data"
+    for fn, dependencies in steps:
+        fn(*(getattr(mhdata, d) for d in dependencies))
+
+@process_step('skill_map')
 def copy_skill_descriptions(skill_map: DataMap):
     """Copies the descriptions of certain skill levels to the skill tree.
 
@@ -33,6 +49,7 @@ def copy_skill_descriptions(skill_map: DataMap):
         for language in cfg.supported_languages:
             tree_entry['description'][language] = level_entry['description'][language]
 
+@process_step('decoration_map')
 def extend_decoration_chances(decoration_map: DataMap):
     """Calculates the drop tables given the decoration map.
 
@@ -45,7 +62,8 @@ def extend_decoration_chances(decoration_map: DataMap):
     """
 
     jewel_to_table_odds = {}
-    droprates = read_csv(join(data_path, "decorations/decoration_droprates.csv"))
+    # Read through the shared reader, so that the file is tracked as a source of the decoration map
+    droprates = reader.load_list_csv("decorations/decoration_droprates.csv")
     for row in droprates:
         entries = {}
         for i in range(5, 14):
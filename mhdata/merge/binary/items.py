@@ -61,7 +61,7 @@ def register_combinations(mhdata, item_updater: ItemUpdater):
         
 def update_items(item_updater: ItemUpdater, *, mhdata=None):
     if not mhdata:
-        mhdata = load_data()
+        mhdata = load_data(lazy=True)
         print("Existing Data loaded. Using to expand item list")
 
     new_item_map = DataMap(languages='en', start_id=mhdata.item_map.max_id+1)
@@ -141,12 +141,10 @@ def update_items(item_updater: ItemUpdater, *, mhdata=None):
     # Third pass. Items need to be reordered based on type
 
     unsorted_item_map = new_item_map # store reference to former map
+    unsorted_item_map.add_index('category', 'subcategory')
     def filter_category(category, subcategory=None):
         "helper that returns items and then removes from unsorted item map"
-        results = []
-        for item in unsorted_item_map.values():
-            if item['category'] == category and item['subcategory'] == subcategory:
-                results.append(item)
+        results = unsorted_item_map.where(category=category, subcategory=subcategory)
         for result in results:
             del unsorted_item_map[result.id]
         return results
@@ -8,7 +8,7 @@ writer = create_writer()
 
 def merge_weapons():
     inc_data = requests.get("https://mhw-db.com/weapons").json()
-    data = load_data().weapon_map
+    data = load_data(lazy=True).weapon_map
 
     not_exist = []
     mismatches_atk = []
@@ -0,0 +1,18 @@
+"""
+A read-only query library over a built database (mhw.db).
+
+Open the database using QueryDatabase, which provides typed lookups
+(items by name, item sources, weapon upgrade trees, armor sets, monster hitzones),
+and a full text search of every name if the database has a search index.
+The snapshot submodule reads the columnar snapshot written by the build, when pyarrow is installed.
+A single QueryDatabase can be shared by every thread of a server.
+Results are returned as the immutable types of the results submodule.
+"""
+
+from .pool import ConnectionPool, LRUCache
+from .database import QueryDatabase
+from .search import search, SearchResult
+from .snapshot import Snapshot, read_snapshot, snapshot_families
+from .results import (
+    Item, LocationSource, MonsterRewardSource, QuestRewardSource, ItemSources,
+    Weapon, WeaponNode, SkillLevel, ArmorPiece, SetBonusRank, SetBonus, ArmorSet, Hitzone)
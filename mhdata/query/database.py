@@ -0,0 +1,269 @@
+import functools
+
+from .pool import ConnectionPool, LRUCache
+from .search import search
+from .results import (
+    Item, LocationSource, MonsterRewardSource, QuestRewardSource, ItemSources,
+    Weapon, WeaponNode, SkillLevel, ArmorPiece, SetBonusRank, SetBonus, ArmorSet, Hitzone)
+
+# Statements are kept as constants, so every call uses the same sql and reuses the prepared statement.
+# The language is always the first parameter.
+
+item_sql = '''
+    SELECT i.id, t.name, t.description, i.category, i.subcategory, i.rarity,
+        i.buy_price, i.sell_price, i.carry_limit, i.points, i.icon_name, i.icon_color
+    FROM item i JOIN item_text t ON t.id = i.id AND t.lang_id = ?
+    WHERE i.id = ?'''
+
+location_sources_sql = '''
+    SELECT li.location_id, lt.name, li.area, li.rank, li.stack, li.percentage, li.nodes
+    FROM location_item li JOIN location_text lt ON lt.id = li.location_id AND lt.lang_id = ?
+    WHERE li.item_id = ?
+    ORDER BY li.id'''
+
+monster_sources_sql = '''
+    SELECT r.monster_id, mt.name, ct.name, r.rank, r.stack, r.percentage
+    FROM monster_reward r
+        JOIN monster_text mt ON mt.id = r.monster_id AND mt.lang_id = ?
+        LEFT JOIN monster_reward_condition_text ct ON ct.id = r.condition_id AND ct.lang_id = mt.lang_id
+    WHERE r.item_id = ?
+    ORDER BY r.id'''
+
+quest_sources_sql = '''
+    SELECT r.quest_id, qt.name, r."group", r.stack, r.percentage
+    FROM quest_reward r JOIN quest_text qt ON qt.id = r.quest_id AND qt.lang_id = ?
+    WHERE r.item_id = ?
+    ORDER BY r.id'''
+
+# Union instead of union all, so a cycle in the data cannot recurse forever
+weapon_root_sql = '''
+    WITH RECURSIVE chain(id, previous_id) AS (
+        SELECT id, previous_weapon_id FROM weapon WHERE id = ?
+        UNION SELECT w.id, w.previous_weapon_id FROM weapon w JOIN chain c ON w.id = c.previous_id)
+    SELECT id FROM chain WHERE previous_id IS NULL'''
+
+# Names are read using a subquery, as joining weapon_text makes sqlite build a bloom filter over the whole table.
+# The language is the second parameter here
+weapon_tree_sql = '''
+    WITH RECURSIVE tree(id) AS (
+        SELECT ?
+        UNION SELECT w.id FROM weapon w JOIN tree t ON w.previous_weapon_id = t.id)
+    SELECT w.id, (SELECT wt.name FROM weapon_text wt WHERE wt.id = w.id AND wt.lang_id = ?),
+        w.weapon_type, w.rarity, w.attack, w.affinity, w.element1, w.element1_attack,
+        w.slot_1, w.slot_2, w.slot_3, w.final, w.previous_weapon_id
+    FROM tree JOIN weapon w ON w.id = tree.id
+    ORDER BY w.order_id'''
+
+armorset_sql = '''
+    SELECT s.id, st.name, s.rank, s.armorset_bonus_id
+    FROM armorset s JOIN armorset_text st ON st.id = s.id AND st.lang_id = ?
+    WHERE s.id = ?'''
+
+armorset_pieces_sql = '''
+    SELECT a.id, at.name, a.armor_type, a.rarity, a.defense_base, a.defense_max, a.slot_1, a.slot_2, a.slot_3
+    FROM armor a JOIN armor_text at ON at.id = a.id AND at.lang_id = ?
+    WHERE a.armorset_id = ?
+    ORDER BY a.order_id'''
+
+armorset_skills_sql = '''
+    SELECT s.armor_id, s.skilltree_id, t.name, s.level
+    FROM armor_skill s
+        JOIN armor a ON a.id = s.armor_id
+        JOIN skilltree_text t ON t.id = s.skilltree_id AND t.lang_id = ?
+    WHERE a.armorset_id = ?
+    ORDER BY s.rowid'''
+
+setbonus_sql = '''
+    SELECT name FROM armorset_bonus_text WHERE lang_id = ? AND id = ?'''
+
+setbonus_ranks_sql = '''
+    SELECT b.skilltree_id, t.name, b.required
+    FROM armorset_bonus_skill b JOIN skilltree_text t ON t.id = b.skilltree_id AND t.lang_id = ?
+    WHERE b.setbonus_id = ?
+    ORDER BY b.required, b.rowid'''
+
+hitzones_sql = '''
+    SELECT ht.name, h.cut, h.impact, h.shot, h.fire, h.water, h.ice, h.thunder, h.dragon, h.ko
+    FROM monster_hitzone h JOIN monster_hitzone_text ht ON ht.id = h.id AND ht.lang_id = ?
+    WHERE h.monster_id = ?
+    ORDER BY h.id'''
+
+# Marks a result missing from the cache, as None is a valid result
+_missing = object()
+
+def cached_query(fn):
+    "Decorator that stores the results of a QueryDatabase method in its result cache"
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        result = self._results.get(key, _missing)
+        if result is _missing:
+            result = fn(self, *args, **kwargs)
+            self._results.put(key, result)
+        return result
+    return wrapper
+
+class QueryDatabase:
+    """Typed lookups over a built database, safe to share between threads.
+
+    Queries run on a pool of read-only connections (see ConnectionPool),
+    and the last cache_size results are kept in memory.
+    Texts are returned in the requested language, which defaults to english."""
+
+    def __init__(self, filename, *, pool_size=4, cache_size=1024, cached_statements=128, immutable=True):
+        self.pool = ConnectionPool(filename,
+            size=pool_size, immutable=immutable, cached_statements=cached_statements)
+        self._results = LRUCache(cache_size)
+
+        with self.pool.connection() as conn:
+            self.languages = [lang for (lang,) in conn.execute("SELECT id FROM language ORDER BY rowid")]
+
+        # Names are looked up using the (lang_id, name) index of each text table
+        languages = ', '.join(f"'{lang}'" for lang in self.languages)
+        self._find_sql = {
+            table: f"SELECT id, lang_id FROM {table}_text WHERE lang_id IN ({languages}) AND name = ?"
+            for table in ('item', 'weapon', 'armorset', 'monster')
+        }
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _fetch(self, sql, params):
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _find_id(self, table, name, lang):
+        "Returns the id of the entry of the table with the name, or None if there is no such entry"
+        if lang is not None:
+            rows = self._fetch(f"SELECT id FROM {table}_text WHERE lang_id = ? AND name = ?", (lang, name))
+            return rows[0][0] if rows else None
+
+        # Prefer matches in earlier languages, so english names win over translations
+        matches = self._fetch(self._find_sql[table], (name,))
+        if not matches:
+            return None
+        order = { lang: idx for (idx, lang) in enumerate(self.languages) }
+        return min(matches, key=lambda row: order[row[1]])[0]
+
+    @cached_query
+    def item_id(self, name, lang=None):
+        "Returns the id of the item with the name. If lang is None, the name can be in any language"
+        return self._find_id('item', name, lang)
+
+    @cached_query
+    def weapon_id(self, name, lang=None):
+        "Returns the id of the weapon with the name. If lang is None, the name can be in any language"
+        return self._find_id('weapon', name, lang)
+
+    @cached_query
+    def armorset_id(self, name, lang=None):
+        "Returns the id of the armor set with the name. If lang is None, the name can be in any language"
+        return self._find_id('armorset', name, lang)
+
+    @cached_query
+    def monster_id(self, name, lang=None):
+        "Returns the id of the monster with the name. If lang is None, the name can be in any language"
+        return self._find_id('monster', name, lang)
+
+    @cached_query
+    def item(self, item_id, lang='en'):
+        "Returns the Item with the id, or None if it doesn't exist"
+        rows = self._fetch(item_sql, (lang, item_id))
+        return Item(*rows[0]) if rows else None
+
+    def item_by_name(self, name, lang='en'):
+        "Returns the Item whose name in any language matches, with texts in lang, or None"
+        item_id = self.item_id(name)
+        return self.item(item_id, lang) if item_id is not None else None
+
+    @cached_query
+    def item_sources(self, item_id, lang='en'):
+        "Returns the ItemSources of an item: the locations, monster rewards, and quest rewards dropping it"
+        with self.pool.connection() as conn:
+            return ItemSources(
+                locations=tuple(LocationSource(*row) for row in conn.execute(location_sources_sql, (lang, item_id))),
+                monster_rewards=tuple(
+                    MonsterRewardSource(*row) for row in conn.execute(monster_sources_sql, (lang, item_id))),
+                quest_rewards=tuple(QuestRewardSource(*row) for row in conn.execute(quest_sources_sql, (lang, item_id))))
+
+    @cached_query
+    def weapon_tree(self, weapon_id, lang='en'):
+        """Returns the upgrade tree containing the weapon, as the WeaponNode of the first weapon of the tree.
+        Returns None if the weapon doesn't exist"""
+        with self.pool.connection() as conn:
+            roots = conn.execute(weapon_root_sql, (weapon_id,)).fetchall()
+            if not roots:
+                return None
+            rows = conn.execute(weapon_tree_sql, (roots[0][0], lang)).fetchall()
+
+        weapons = {}
+        children = {}
+        for row in rows:
+            weapon = Weapon(*row[:-2], final=bool(row[-2]))
+            weapons[weapon.id] = weapon
+            children.setdefault(row[-1], []).append(weapon.id)
+
+        def create_node(node_id):
+            upgrades = tuple(create_node(child_id) for child_id in children.get(node_id, []))
+            return WeaponNode(weapons[node_id], upgrades)
+
+        return create_node(roots[0][0])
+
+    @cached_query
+    def armorset(self, armorset_id, lang='en'):
+        "Returns the ArmorSet with the id, including its pieces, skills, and set bonus. Returns None if it doesn't exist"
+        with self.pool.connection() as conn:
+            rows = conn.execute(armorset_sql, (lang, armorset_id)).fetchall()
+            if not rows:
+                return None
+            set_id, name, rank, bonus_id = rows[0]
+
+            piece_skills = {}
+            for armor_id, skilltree_id, skill_name, level in conn.execute(armorset_skills_sql, (lang, armorset_id)):
+                piece_skills.setdefault(armor_id, []).append(SkillLevel(skilltree_id, skill_name, level))
+
+            pieces = tuple(
+                ArmorPiece(*row, skills=tuple(piece_skills.get(row[0], [])))
+                for row in conn.execute(armorset_pieces_sql, (lang, armorset_id)))
+
+            bonus = None
+            if bonus_id is not None:
+                bonus_rows = conn.execute(setbonus_sql, (lang, bonus_id)).fetchall()
+                ranks = tuple(SetBonusRank(*row) for row in conn.execute(setbonus_ranks_sql, (lang, bonus_id)))
+                bonus = SetBonus(bonus_id, bonus_rows[0][0] if bonus_rows else None, ranks)
+
+        # Total levels, in order of first appearance
+        totals = {}
+        for piece in pieces:
+            for skill in piece.skills:
+                if skill.skilltree_id in totals:
+                    total = totals[skill.skilltree_id]
+                    totals[skill.skilltree_id] = total._replace(level=total.level + skill.level)
+                else:
+                    totals[skill.skilltree_id] = skill
+
+        return ArmorSet(set_id, name, rank, pieces, tuple(totals.values()), bonus)
+
+    @cached_query
+    def monster_hitzones(self, monster_id, lang='en'):
+        "Returns the Hitzones of a monster, or an empty tuple if it has none"
+        return tuple(Hitzone(*row) for row in self._fetch(hitzones_sql, (lang, monster_id)))
+
+    @cached_query
+    def search(self, text, *, lang=None, entity=None, descriptions=False, limit=20):
+        """Searches the names of every entity type for text, returning a tuple of SearchResult.
+        Requires the search index, see mhdata.query.search.search for the arguments"""
+        with self.pool.connection() as conn:
+            return tuple(search(conn, text, lang=lang, entity=entity, descriptions=descriptions, limit=limit))
+
+    def cache_info(self):
+        "Returns the (hits, misses, size) of the result cache"
+        return (self._results.hits, self._results.misses, len(self._results))
@@ -0,0 +1,128 @@
+import os.path
+import queue
+import pathlib
+import sqlite3
+import threading
+import collections
+import contextlib
+
+class ConnectionPool:
+    """A fixed size set of read-only sqlite connections, which can be borrowed by any thread.
+
+    Connections are opened in read only mode. If immutable is true, sqlite assumes that the file
+    never changes while open, which skips all locking. Do not use immutable when the database may be replaced.
+    If shared_cache is true, the connections share a single page cache.
+    Each connection keeps the last cached_statements prepared statements, reusing them for identical sql."""
+
+    def __init__(self, filename, *, size=4, immutable=True, shared_cache=True, cached_statements=128):
+        if not os.path.exists(filename):
+            raise Exception(f"Database {filename} does not exist")
+
+        uri = pathlib.Path(os.path.abspath(filename)).as_uri() + '?mode=ro'
+        if immutable:
+            uri += '&immutable=1'
+        if shared_cache:
+            uri += '&cache=shared'
+
+        self.uri = uri
+        self.size = size
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        # Connections move between threads, but are only used by one thread at a time
+        conn = sqlite3.connect(
+            self.uri, uri=True, check_same_thread=False, cached_statements=self.cached_statements)
+        self._all.append(conn)
+        return conn
+
+    def _acquire(self):
+        with self._lock:
+            if self._closed:
+                raise Exception("Connection pool is closed")
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if len(self._all) < self.size:
+                return self._connect()
+
+        # Every connection is in use, wait for one to be returned or for the pool to close
+        conn = self._idle.get()
+        if conn is None:
+            # Closing puts None in the queue. It is put back to wake the next waiting thread
+            self._idle.put(None)
+            raise Exception("Connection pool is closed")
+        return conn
+
+    def _release(self, conn):
+        with self._lock:
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        "Borrows a connection for the duration of the block"
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Closes every connection. Connections still borrowed are closed as well,
+        and threads waiting for a connection raise an exception"""
+        with self._lock:
+            self._closed = True
+            for conn in self._all:
+                conn.close()
+            self._all = []
+
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+            self._idle.put(None)
+
+class LRUCache:
+    "A thread safe mapping that keeps the most recently used maxsize entries"
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
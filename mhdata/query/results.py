@@ -0,0 +1,116 @@
+"""
+Result types returned by the query library.
+Results are immutable, as cached results are shared between callers and threads.
+"""
+
+from typing import NamedTuple, Optional, Tuple
+
+class Item(NamedTuple):
+    id: int
+    name: str
+    description: str
+    category: str
+    subcategory: str
+    rarity: int
+    buy_price: int
+    sell_price: int
+    carry_limit: int
+    points: int
+    icon_name: str
+    icon_color: str
+
+class LocationSource(NamedTuple):
+    location_id: int
+    location_name: str
+    area: int
+    rank: str
+    stack: int
+    percentage: int
+    nodes: int
+
+class MonsterRewardSource(NamedTuple):
+    monster_id: int
+    monster_name: str
+    condition: str
+    rank: str
+    stack: int
+    percentage: int
+
+class QuestRewardSource(NamedTuple):
+    quest_id: int
+    quest_name: str
+    group: str
+    stack: int
+    percentage: int
+
+class ItemSources(NamedTuple):
+    "Every place an item can be obtained from"
+    locations: Tuple[LocationSource, ...]
+    monster_rewards: Tuple[MonsterRewardSource, ...]
+    quest_rewards: Tuple[QuestRewardSource, ...]
+
+class Weapon(NamedTuple):
+    id: int
+    name: str
+    weapon_type: str
+    rarity: int
+    attack: int
+    affinity: int
+    element1: Optional[str]
+    element1_attack: Optional[int]
+    slot_1: int
+    slot_2: int
+    slot_3: int
+    final: bool
+
+class WeaponNode(NamedTuple):
+    "A weapon in an upgrade tree, with the weapons it upgrades into"
+    weapon: Weapon
+    upgrades: Tuple['WeaponNode', ...]
+
+class SkillLevel(NamedTuple):
+    skilltree_id: int
+    name: str
+    level: int
+
+class ArmorPiece(NamedTuple):
+    id: int
+    name: str
+    armor_type: str
+    rarity: int
+    defense_base: int
+    defense_max: int
+    slot_1: int
+    slot_2: int
+    slot_3: int
+    skills: Tuple[SkillLevel, ...]
+
+class SetBonusRank(NamedTuple):
+    skilltree_id: int
+    name: str
+    required: int
+
+class SetBonus(NamedTuple):
+    id: int
+    name: str
+    ranks: Tuple[SetBonusRank, ...]
+
+class ArmorSet(NamedTuple):
+    id: int
+    name: str
+    rank: str
+    pieces: Tuple[ArmorPiece, ...]
+    skills: Tuple[SkillLevel, ...] # total skill levels of every piece
+    bonus: Optional[SetBonus]
+
+class Hitzone(NamedTuple):
+    name: str
+    cut: int
+    impact: int
+    shot: int
+    fire: int
+    water: int
+    ice: int
+    thunder: int
+    dragon: int
+    ko: int
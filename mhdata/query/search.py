@@ -0,0 +1,97 @@
+"""
+Full text search over the names and descriptions of every entity, using the sqlite fts5 extension.
+
+The search index is created after the build (see mhdata.build.create_search_index), and consists of:
+- search_entry: a regular table with a row per (entity type, entity id, language), holding the texts
+- search_trigram: an fts5 index of the names using the trigram tokenizer.
+    It matches any substring of 3 or more characters, which also works for languages without spaces.
+- search_word: an fts5 index of the names and descriptions using the unicode61 tokenizer.
+    It is used for searches shorter than 3 characters, which match the start of words,
+    and for searches including descriptions. Runs of CJK characters are single words.
+
+Translations equal to the english text are not stored, as they are english fallbacks.
+"""
+
+from typing import NamedTuple
+
+entry_table = 'search_entry'
+trigram_table = 'search_trigram'
+word_table = 'search_word'
+
+class SearchResult(NamedTuple):
+    entity: str
+    id: int
+    lang_id: str
+    name: str
+
+def fts_phrase(text):
+    "Quotes text as an fts5 phrase, so that it is matched literally"
+    return '"' + text.replace('"', '""') + '"'
+
+def match_expression(text, descriptions):
+    """Returns the (fts5 table, match expression, bm25 weights) used to search for text.
+    Names count ten times as much as descriptions"""
+    if len(text) >= 3 and not descriptions:
+        return trigram_table, fts_phrase(text), '1.0'
+
+    # Every word must appear, the last one may be incomplete
+    words = [fts_phrase(word) for word in text.split()]
+    words[-1] += '*'
+    columns = '{name description}' if descriptions else 'name'
+    return word_table, f'{columns} : (' + ' AND '.join(words) + ')', '10.0, 1.0'
+
+def like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search(conn, text, *, lang=None, entity=None, descriptions=False, limit=20):
+    """Searches the names of every entity type (and optionally the descriptions) for text.
+    Returns a list of SearchResult, one per entity, best matches first.
+
+    Exact name matches rank first, then names starting with the text, then by relevance (bm25).
+    Matching is case insensitive.
+    If lang is given, only texts in that language and english fallbacks are searched.
+    If entity is given, only that entity type (such as 'item' or 'weapon') is searched."""
+    text = text.strip()
+    if not text:
+        return []
+
+    table, expression, weights = match_expression(text, descriptions)
+    conditions = [f'{table} MATCH :expression']
+    if lang is not None:
+        conditions.append("e.lang_id IN (:lang, 'en')")
+    if entity is not None:
+        conditions.append('e.entity = :entity')
+
+    # bm25 can only be used by the query reading the fts table, so matches are computed before grouping.
+    # The LIMIT keeps sqlite from flattening them into the grouped query (MATERIALIZED requires sqlite 3.35)
+    # Matches in the requested language (or english if none) win over matches in other languages
+    sql = f'''
+        WITH matches AS (
+            SELECT e.entity, e.id, e.lang_id, e.name,
+                (CASE WHEN e.name = :text COLLATE NOCASE THEN 0 WHEN e.name LIKE :prefix ESCAPE '\\' THEN 1 ELSE 2 END) * 1000.0
+                + (CASE WHEN e.lang_id = coalesce(:lang, 'en') THEN 0 ELSE 100.0 END)
+                + bm25({table}, {weights}) AS score
+            FROM {table} JOIN {entry_table} e ON e.rowid = {table}.rowid
+            WHERE {' AND '.join(conditions)}
+            LIMIT -1)
+        SELECT entity, id, lang_id, name, MIN(score) FROM matches
+        GROUP BY entity, id
+        ORDER BY MIN(score), entity, id
+        LIMIT :limit'''
+    params = {
+        'expression': expression,
+        'text': text,
+        'prefix': like_escape(text) + '%',
+        'lang': lang,
+        'entity': entity,
+        'limit': limit
+    }
+
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    except Exception as ex:
+        if 'no such table' in str(ex):
+            raise Exception("The database has no search index, create it using create_search_index") from ex
+        raise
+
+    return [SearchResult(*row[:4]) for row in rows]
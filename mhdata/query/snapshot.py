@@ -0,0 +1,64 @@
+"""
+Reads the columnar snapshot of the loaded data (see mhdata.build.write_snapshot), using pyarrow.
+
+A snapshot is a directory with an Arrow IPC file per entity family (such as item.arrow),
+and a file per list field of a family (such as monster_rewards.arrow) whose rows reference the entry by id.
+Translated fields are stored as a column per language, such as name_en and name_ja.
+
+Files are uncompressed and memory-mapped, so reading a whole table doesn't copy it into memory.
+"""
+
+import os
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+extension = '.arrow'
+
+def require_pyarrow():
+    if pa is None:
+        raise Exception("Snapshots require pyarrow, install it using pip install pyarrow")
+
+def snapshot_path(directory, family):
+    return os.path.join(directory, family + extension)
+
+def snapshot_families(directory):
+    "Returns the names of the families in the snapshot directory, in alphabetical order"
+    return sorted(
+        fname[:-len(extension)] for fname in os.listdir(directory)
+        if fname.endswith(extension))
+
+def read_snapshot(directory, family):
+    "Returns the pyarrow Table of a family in the snapshot directory, backed by a memory map of the file"
+    require_pyarrow()
+    path = snapshot_path(directory, family)
+    if not os.path.exists(path):
+        raise Exception(f"The snapshot at {directory} has no family {family}")
+
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+class Snapshot:
+    """The families of a snapshot directory, read when first accessed by name.
+    For example, Snapshot('snapshot')['item'].column('name_en')"""
+
+    def __init__(self, directory):
+        require_pyarrow()
+        self.directory = directory
+        self.families = snapshot_families(directory)
+        self._tables = {}
+
+    def __getitem__(self, family):
+        table = self._tables.get(family)
+        if table is None:
+            table = read_snapshot(self.directory, family)
+            self._tables[family] = table
+        return table
+
+    def __contains__(self, family):
+        return family in self.families
+
+    def __iter__(self):
+        return iter(self.families)
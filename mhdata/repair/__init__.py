@@ -10,7 +10,7 @@ from mhdata.load import load_data, schema
 writer = create_writer()
 
 def repair_rewards():
-    data = load_data()
+    data = load_data(lazy=True)
 
     for monster_id, monster_entry in data.monster_map.items():
         # If there are no rewards, skip
@@ -60,7 +60,7 @@ def repair_rewards():
 
 def repair_skill_data():
     "Reorganizes skill data ordering to match base map"
-    data = load_data()
+    data = load_data(lazy=True)
 
     writer.save_data_csv(
         "skills/skill_levels.csv", 
@@ -69,7 +69,7 @@ def repair_skill_data():
         groups=['description'])
 
 def repair_armor_data():
-    data = load_data()
+    data = load_data(lazy=True)
 
     armor_map = data.armor_map
     armorset_map = data.armorset_map
@@ -99,7 +99,7 @@ def repair_armor_data():
     writer.save_csv("armors/armor_base.csv", result)
 
 def repair_decoration_colors():
-    data = load_data()
+    data = load_data(lazy=True)
 
     for entry in data.decoration_map.values():
         skill_en = entry['skill_en']
@@ -5,5 +5,6 @@ Use recreate_database if you want to start a build.
 Feel free to copy this module if you want to run queries from your own project.
 """
 
-from .functions import recreate_database, session_scope
+from .functions import recreate_database, recreate_database_engine, open_database, open_database_engine, session_scope
+from .bulk import BulkSession, bulk_sessionmaker
 from .mappings import *
@@ -0,0 +1,226 @@
+"""
+A replacement for the ORM session that writes added objects using bulk inserts.
+
+Build functions create mapped objects and add them to the session as usual.
+Instead of going through the unit of work, the BulkSession converts each added object
+(and the objects in its relationships) into a plain tuple per row, and inserts the rows
+of each table using a single executemany when flushed.
+
+The rows written are the same as the ones the ORM would write:
+unset and None values use the column default, one-to-many children receive the parent's keys,
+many-to-one parents receive the child's keys, and autoincrement ids are assigned in insertion order.
+Objects are not tracked after they are written, so only adding, querying, and executing are supported.
+"""
+
+import collections
+import contextlib
+
+import sqlalchemy
+from sqlalchemy.orm import RelationshipDirection
+
+from .mappings import Base
+
+class TablePlan:
+    "How to convert objects of a single mapped class into rows of its table"
+
+    def __init__(self, mapper, dialect):
+        table = mapper.local_table
+        self.table = table
+
+        attr_by_column = { prop.columns[0]: prop.key for prop in mapper.column_attrs }
+        self.columns = list(table.columns)
+        self.keys = [attr_by_column[c] for c in self.columns]
+
+        self.defaults = []
+        for column in self.columns:
+            if column.server_default is not None:
+                raise Exception(f"Server defaults are not supported for bulk inserts ({column})")
+            default = column.default
+            if default is not None and not default.is_scalar:
+                raise Exception(f"Only scalar defaults are supported for bulk inserts ({column})")
+            self.defaults.append(default.arg if default is not None else None)
+
+        self.processors = [(i, c.type.bind_processor(dialect)) for (i, c) in enumerate(self.columns)]
+        self.processors = [(i, fn) for (i, fn) in self.processors if fn is not None]
+
+        # The column whose value is assigned by sqlite if missing
+        autoincrement = table.autoincrement_column
+        self.autoincrement_key = attr_by_column[autoincrement] if autoincrement is not None else None
+        self.autoincrement_slot = self.columns.index(autoincrement) if autoincrement is not None else None
+        self.primary_key_slots = [self.columns.index(c) for c in table.primary_key.columns]
+
+        # (relationship key, [(parent attr, child attr)]), split by direction
+        self.many_to_one = []
+        self.one_to_many = []
+        for rel in mapper.relationships:
+            child_attrs = { prop.columns[0]: prop.key for prop in rel.mapper.column_attrs }
+            pairs = [(attr_by_column[l], child_attrs[r]) for (l, r) in rel.local_remote_pairs]
+            if rel.direction is RelationshipDirection.MANYTOONE:
+                self.many_to_one.append((rel.key, pairs))
+            elif rel.direction is RelationshipDirection.ONETOMANY:
+                self.one_to_many.append((rel.key, pairs))
+            else:
+                raise Exception(f"Relationship {rel} is not supported for bulk inserts")
+
+        column_names = ', '.join(f'"{c.name}"' for c in self.columns)
+        params = ', '.join('?' for c in self.columns)
+        self.insert_sql = f'INSERT INTO "{table.name}" ({column_names}) VALUES ({params})'
+
+
+class RawRows:
+    "Rows added to a BulkSession using add_rows"
+    __slots__ = ('plan', 'rows')
+
+    def __init__(self, plan, rows):
+        self.plan = plan
+        self.rows = rows
+
+class BulkSession:
+    """Wraps an ORM session, collecting added objects and inserting them in bulk on flush.
+    The session is flushed before queries and statements, same as autoflush."""
+
+    def __init__(self, session):
+        self.session = session
+        self._pending = []
+        self._plans = {}
+        self._next_ids = {}
+        self._trackers = []
+
+        # Number of flushes that wrote rows
+        self.flush_count = 0
+
+    def add(self, obj):
+        self._pending.append(obj)
+
+    def add_rows(self, cls, rows):
+        """Adds rows to the table of a mapped class, without creating objects.
+        Each row is a tuple of values in table column order. Values are written as is,
+        so defaults and autoincrement ids are not applied"""
+        self._pending.append(RawRows(self._plan(cls), rows))
+
+    def query(self, *entities):
+        self.flush()
+        return self.session.query(*entities)
+
+    def execute(self, statement, *args, **kwargs):
+        self.flush()
+
+        # Statements may delete rows, so next ids are queried again
+        self._next_ids = {}
+        return self.session.execute(statement, *args, **kwargs)
+
+    @contextlib.contextmanager
+    def track_rows(self):
+        """Records the rows inserted within the block.
+        Yields a dictionary of table -> list of primary key tuples"""
+        rows = collections.defaultdict(list)
+        self._trackers.append(rows)
+        try:
+            yield rows
+        finally:
+            self._trackers.remove(rows)
+
+    def flush(self):
+        "Converts every pending object into rows, and inserts them into the database"
+        if not self._pending:
+            return
+
+        rows = collections.OrderedDict()
+        visited = set()
+        for obj in self._pending:
+            if type(obj) is RawRows:
+                rows.setdefault(obj.plan.table, (obj.plan, []))[1].extend(obj.rows)
+            else:
+                self._collect(obj, rows, visited)
+        self._pending = []
+        self.flush_count += 1
+
+        connection = self.session.connection()
+        for table in Base.metadata.sorted_tables:
+            if table not in rows:
+                continue
+            plan, table_rows = rows[table]
+            connection.exec_driver_sql(plan.insert_sql, table_rows)
+
+            for tracked in self._trackers:
+                tracked[table].extend(tuple(row[i] for i in plan.primary_key_slots) for row in table_rows)
+
+    def commit(self):
+        self.flush()
+        self.session.commit()
+
+    def rollback(self):
+        self._pending = []
+        self.session.rollback()
+
+    def close(self):
+        self.session.close()
+
+    def _plan(self, cls):
+        plan = self._plans.get(cls, None)
+        if plan is None:
+            mapper = sqlalchemy.inspect(cls)
+            plan = self._plans[cls] = TablePlan(mapper, self.session.get_bind().dialect)
+        return plan
+
+    def _next_id(self, plan):
+        table = plan.table
+        next_id = self._next_ids.get(table, None)
+        if next_id is None:
+            column = plan.columns[plan.autoincrement_slot]
+            current_max = self.session.execute(sqlalchemy.select(sqlalchemy.func.max(column))).scalar()
+            next_id = (current_max or 0) + 1
+        return next_id
+
+    def _collect(self, obj, rows, visited):
+        "Converts an object and its related objects into rows, in the order the ORM would insert them"
+        if id(obj) in visited:
+            return
+        visited.add(id(obj))
+
+        # Objects are discarded after they are written,
+        # so synchronized keys are written to the instance dictionary without firing attribute events
+        plan = self._plan(type(obj))
+        values = obj.__dict__
+
+        # Parents referenced by many to one relationships are written first, as they provide keys
+        for key, pairs in plan.many_to_one:
+            related = values.get(key, None)
+            if related is None:
+                continue
+            for other in (related if isinstance(related, list) else [related]):
+                self._collect(other, rows, visited)
+                for local, remote in pairs:
+                    values[local] = other.__dict__.get(remote, None)
+
+        row = []
+        for key, default in zip(plan.keys, plan.defaults):
+            value = values.get(key, None)
+            row.append(default if value is None else value)
+        for slot, processor in plan.processors:
+            row[slot] = processor(row[slot])
+
+        # Sqlite assigns one more than the current maximum, so the same is done here
+        slot = plan.autoincrement_slot
+        if slot is not None:
+            next_id = self._next_id(plan)
+            if row[slot] is None:
+                row[slot] = next_id
+                values[plan.autoincrement_key] = next_id
+            self._next_ids[plan.table] = max(next_id, row[slot] + 1)
+
+        if plan.table not in rows:
+            rows[plan.table] = (plan, [])
+        rows[plan.table][1].append(tuple(row))
+
+        for key, pairs in plan.one_to_many:
+            for child in values.get(key, ()):
+                for local, remote in pairs:
+                    child.__dict__[remote] = values.get(local, None)
+                self._collect(child, rows, visited)
+
+def bulk_sessionmaker(sessionmaker):
+    "Returns a session manager that creates BulkSession objects using the given session manager"
+    def create_session():
+        return BulkSession(sessionmaker())
+    return create_session
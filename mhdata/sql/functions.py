@@ -6,16 +6,48 @@ from contextlib import contextmanager
 
 from .mappings import Base
 
-def recreate_database(output_filename):
-    "Recreates the database file, returning a session manager"
+# Settings used while building a new database.
+# A failed build may leave a corrupt file, but the file is recreated by the next build anyway.
+build_pragmas = [
+    'PRAGMA journal_mode=OFF',
+    'PRAGMA synchronous=OFF',
+    'PRAGMA cache_size=-65536', # in KiB
+]
+
+def recreate_database(output_filename, *, build_settings=False):
+    """Recreates the database file, returning a session manager.
+    If build_settings is true, connections skip the rollback journal and disk syncs."""
+    engine = recreate_database_engine(output_filename, build_settings=build_settings)
+    return sqlalchemy.orm.sessionmaker(bind=engine)
+
+def recreate_database_engine(output_filename, *, build_settings=False):
+    "Same as recreate_database, but returns the engine"
     if os.path.exists(output_filename):
         os.remove(output_filename)
    
     dbpath = f'sqlite:///{output_filename}'
     engine = sqlalchemy.create_engine(dbpath, echo=False)
+    if build_settings:
+        sqlalchemy.event.listen(engine, 'connect', apply_build_pragmas)
     Base.metadata.create_all(engine)
 
-    return sqlalchemy.orm.sessionmaker(bind=engine)
+    return engine
+
+def apply_build_pragmas(dbapi_connection, connection_record):
+    "Connect event listener that applies the build_pragmas"
+    cursor = dbapi_connection.cursor()
+    for pragma in build_pragmas:
+        cursor.execute(pragma)
+    cursor.close()
+
+def open_database(output_filename):
+    "Opens an existing database file, returning a session manager"
+    return sqlalchemy.orm.sessionmaker(bind=open_database_engine(output_filename))
+
+def open_database_engine(output_filename):
+    "Same as open_database, but returns the engine"
+    dbpath = f'sqlite:///{output_filename}'
+    return sqlalchemy.create_engine(dbpath, echo=False)
 
 # adapted from sqlalchemy docs
 @contextmanager
@@ -1,3 +1,4 @@
+import sys
 from collections.abc import Mapping
 from mhdata import typecheck
 
@@ -92,7 +93,8 @@ def group_fields(obj, groups=[]):
             continue
 
         group_name = group_results[0]
-        subkey = key[len(group_name)+1:]
+        # Subkeys (mostly languages) repeat in every row, so share a single string
+        subkey = sys.intern(key[len(group_name)+1:])
         
         group = result.setdefault(group_name, {})
         group[subkey] = value
@@ -1,5 +1,12 @@
 # coding: utf-8
+import mmap
 import struct
+from collections.abc import Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class StructField:
@@ -38,6 +45,8 @@ class StructField:
         prev_value = self.__get__(instance, None)
         struct.pack_into(
             self.fmt, instance.data, instance.offset + self.offset, value)
+        if isinstance(instance.parent, StructFile):
+            instance.parent.invalidate_indexes(self._name)
         instance.modified = value != prev_value
 
     def __lt__(self, other):
@@ -148,6 +157,32 @@ class StructMeta(type):
         return type.__new__(cls, name, bases, namespace)
 
 
+class StructEntries(Sequence):
+    """The entries of a read-only StructFile, created the first time they are accessed.
+    Each entry is created once, later accesses return the same object."""
+
+    def __init__(self, struct_file):
+        self.struct_file = struct_file
+        self._entries = [None] * struct_file.num_entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self._entries)))]
+        entry = self._entries[item]
+        if entry is None:
+            index = range(len(self._entries))[item]
+            entry = self.struct_file._create_entry(index)
+            self._entries[index] = entry
+        return entry
+
+    def __iter__(self):
+        for i in range(len(self._entries)):
+            yield self[i]
+
+
 class StructFile:
     EntryFactory = None
     MAGIC = None
@@ -155,21 +190,29 @@ class StructFile:
     NUM_ENTRY_OFFSET = 6
     ENTRY_OFFSET = 10
 
-    def __init__(self, data):
+    def __init__(self, data, readonly=False):
         self.modified = False
         self.modified_cb = None
         self.data = data
+        self.readonly = readonly
+        self._indexes = {}
         self.num_entries = self._read_num_entries()
-        self.entries = list(self._load_entries())
+        if readonly:
+            self.entries = StructEntries(self)
+        else:
+            self.entries = list(self._load_entries())
 
     def _read_num_entries(self):
         result = struct.unpack_from("<I", self.data, self.NUM_ENTRY_OFFSET)
         return result[0]
 
+    def _create_entry(self, i):
+        offset = self.ENTRY_OFFSET + i * self.EntryFactory.STRUCT_SIZE
+        return self.EntryFactory(self, i, self.data, offset)
+
     def _load_entries(self):
         for i in range(0, self.num_entries):
-            offset = self.ENTRY_OFFSET + i * self.EntryFactory.STRUCT_SIZE
-            yield self.EntryFactory(self, i, self.data, offset)
+            yield self._create_entry(i)
 
     def __getitem__(self, item):
         return self.entries[item]
@@ -177,14 +220,50 @@ class StructFile:
     def __len__(self):
         return len(self.entries)
 
+    @classmethod
+    def dtype(cls):
+        """Returns the NumPy structured dtype of the entries of the file."""
+        return cls.EntryFactory.numpy_dtype()
+
+    def to_numpy(self):
+        """Returns the entries as a NumPy structured array, with a column per field.
+        The array is a view of the file data, not a copy: it is read-only if the file is,
+        and writing to it changes the data without setting the modified flag."""
+        dtype = self.dtype()  # raises before np is used if numpy is missing
+        return np.frombuffer(self.data, dtype=dtype, count=self.num_entries, offset=self.ENTRY_OFFSET)
+
+    def index(self, *keys):
+        """Returns a dict of the entries by the values of the attributes, as lists in file order.
+        The index is built when first requested, and dropped when one of its fields is set."""
+        result = self._indexes.get(keys)
+        if result is None:
+            result = {}
+            for item in self.entries:
+                values = tuple(getattr(item, key, None) for key in keys)
+                result.setdefault(values, []).append(item)
+            self._indexes[keys] = result
+        return result
+
+    def invalidate_indexes(self, field=None):
+        """Drops the indexes that use the field, or every index if no field is given.
+        Writes through to_numpy() views bypass the fields, so they need to invalidate the indexes themselves."""
+        if field is None:
+            self._indexes.clear()
+        else:
+            for keys in [keys for keys in self._indexes if field in keys]:
+                del self._indexes[keys]
+
     def find(self, **attrs):
-        for item in self.entries:
-            attrs_match = all(
-                getattr(item, key, None) == value
-                for key, value in attrs.items()
+        keys = tuple(sorted(attrs))
+        try:
+            items = self.index(*keys).get(tuple(attrs[key] for key in keys), ())
+        except TypeError:
+            # unhashable values can't be looked up, but can still equal field values
+            items = (
+                item for item in self.entries
+                if all(getattr(item, key, None) == value for key, value in attrs.items())
             )
-            if attrs_match:
-                yield item
+        yield from items
 
     def find_first(self, **attrs):
         for item in self.find(**attrs):
@@ -208,10 +287,12 @@ class StructFile:
         return True
 
     @classmethod
-    def load(cls, fp):
-        data = bytearray(fp.read())
+    def load(cls, fp, readonly=False):
+        """Loads the file. If readonly is true, the file is memory mapped instead of copied,
+        entries are created when they are first accessed, and setting a field raises a TypeError."""
+        data = map_file(fp) if readonly else bytearray(fp.read())
         cls.check_header(data)
-        return cls(data)
+        return cls(data, readonly=readonly)
 
     def save(self, fp):
         fp.write(self.data)
@@ -225,10 +306,39 @@ class StructFile:
     def set_modified(self, value):
         modified = self.modified
         self.modified = self.modified or value
-        if self.modified != modified:
+        if self.modified != modified and self.modified_cb:
             self.modified_cb(value)
             
 
+def map_file(fp):
+    """Returns a read-only buffer of the file contents, which is a memory map for regular files.
+    Other file objects (such as BytesIO) are read into a read-only memoryview."""
+    try:
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        # io.UnsupportedOperation is an OSError, and empty files raise ValueError
+        return memoryview(fp.read())
+
+
+# NumPy types of the struct format characters. Data is little endian, including native formats
+_numpy_types = {
+    "b": "i1", "B": "u1", "h": "i2", "H": "u2", "i": "i4", "I": "u4", "l": "i4", "L": "u4",
+    "q": "i8", "Q": "u8", "e": "f2", "f": "f4", "d": "f8", "?": "?",
+}
+
+
+def numpy_format(fmt):
+    """Returns the NumPy type of a field format. Repeated formats such as pad's "<4B" are subarrays."""
+    code = fmt.lstrip("<@=")
+    count, char = code[:-1], code[-1:]
+    if fmt.startswith((">", "!")) or char not in _numpy_types or not (count == "" or count.isdigit()):
+        raise Exception(f"field format {fmt} has no numpy type")
+    result = "<" + _numpy_types[char]
+    if count and count != "1":
+        return result, (struct.calcsize("<" + code) // struct.calcsize("<" + char),)
+    return result
+
+
 class Struct(metaclass=StructMeta):
     def __init__(self, parent, index, data, offset):
         self.parent = parent
@@ -240,6 +350,23 @@ class Struct(metaclass=StructMeta):
     def fields(cls):
         return tuple(cls.__fields__)
 
+    @classmethod
+    def numpy_dtype(cls):
+        """Returns the NumPy structured dtype of the struct, with the name and offset of each field."""
+        if np is None:
+            raise Exception("numpy views of struct files require numpy, install it using pip install numpy")
+        result = cls.__dict__.get("_numpy_dtype")
+        if result is None:
+            fields = [getattr(cls, name) for name in cls.__fields__]
+            result = np.dtype({
+                "names": list(cls.__fields__),
+                "formats": [numpy_format(field.fmt) for field in fields],
+                "offsets": [field.offset for field in fields],
+                "itemsize": cls.STRUCT_SIZE,
+            })
+            cls._numpy_dtype = result
+        return result
+
     def as_dict(self):
         return {
             attr: getattr(self, attr)
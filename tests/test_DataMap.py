@@ -1,6 +1,7 @@
 import pytest
 
 from mhdata.io import DataMap, merge_list
+from mhdata.io.functions import to_basic
 
 def create_test_entry(name_map, extradata={}):
     return { 'name': name_map, **extradata }
@@ -83,6 +84,20 @@ def test_row_add_value_in_middle():
     entry_keys = list(entry.keys())
     assert entry_keys == expected_keys, "Expected new to be after test2"
 
+def test_rows_share_layout_after_changes():
+    datamap = DataMap()
+    entry1 = datamap.insert(create_test_entry_en('test1', { 'a': 1, 'b': 2 }))
+    entry2 = datamap.insert(create_test_entry_en('test2', { 'a': 3 }))
+
+    entry2['b'] = 4
+    assert entry1._layout is entry2._layout, "expected rows with the same keys to share a layout"
+
+    del entry1['a']
+    entry1['a'] = 5
+    assert list(entry1.keys()) == ['id', 'name', 'b', 'a']
+    assert entry1.to_dict() == { 'id': 1, 'name': { 'en': 'test1' }, 'b': 2, 'a': 5 }
+    assert entry2['name_en'] == 'test2', "expected nested lookups to still work"
+
 def test_manual_id_resets_sequence():
     datamap = DataMap()
 
@@ -116,6 +131,42 @@ def test_clone_returns_equal_map():
     assert datamap.to_dict() == cloned_datamap.to_dict(), "expected clone to match"
     assert id(datamap) != id(cloned_datamap), "expecting clone to be a different object"
 
+def test_to_basic_detects_cycles_only():
+    shared = { 'a': 1 }
+    assert to_basic([shared, shared, (1, 2)]) == [{ 'a': 1 }, { 'a': 1 }, [1, 2]]
+
+    cyclic = { 'a': [] }
+    cyclic['a'].append(cyclic)
+    with pytest.raises(Exception):
+        to_basic(cyclic)
+
+def test_unused_layouts_are_freed():
+    import gc
+    from mhdata.io.datarow import RowLayout
+
+    datamap = DataMap()
+    entry = datamap.insert(create_test_entry_en('test1', { 'a': 1 }))
+    for i in range(100):
+        entry[f'temporary_{i}'] = i
+        del entry[f'temporary_{i}']
+        assert entry.get(f'missing_{i}') is None
+    gc.collect()
+
+    assert not any(key.startswith('temporary_') for keys in RowLayout._layouts for key in keys), \
+        "expected layouts without rows to be freed"
+    assert RowLayout.of(entry.keys()) is entry._layout
+    assert not any(key.startswith('missing_') for key in entry._layout._nested), "expected misses not to be cached"
+    assert entry['name_en'] == 'test1' and 'name_en' in entry._layout._nested
+
+def test_to_basic_without_copy_shares_basic_parts():
+    basic = { 'a': [1, 2] }
+    data = { 'basic': basic, 'converted': (3, 4) }
+
+    result = to_basic(data, copy=False)
+    assert result == { 'basic': { 'a': [1, 2] }, 'converted': [3, 4] }
+    assert result is not data, "expected changed dicts to be copied"
+    assert result['basic'] is basic, "expected unchanged dicts to be shared"
+
 def test_merge_on_multikey_single():
     data = {
         1: create_test_entry_en("test", { 'type': 'great-sword' }),
@@ -131,4 +182,69 @@ def test_merge_on_multikey_single():
     merge_list(datamap, merge_data, many=False)
 
     assert datamap.entry_of("en", "test", "great-sword")['attack'] == 25
-    assert datamap.entry_of("en", "test", "bow")['attack'] == 10
\ No newline at end of file
+    assert datamap.entry_of("en", "test", "bow")['attack'] == 10
+
+def create_weapon_map():
+    datamap = DataMap()
+    datamap.insert(create_test_entry_en('sword1', { 'weapon_type': 'great-sword', 'rarity': 3 }))
+    datamap.insert(create_test_entry_en('bow1', { 'weapon_type': 'bow', 'rarity': 1 }))
+    datamap.insert(create_test_entry_en('sword2', { 'weapon_type': 'great-sword', 'rarity': 6 }))
+    datamap.insert(create_test_entry_en('bow2', { 'weapon_type': 'bow', 'rarity': 3 }))
+    return datamap
+
+def test_where_uses_index_in_map_order():
+    datamap = create_weapon_map().add_index('weapon_type')
+
+    found = [e.name('en') for e in datamap.where(weapon_type='great-sword')]
+    assert found == ['sword1', 'sword2'], "expected matching entries in map order"
+
+def test_where_matches_scan_with_extra_fields():
+    indexed = create_weapon_map().add_index('weapon_type')
+    unindexed = create_weapon_map()
+
+    expected = [e.id for e in unindexed.where(weapon_type='bow', rarity=3)]
+    found = [e.id for e in indexed.where(weapon_type='bow', rarity=3)]
+    assert found == expected == [4], "expected the indexed lookup to match a scan"
+
+def test_index_follows_row_changes_and_deletes():
+    datamap = create_weapon_map().add_index('weapon_type')
+    datamap[1]['weapon_type'] = 'bow'
+    del datamap[4]
+
+    found = [e.name('en') for e in datamap.where(weapon_type='bow')]
+    assert found == ['sword1', 'bow1'], "expected index to reflect the update and delete"
+
+def test_index_keeps_row_after_failed_delete():
+    datamap = create_weapon_map().add_index('weapon_type')
+    del datamap[2]['weapon_type']
+    with pytest.raises(KeyError):
+        del datamap[2]['weapon_type']
+
+    assert [e.id for e in datamap.where(weapon_type=None)] == [2], "expected the row to stay indexed"
+    datamap[2]['weapon_type'] = 'bow'
+    assert [e.name('en') for e in datamap.where(weapon_type='bow')] == ['bow1', 'bow2']
+
+def test_where_range_sorted_index():
+    datamap = create_weapon_map().add_index('rarity', sorted=True)
+    datamap.insert(create_test_entry_en('sword3', { 'weapon_type': 'great-sword', 'rarity': 2 }))
+
+    found = [e.name('en') for e in datamap.where_range('rarity', 2, 3)]
+    assert found == ['sword3', 'sword1', 'bow2'], "expected entries ordered by rarity"
+
+def test_max_id_tracks_deletes():
+    datamap = create_weapon_map()
+    assert datamap.max_id == 4
+
+    del datamap[4]
+    assert datamap.max_id == 3, "expected max id to be recalculated after deleting the max"
+
+def test_merges_share_join_index():
+    datamap = create_weapon_map()
+    merge_list(datamap, [{ 'name_en': 'sword1', 'attack': 25 }], many=False)
+    index = datamap.join_index(['name_en'])
+
+    datamap.insert(create_test_entry_en('bow3', { 'weapon_type': 'bow' }))
+    merge_list(datamap, [{ 'name_en': 'bow3', 'attack': 10 }], many=False)
+
+    assert datamap.join_index(['name_en']) is index, "expected the join index to be reused"
+    assert datamap.entry_of('en', 'bow3')['attack'] == 10, "expected the index to include new entries"
@@ -4,7 +4,7 @@ import shutil
 
 import json
 
-from mhdata.io import DataReader
+from mhdata.io import DataReader, CsvCache, read_csv
 
 languages = ['en', 'ja']
 
@@ -35,3 +35,71 @@ def test_load_base_json_has_auto_ids(loader_mock, basedata):
 
     idval = bmap.id_of('ja', 'test2j')
     assert idval == 2, "expected auto id to have value 2"
+
+def save_text(text, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def test_csv_cache_matches_parsed(tmpdir):
+    path = str(tmpdir.join('base.csv'))
+    save_text("name_en,name_ja,data\ntest1,test1j,\ntest2,test2j,5\n", path)
+
+    cache = CsvCache(str(tmpdir.join('cache')))
+    first = cache.read_csv(path)
+    second = cache.read_csv(path)
+
+    assert first == second == read_csv(path), "cached rows should match parsed rows"
+    assert second[0]['data'] is None, "expected empty cells to be cached as None"
+    assert (cache.hits, cache.misses) == (1, 1), "expected second read to hit the cache"
+
+def test_csv_cache_reparses_changed_file(tmpdir):
+    path = str(tmpdir.join('base.csv'))
+    save_text("name_en\ntest1\n", path)
+
+    cache = CsvCache(str(tmpdir.join('cache')))
+    cache.read_csv(path)
+
+    save_text("name_en\ntest1\ntest2\n", path)
+    rows = cache.read_csv(path)
+    assert len(rows) == 2, "expected stale cache entry to be reparsed"
+
+def test_csv_cache_hits_on_touched_file(tmpdir):
+    path = str(tmpdir.join('base.csv'))
+    save_text("name_en\ntest1\n", path)
+
+    cache = CsvCache(str(tmpdir.join('cache')))
+    cache.read_csv(path)
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    cache.read_csv(path)
+    assert cache.hits == 1, "expected unchanged contents to reuse the cache entry"
+
+def test_csv_cache_without_writable_cache(tmpdir, monkeypatch):
+    from mhdata.io.csv import cache as cache_module
+
+    path = str(tmpdir.join('base.csv'))
+    save_text("name_en,data\ntest1,\n", path)
+
+    # The cache directory can't be created inside a file
+    save_text("", str(tmpdir.join('file')))
+    cache = CsvCache(str(tmpdir.join('file', 'cache')))
+    assert cache.read_csv(path) == read_csv(path), "expected rows to be read without the cache"
+
+    def fail(*args, **kwargs):
+        raise OSError("No space left on device")
+    cache = CsvCache(str(tmpdir.mkdir('cache')))
+    monkeypatch.setattr(cache_module.pickle, 'dump', fail)
+    assert cache.read_csv(path) == read_csv(path)
+    assert tmpdir.join('cache').listdir() == [], "expected failed writes to leave no files"
+
+def test_reader_uses_csv_cache(tmpdir, basedata):
+    cache = CsvCache(str(tmpdir.join('cache')))
+    reader = DataReader(data_path=tmpdir, languages=languages, csv_cache=cache)
+    save_text("name_en,name_ja\ntest1,test1j\ntest2,test2j\n", reader.get_data_path('base.csv'))
+
+    first = reader.load_base_csv('base.csv', languages)
+    second = reader.load_base_csv('base.csv', languages)
+
+    assert first.to_dict() == second.to_dict(), "expected cached load to match"
+    assert cache.hits == 1, "expected the second load to use the cache"
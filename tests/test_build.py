@@ -2,7 +2,9 @@ import os
 import os.path
 import pytest
 
-from mhdata import build
+from mhdata import build, cfg
+from mhdata.build.dump import dump_database
+from mhdata.io import DataMap
 from mhdata.load import load_data, load_data_processed, validate
 
 @pytest.fixture()
@@ -25,3 +27,312 @@ def test_builds_sql(tmpdir, mhdata):
 
     dbexists = os.path.exists(fname)
     assert dbexists, 'Database should have been created'
+
+def test_concurrent_load_matches_serial(mhdata_raw):
+    timings = {}
+    concurrent = load_data(workers=2, timings=timings)
+
+    assert list(vars(concurrent).keys()) == list(vars(mhdata_raw).keys()), "expected same attribute order"
+    assert set(timings.keys()) == set(vars(mhdata_raw).keys()), "expected a timing per map"
+    for name, value in vars(mhdata_raw).items():
+        other = getattr(concurrent, name)
+        if isinstance(value, DataMap):
+            assert value.to_dict() == other.to_dict(), f"expected {name} to match"
+            assert list(value.keys()) == list(other.keys()), f"expected {name} ids to match"
+        else:
+            assert value == other, f"expected {name} to match"
+
+def test_lazy_load_only_loads_accessed_maps():
+    data = load_data(lazy=True)
+    item_map = data.item_map
+
+    assert data.is_loaded('item_map'), "expected item_map to be loaded"
+    assert not data.is_loaded('weapon_map'), "expected weapon_map to not be loaded"
+    assert data.item_map is item_map, "expected the loaded map to be memoized"
+
+def test_lazy_processed_runs_only_needed_steps():
+    data = load_data_processed(lazy=True)
+    decoration_map = data.decoration_map
+
+    assert all('chances' in entry for entry in decoration_map.values()), "expected chances to be computed"
+    assert not data.is_loaded('skill_map'), "expected skill_map to not be loaded"
+
+def test_compiled_schemas_match_marshmallow(mhdata_raw, monkeypatch):
+    from mhdata.load import loaddata
+    monkeypatch.setattr(loaddata, 'compile_schema', lambda schema: schema)
+    uncompiled = load_data()
+
+    for name, value in vars(mhdata_raw).items():
+        other = getattr(uncompiled, name)
+        if isinstance(value, DataMap):
+            assert value.to_dict() == other.to_dict(), f"expected {name} to match"
+        else:
+            assert value == other, f"expected {name} to match"
+
+def count_rows(fname):
+    import sqlite3
+    with sqlite3.connect(str(fname)) as conn:
+        tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        return { t:conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables }
+
+def test_reload_rebuilds_only_affected_steps(tmpdir, monkeypatch):
+    import shutil
+    from mhdata.io import DataReader, data_path
+    from mhdata.load import loaddata, process
+
+    # Loaders read through loaddata.reader, which is pointed at a copy of the source data
+    source_copy = str(tmpdir.join('source_data'))
+    shutil.copytree(data_path, source_copy)
+    monkeypatch.setattr(loaddata, 'reader', DataReader(languages=list(cfg.supported_languages), data_path=source_copy))
+
+    reloadable = loaddata.ReloadableData(loaddata.loaders, steps=process.steps, reader=loaddata.reader)
+    assert validate(reloadable.load()), "expected the copied data to validate"
+    record = build.BuildRecord()
+    fname = tmpdir.join('tmpdb.sql')
+    build.build_sql_database(fname, reloadable.data, record=record)
+
+    assert reloadable.reload() == set(), "expected nothing to reload without changes"
+
+    craft_path = os.path.join(source_copy, 'weapons', 'weapon_craft.csv')
+    with open(craft_path, encoding='utf-8') as f:
+        craft = f.read()
+    with open(craft_path, 'w', encoding='utf-8') as f:
+        f.write(craft.replace('Defender Great Sword I,great-sword,Create,Iron Ore,1', 'Defender Great Sword I,great-sword,Create,Iron Ore,3', 1))
+    stat = os.stat(craft_path)
+    os.utime(craft_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    reloaded = reloadable.reload()
+    assert reloaded == {'weapon_map'}, "expected only weapon_map to reload"
+
+    rebuilt = build.rebuild_sql_database(fname, reloadable.data, record, reloaded)
+    assert rebuilt == ['weapons'], "expected only the weapons step to rebuild"
+
+    full_fname = tmpdir.join('full.sql')
+    build.build_sql_database(full_fname, reloadable.data)
+    assert dump_database(fname, by_content=True) == dump_database(full_fname, by_content=True), \
+        "expected the rebuild to match a full build"
+
+def test_bulk_build_matches_orm(tmpdir, mhdata):
+    orm_fname = tmpdir.join('orm.sql')
+    bulk_fname = tmpdir.join('bulk.sql')
+    build.build_sql_database(orm_fname, mhdata)
+    build.build_sql_database(bulk_fname, mhdata, bulk=True)
+
+    orm_schema, orm_data = dump_database(orm_fname)
+    bulk_schema, bulk_data = dump_database(bulk_fname)
+    assert orm_schema == bulk_schema, "expected the same schema"
+    assert orm_data == bulk_data, "expected the same rows"
+
+def test_sharded_build_matches_serial(tmpdir, mhdata):
+    def assert_sharded_matches(name):
+        serial_fname = tmpdir.join(f'{name}_serial.sql')
+        sharded_fname = tmpdir.join(f'{name}_sharded.sql')
+        build.build_sql_database(serial_fname, mhdata, bulk=True)
+        build.build_sql_database_sharded(sharded_fname, mhdata, workers=2)
+        assert dump_database(serial_fname) == dump_database(sharded_fname), f"expected the same database ({name})"
+
+    assert_sharded_matches('full')
+
+    # The last armor of the step still uses up a recipe id, without adding recipe items
+    armor = list(mhdata.armor_map.values())[-1]
+    for idx in range(1, cfg.max_recipe_item_count + 1):
+        armor['craft'][f'item{idx}_name'] = None
+    assert_sharded_matches('empty_recipe')
+
+def test_update_matches_full_build(tmpdir, mhdata):
+    fname = str(tmpdir.join('tmpdb.sql'))
+    assert len(build.update_sql_database(fname, mhdata)) > 0, "expected a full build for a new database"
+    assert build.update_sql_database(fname, mhdata) == [], "expected no steps to run without changes"
+
+    quest = next(iter(mhdata.quest_map.values()))
+    quest['stars'] += 1
+    assert build.update_sql_database(fname, mhdata) == ['quests'], "expected only quests to update"
+
+    weapon = next(iter(mhdata.weapon_map.values()))
+    weapon['attack'] += 10
+    assert 'weapons' in build.update_sql_database(fname, mhdata), "expected weapons to update"
+
+    assert build.verify_sql_database(fname, mhdata), "expected the update to match a full build"
+
+def test_optimize_creates_query_indexes(tmpdir, mhdata):
+    import sqlite3
+    from mhdata.build.optimize import query_indexes, index_name
+
+    fname = str(tmpdir.join('tmpdb.sql'))
+    build.build_sql_database(fname, mhdata, bulk=True)
+    _, data = dump_database(fname)
+    build.optimize_database(fname, page_size=8192)
+
+    # Analyze adds the sqlite_stat1 table to the dump
+    optimized_data = [l for l in dump_database(fname)[1] if 'sqlite_stat' not in l and not l.startswith('ANALYZE')]
+    assert optimized_data == data, "expected optimizing to keep every row"
+    with sqlite3.connect(fname) as conn:
+        indexes = set(name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='index'"))
+        assert conn.execute("PRAGMA page_size").fetchone()[0] == 8192, "expected the page size to change"
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0, "expected analyzed stats"
+
+    for table_name, columns in query_indexes:
+        assert index_name(table_name, columns) in indexes, f"expected an index on {table_name} {columns}"
+
+def test_text_rows_use_english_fallback():
+    import mhdata.sql as db
+    from mhdata.build.translations import TextRows
+
+    texts = TextRows(db.ItemText, { 'name': 'name', 'description': 'description' }, languages=['en', 'ja', 'fr'])
+    texts.add(5, { 'name': { 'en': 'Potion', 'ja': 'Kaifukuyaku', 'fr': '' }, 'description': { 'en': 'Heals' } })
+
+    rows = [dict(zip(texts.columns, row)) for row in texts.rows]
+    assert [r['lang_id'] for r in rows] == ['en', 'ja', 'fr']
+    assert all(r['id'] == 5 for r in rows)
+    assert [r['name'] for r in rows] == ['Potion', 'Kaifukuyaku', 'Potion']
+    assert all(r['description'] is rows[0]['description'] for r in rows), "expected fallbacks to share the english value"
+
+def test_profile_reports_each_step(tmpdir, mhdata):
+    import json
+    from mhdata.build.sql import build_steps
+
+    fname = tmpdir.join('tmpdb.sql')
+    profile = build.BuildProfile()
+    build.build_sql_database(fname, mhdata, bulk=True, profile=profile)
+
+    report_fname = str(tmpdir.join('profile.json'))
+    profile.write(report_fname)
+    with open(report_fname, encoding='utf-8') as f:
+        report = json.load(f)
+
+    names = [stage['name'] for stage in report['stages']]
+    assert names == ['languages'] + list(build_steps.keys()) + ['commit']
+    assert all(stage['wall_time'] >= 0 and stage['cpu_time'] >= 0 for stage in report['stages'])
+
+    counts = count_rows(fname)
+    assert report['rows'] == { t:n for (t, n) in counts.items() if n > 0 }, "expected every written row to be counted"
+
+@pytest.mark.parametrize('reset_peak', [True, False])
+def test_profile_traces_memory(monkeypatch, reset_peak):
+    import tracemalloc
+    if not reset_peak:
+        # tracemalloc.reset_peak() was added in python 3.9
+        monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)
+
+    profile = build.BuildProfile(trace_memory=True)
+    with profile.run():
+        with profile.stage('allocate'):
+            data = bytearray(4 * 1024 * 1024)
+            del data
+        with profile.stage('nothing'):
+            pass
+    assert not tracemalloc.is_tracing(), "expected tracing to stop after the run"
+
+    allocate, nothing = profile.stages
+    assert allocate['peak_traced_kb'] >= 4 * 1024
+    if reset_peak:
+        assert nothing['peak_traced_kb'] < 4 * 1024, "expected the peak to be measured per stage"
+
+def test_uncached_incremental_build_clears_manifest(tmpdir, monkeypatch, mhdata):
+    import sqlite3
+    import importlib.util
+    from click.testing import CliRunner
+
+    spec = importlib.util.spec_from_file_location('build_script', os.path.join(os.path.dirname(__file__), '..', 'build.py'))
+    build_script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(build_script)
+
+    # The source data is passed in directly. The hash stays the same, as the edit is reverted in the end
+    monkeypatch.setattr(build_script, 'load_data_processed', lambda **kwargs: mhdata)
+    monkeypatch.setattr(build, 'manifest_hash', lambda options=None: 'H1')
+    monkeypatch.chdir(tmpdir)
+
+    def run(*args):
+        result = CliRunner().invoke(build_script.build_cmd, ['--incremental', '--no-search', '--no-optimize', *args])
+        assert result.exit_code == 0, result.output
+        return result.output
+
+    def quest_stars(quest_id):
+        with sqlite3.connect('mhw.db') as conn:
+            return conn.execute("SELECT stars FROM quest WHERE id = ?", (quest_id,)).fetchone()[0]
+
+    quest = next(iter(mhdata.quest_map.values()))
+    stars = quest['stars']
+    run()
+    assert build.read_manifest_hash('mhw.db') == 'H1'
+
+    quest['stars'] = stars + 1
+    run('--no-cache')
+    assert build.read_manifest_hash('mhw.db') is None, "expected the hash to be removed by the uncached update"
+
+    quest['stars'] = stars
+    assert "up to date" not in run(), "expected the build to run"
+    assert quest_stars(quest.id) == stars
+    assert build.read_manifest_hash('mhw.db') == 'H1'
+
+def test_manifest_hash_is_stored_in_database(tmpdir):
+    import sqlite3
+
+    manifest = build.manifest_hash({ 'page_size': 4096 })
+    assert manifest == build.manifest_hash({ 'page_size': 4096 }), "expected the hash to be stable"
+    assert manifest != build.manifest_hash({ 'page_size': 8192 }), "expected options to change the hash"
+
+    fname = str(tmpdir.join('tmpdb.sql'))
+    assert build.read_manifest_hash(fname) is None
+    sqlite3.connect(fname).close()
+    assert build.read_manifest_hash(fname) is None
+
+    build.write_manifest_hash(fname, manifest)
+    assert build.read_manifest_hash(fname) == manifest
+
+def test_build_cache_evicts_least_recently_used(tmpdir):
+    cache = build.BuildCache(str(tmpdir.join('cache')), max_size=250)
+    source = tmpdir.join('source.db')
+
+    for i, key in enumerate(['a', 'b', 'c']):
+        source.write('x' * 100)
+        cache.put(key, str(source))
+        # Spread out the usage times, as file times may be coarse
+        os.utime(cache._cache_path(key), (i * 10, i * 10))
+
+    output = str(tmpdir.join('output.db'))
+    assert not cache.get('a', output), "expected the oldest entry to be evicted"
+    assert cache.get('b', output), "expected newer entries to be kept"
+    with open(output) as f:
+        assert f.read() == 'x' * 100
+
+    # b was used last, so c is the oldest
+    source.write('y' * 100)
+    cache.put('d', str(source))
+    assert [os.path.basename(path) for (_, _, path) in cache.entries()] == ['b.db', 'd.db']
+
+def test_snapshot_matches_loaded_data(tmpdir, mhdata):
+    pytest.importorskip('pyarrow')
+    from mhdata.query import Snapshot
+
+    directory = str(tmpdir.join('snapshot'))
+    counts = build.write_snapshot(directory, mhdata, batch_size=100)
+    snapshot = Snapshot(directory)
+    assert set(snapshot) == set(counts)
+
+    items = snapshot['item']
+    assert items.num_rows == len(mhdata.item_map) == counts['item']
+    potion = mhdata.item_map.entry_of('en', 'Potion')
+    row = items.slice(items.column('id').to_pylist().index(potion.id), 1).to_pylist()[0]
+    assert row['name_en'] == 'Potion' and row['name_ja'] == potion['name']['ja']
+    assert row['rarity'] == potion['rarity']
+
+    rewards = snapshot['monster_rewards']
+    assert rewards.num_rows == sum(len(m.get('rewards') or []) for m in mhdata.monster_map.values())
+    assert set(rewards.column('monster_id').to_pylist()) <= set(mhdata.monster_map.keys())
+
+def test_id_allocator_continues_after_database(tmpdir):
+    import mhdata.sql as db
+    from mhdata.build.ids import IdAllocator
+
+    ids = IdAllocator()
+    assert [ids.next_id('recipe') for _ in range(3)] == [1, 2, 3]
+    assert ids.next_id('quest_reward') == 1, "expected every sequence to be numbered separately"
+
+    sessionbuilder = db.recreate_database(str(tmpdir.join('tmpdb.sql')))
+    with db.session_scope(sessionbuilder) as session:
+        session.add(db.RecipeItem(recipe_id=5, item_id=1, quantity=1))
+        session.flush()
+        ids = IdAllocator.from_database(session)
+        assert ids.next_id('recipe') == 6
+        assert ids.next_id('location_item') == 1
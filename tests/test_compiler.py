@@ -0,0 +1,51 @@
+import pytest
+
+from mhdata.load import schema
+from mhdata.load.compiler import compile_schema
+
+def create_weapon(**values):
+    return {
+        'id': '1', 'name_en': 'Test Sword', 'name_ja': 'テスト', 'weapon_type': 'great-sword',
+        'attack': '480', 'affinity': '0', 'element_hidden': 'FALSE',
+        'slot_1': '1', 'slot_2': '0', 'slot_3': '0',
+        'craft': [{ 'base_name_en': 'Test Sword', 'type': 'Create', 'item1_name': 'Ore', 'item1_qty': '2' }],
+        **values
+    }
+
+def test_all_schemas_compile():
+    for schema_type in [schema.ItemSchema, schema.MonsterSchema, schema.WeaponSchema, schema.WeaponAmmoSchema]:
+        assert compile_schema(schema_type()).compiled, f"expected {schema_type.__name__} to compile"
+
+def test_compiled_matches_valid_data():
+    data = create_weapon(notes='WRB', sharpness=None)
+    expected = schema.WeaponSchema().load(data)
+    result = compile_schema(schema.WeaponSchema()).load(data)
+
+    assert result == expected
+    assert result.data['name'] == { 'en': 'Test Sword', 'ja': 'テスト' }
+    assert result.data['attack'] == 480
+
+@pytest.mark.parametrize('values', [
+    { 'attack': 'high' },
+    { 'weapon_type': 'spoon' },
+    { 'notes': 'WWW' },
+    { 'slot_1': None },
+    { 'craft': [{ 'type': 'Buy' }] },
+    { 'element_hidden': 'maybe' },
+])
+def test_compiled_errors_match_marshmallow(values):
+    data = create_weapon(**values)
+    expected = schema.WeaponSchema().load(data)
+    result = compile_schema(schema.WeaponSchema()).load(data)
+
+    assert expected.errors, "expected the data to be invalid"
+    assert result.errors == expected.errors
+
+def test_compiled_schema_validator_errors_match():
+    data = { 'id': 1, 'name_en': 'Test', 'slot': 1, 'rarity': 5,
+            'skill1_name': 'Attack', 'skill1_level': 1, 'skill2_name': 'Guard', 'skill2_level': None }
+    expected = schema.DecorationBaseSchema().load(data)
+    result = compile_schema(schema.DecorationBaseSchema()).load(data)
+
+    assert expected.errors, "expected the data to be invalid"
+    assert result.errors == expected.errors
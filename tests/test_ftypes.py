@@ -0,0 +1,92 @@
+import io
+import random
+import struct
+import pytest
+from types import SimpleNamespace
+
+from mhw_armor_edit.ftypes import kire, eq_crt
+from mhdata.util import Sharpness
+
+def test_readonly_struct_file_creates_entries_on_access(tmpdir):
+    rng = random.Random(3)
+    data = struct.pack('<4xHI', kire.Kire.MAGIC, 50) + bytes(rng.getrandbits(8) for _ in range(18 * 50))
+    path = tmpdir.join('kireaji.kire')
+    path.write_binary(data)
+
+    expected = [entry.as_dict() for entry in kire.Kire.load(io.BytesIO(data)).entries]
+    with open(str(path), 'rb') as f:
+        mapped = kire.Kire.load(f, readonly=True)
+
+    assert mapped[10].as_dict() == expected[10]
+    assert sum(1 for entry in mapped.entries._entries if entry is not None) == 1, "expected only accessed entries to be created"
+    assert mapped[10] is mapped.entries[10] and mapped[-1] is mapped[49]
+    assert [entry.as_dict() for entry in mapped.entries] == expected
+    assert mapped.find_first(id=expected[3]['id']).index == 3
+
+    with pytest.raises(TypeError):
+        mapped[0].red = 5
+    assert [e.as_dict() for e in kire.Kire.load(io.BytesIO(data), readonly=True).entries[:5]] == expected[:5]
+
+def test_struct_file_numpy_view_matches_entries(monkeypatch):
+    pytest.importorskip('numpy')
+    from mhdata.binary.load import equipment_bload
+
+    rng = random.Random(4)
+    data = bytearray(struct.pack('<4xHI', kire.Kire.MAGIC, 20) + bytes(rng.getrandbits(8) for _ in range(18 * 20)))
+    sharpness_data = kire.Kire(data)
+    entries = sharpness_data.to_numpy()
+
+    assert kire.Kire.dtype().itemsize == kire.KireEntry.STRUCT_SIZE
+    assert len(entries) == 20
+    assert all(entries[name].tolist() == [getattr(e, name) for e in sharpness_data.entries] for name in kire.KireEntry.fields())
+    assert eq_crt.EqCrt.dtype()['unk3'].shape == (4,), "expected padding to be a subarray"
+
+    entries['red'][2] = 123
+    assert sharpness_data[2].red == 123, "expected a view of the file data"
+
+    monkeypatch.setattr(equipment_bload, 'load_schema', lambda schema, path: sharpness_data)
+    reader = equipment_bload.SharpnessDataReader()
+    for entry in sharpness_data.entries:
+        weapon = SimpleNamespace(kire_id=entry.index, handicraft=2)
+        ends = [getattr(entry, color) for color in reader.colors]
+        expected = Sharpness(*[end - previous for end, previous in zip(ends, [0] + ends)])
+        expected.subtract(-(-250 + 2*50 + 50))
+        assert reader.sharpness_for(weapon) == { 'maxed': False, **expected.to_object() }
+
+def test_sharpness_reader_without_numpy(monkeypatch):
+    from mhw_armor_edit import ftypes
+    from mhdata.binary.load import equipment_bload
+
+    data = bytearray(struct.pack('<4xHI', kire.Kire.MAGIC, 1) + bytes(18))
+    monkeypatch.setattr(ftypes, 'np', None)
+    monkeypatch.setattr(equipment_bload, 'np', None)
+    monkeypatch.setattr(equipment_bload, 'load_schema', lambda schema, path: kire.Kire(data))
+    with pytest.raises(Exception, match='require numpy'):
+        equipment_bload.SharpnessDataReader()
+
+def test_struct_file_find_uses_indexes_until_fields_change():
+    rng = random.Random(5)
+    size = eq_crt.EqCrtEntry.STRUCT_SIZE
+    data = bytearray(struct.pack('<4xHI', eq_crt.EqCrt.MAGIC, 40) + bytes(rng.getrandbits(8) for _ in range(size * 40)))
+    for i in range(40):
+        struct.pack_into('<BH', data, 10 + i * size, i % 3, i // 2)
+    crafting = eq_crt.EqCrt(data)
+
+    def scan(**attrs):
+        return [e.index for e in crafting.entries if all(getattr(e, k) == v for k, v in attrs.items())]
+
+    assert [e.index for e in crafting.find(equip_type=1, equip_id=2)] == scan(equip_type=1, equip_id=2)
+    assert [e.index for e in crafting.find(equip_id=5)] == [10, 11]
+    assert crafting.find_first(equip_id=5, equip_type=2).index == 11
+    assert crafting.find_first(equip_id=500) is None
+    assert (('equip_id', 'equip_type') in crafting._indexes) and (('equip_id',) in crafting._indexes)
+
+    crafting[11].equip_id = 500
+    assert ('equip_id',) not in crafting._indexes, "expected indexes using the field to be dropped"
+    assert [e.index for e in crafting.find(equip_id=5)] == [10]
+    assert crafting.find_first(equip_id=500).index == 11
+
+    crafting[0].key_item = 7
+    assert ('equip_id',) in crafting._indexes, "expected other indexes to be kept"
+    assert [e.index for e in crafting.find(key_item=7)] == scan(key_item=7)
+    assert len(list(crafting.find())) == 40
@@ -0,0 +1,89 @@
+import random
+import struct
+import pytest
+import regex as re
+
+from mhw_armor_edit.ftypes import gmd
+from mhdata.binary.load import bcore, gmdtext
+from mhdata.binary.load.gmdtext import normalize_text
+
+def reference_normalize(value, lang):
+    "The GMD text normalization as a pass per replacement, as load_text did before it was compiled"
+    if lang == 'de':
+        value = re.sub(r"(\p{Ll})-( )*\r?\n( )*(\p{Ll})", r"\1\4", value)
+    value = re.sub(r"-()*\r?\n( )*", "-", value)
+    value = re.sub(r"( )*\r?\n( )*", " ", value)
+    value = re.sub(r"( )?<ICON ALPHA>", " α", value)
+    value = re.sub(r"( )?<ICON BETA>", " β", value)
+    value = re.sub(r"( )?<ICON GAMMA>", " γ", value)
+    for tag in ["<STYL MOJI_YELLOW_DEFAULT>", "<STYL MOJI_LIGHTBLUE_DEFAULT>", "</STYL>"]:
+        value = value.replace(tag, "")
+    return value.strip()
+
+def gmd_data(texts):
+    "Creates the data of a GMD file with a keyed string per text"
+    keys = [f'KEY_{i:03}'.encode() + b'\0' for i in range(len(texts))]
+    strings = b''.join(text.encode() + b'\0' for text in texts)
+    data = struct.pack('<10I', gmd.Gmd.MAGIC, 0x10302, 0, 0, 0, len(texts), len(texts),
+                       sum(map(len, keys)), len(strings), 4) + b'test\0'
+    for i in range(len(texts)):
+        data += struct.pack('<Iii4xqq', i, 0, 0, 8 * i, i)
+    return data + bytes(2048) + b''.join(keys) + strings
+
+def test_gmd_text_normalization_matches_replacement_passes():
+    rng = random.Random(6)
+    tokens = ['a', 'B', 'é', 'Ä', '-', ' ', '\n', '\r\n', '\r', '[1]', '<ICON ALPHA>', '<ICON BETA>', '<ICON GAMMA>',
+              '<STYL MOJI_YELLOW_DEFAULT>', '<STYL MOJI_LIGHTBLUE_DEFAULT>', '</STYL>', '<ICON', '<']
+    for _ in range(5000):
+        value = ''.join(rng.choice(tokens) for _ in range(rng.randint(0, 12)))
+        for lang in ('en', 'de'):
+            assert normalize_text(value, lang) == reference_normalize(value, lang), f"expected {value!r} to match"
+
+def test_load_text_caches_decoded_gmd_files(tmpdir, monkeypatch):
+    texts = ['Potion', 'Rathalos<ICON ALPHA>', 'Heilt-\nmittel', '<STYL MOJI_YELLOW_DEFAULT>[1]</STYL> line\r\n  break']
+    chunks = tmpdir.mkdir('chunks')
+    for ext_lang in bcore.lang_map:
+        chunks.join(f'item_{ext_lang}.gmd').write_binary(gmd_data(texts))
+
+    monkeypatch.setattr(bcore, 'CHUNK_DIRECTORY', str(chunks))
+    monkeypatch.setattr(gmdtext, 'TEXT_CACHE_DIRECTORY', str(tmpdir.join('cache')))
+    monkeypatch.setattr(gmdtext, '_loaded_texts', {})
+
+    text = bcore.load_text('item')
+    assert text[1]['en'] == 'Rathalos α' and text['KEY_001']['ja'] == 'Rathalos α'
+    assert text[2]['de'] == 'Heiltmittel' and text[2]['en'] == 'Heilt-mittel'
+    assert text[3]['fr'] == '[1] line break'
+    assert len(tmpdir.join('cache').listdir()) == len(bcore.lang_map), "expected a cached file per language"
+
+    def fail(data, lang):
+        raise AssertionError("expected cached files not to be decoded")
+    monkeypatch.setattr(gmdtext, 'decode_gmd', fail)
+    assert bcore.load_text('item', exclude_keys=True).indexed_entries == text.indexed_entries
+
+    gmdtext.clear_text_cache()
+    assert bcore.load_text('item').keyed_entries == text.keyed_entries, "expected texts to be read from the disk cache"
+
+    chunks.join('item_eng.gmd').write_binary(gmd_data(['Mega Potion']))
+    with pytest.raises(AssertionError):
+        bcore.load_text('item')
+
+def test_load_text_without_writable_cache(tmpdir, monkeypatch):
+    chunks = tmpdir.mkdir('chunks')
+    for ext_lang in bcore.lang_map:
+        chunks.join(f'item_{ext_lang}.gmd').write_binary(gmd_data(['Potion']))
+    monkeypatch.setattr(bcore, 'CHUNK_DIRECTORY', str(chunks))
+    monkeypatch.setattr(gmdtext, '_loaded_texts', {})
+
+    # The cache directory can't be created inside a file
+    tmpdir.join('file').write('')
+    monkeypatch.setattr(gmdtext, 'TEXT_CACHE_DIRECTORY', str(tmpdir.join('file', 'cache')))
+    assert bcore.load_text('item')[0]['en'] == 'Potion'
+
+    def fail(*args, **kwargs):
+        raise OSError("No space left on device")
+    cache = tmpdir.mkdir('cache')
+    monkeypatch.setattr(gmdtext, 'TEXT_CACHE_DIRECTORY', str(cache))
+    monkeypatch.setattr(gmdtext.json, 'dump', fail)
+    gmdtext.clear_text_cache()
+    assert bcore.load_text('item')[0]['ja'] == 'Potion'
+    assert cache.listdir() == [], "expected failed writes to leave no files"
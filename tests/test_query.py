@@ -0,0 +1,145 @@
+import concurrent.futures
+import pytest
+
+from mhdata import build
+from mhdata.load import load_data_processed
+from mhdata.query import QueryDatabase, ConnectionPool, LRUCache
+
+@pytest.fixture(scope="module")
+def db_filename(tmpdir_factory):
+    fname = str(tmpdir_factory.mktemp('query').join('mhw.db'))
+    build.build_sql_database(fname, load_data_processed(), bulk=True)
+    if build.search_index_supported():
+        build.create_search_index(fname)
+    build.optimize_database(fname)
+    return fname
+
+@pytest.fixture()
+def querydb(db_filename):
+    with QueryDatabase(db_filename) as result:
+        yield result
+
+def test_finds_item_by_name_in_any_language(querydb):
+    item_id = querydb.item_id('Potion')
+    assert item_id is not None
+    assert querydb.item_id('Potion', 'en') == item_id
+
+    japanese = querydb.item(item_id, 'ja')
+    assert querydb.item_id(japanese.name) == item_id, "expected translated names to be found"
+    assert querydb.item_by_name(japanese.name).name == 'Potion', "expected texts in english by default"
+    assert querydb.item_by_name('Not an item name') is None
+
+def test_item_sources(querydb):
+    sources = querydb.item_sources(querydb.item_id('Rathalos Scale'))
+    assert any(s.monster_name == 'Rathalos' for s in sources.monster_rewards)
+    assert all(s.percentage is not None for s in sources.monster_rewards)
+
+def test_weapon_tree_contains_weapon(querydb):
+    weapon_id = querydb.weapon_id('Buster Sword II')
+    root = querydb.weapon_tree(weapon_id)
+    assert root.weapon.name == 'Buster Sword I'
+
+    def walk(node):
+        yield node
+        for upgrade in node.upgrades:
+            yield from walk(upgrade)
+
+    weapons = [node.weapon for node in walk(root)]
+    assert weapon_id in [w.id for w in weapons]
+    assert len(set(w.id for w in weapons)) == len(weapons), "expected every weapon once"
+    assert all(node.weapon.final == (not node.upgrades) for node in walk(root))
+
+def test_armorset_totals_piece_skills(querydb):
+    armorset = querydb.armorset(querydb.armorset_id('Rathalos β+'))
+    assert len(armorset.pieces) == 5
+    assert armorset.bonus is not None and armorset.bonus.ranks
+
+    totals = {}
+    for piece in armorset.pieces:
+        for skill in piece.skills:
+            totals[skill.skilltree_id] = totals.get(skill.skilltree_id, 0) + skill.level
+    assert { s.skilltree_id: s.level for s in armorset.skills } == totals
+
+def test_monster_hitzones(querydb):
+    hitzones = querydb.monster_hitzones(querydb.monster_id('Rathalos'))
+    assert 'Head' in [h.name for h in hitzones]
+    assert querydb.monster_hitzones(-1) == ()
+
+requires_search = pytest.mark.skipif(not build.search_index_supported(), reason="sqlite is too old for the search index")
+
+@requires_search
+def test_search_ranks_across_entities(querydb):
+    results = querydb.search('rathalos')
+    assert results[0].name == 'Rathalos', "expected exact matches first, ignoring case"
+    assert set(['monster', 'armorset']) <= set(r.entity for r in results[:2])
+    assert len(set((r.entity, r.id) for r in results)) == len(results), "expected one result per entity"
+    assert all(r.name.lower().startswith('rathalos') for r in results[:5])
+
+    assert querydb.search('potion', entity='item')[0].id == querydb.item_id('Potion')
+    assert querydb.search('Mega Pot', lang='en')[0].name == 'Mega Potion'
+
+@requires_search
+def test_search_matches_translations_and_short_text(querydb):
+    potion_id = querydb.item_id('Potion')
+    japanese = querydb.item(potion_id, 'ja').name
+    results = querydb.search(japanese[:2], lang='ja', entity='item')
+    assert potion_id in [r.id for r in results], "expected short CJK searches to match by prefix"
+    assert querydb.search(japanese, entity='item')[0].lang_id == 'ja'
+
+    description = querydb.item(potion_id).description.split()[0]
+    assert potion_id in [r.id for r in querydb.search(description, entity='item', descriptions=True, limit=100)]
+    assert querydb.search('"') == () and querydb.search('   ') == ()
+
+def test_search_index_requires_sqlite_version(tmpdir, monkeypatch):
+    import sqlite3
+    monkeypatch.setattr(sqlite3, 'sqlite_version_info', (3, 31, 1))
+    assert not build.search_index_supported()
+    with pytest.raises(Exception, match="requires sqlite 3.34.0 or newer"):
+        build.create_search_index(str(tmpdir.join('mhw.db')))
+
+def test_shared_between_threads(db_filename):
+    with QueryDatabase(db_filename, pool_size=2, cache_size=0) as querydb:
+        expected = querydb.armorset(querydb.armorset_id('Rathalos β+'))
+        def lookup(_):
+            return querydb.armorset(expected.id)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lookup, range(100)))
+        assert all(result == expected for result in results)
+
+def test_closed_pool_refuses_connections(db_filename):
+    import threading
+
+    pool = ConnectionPool(db_filename, size=1)
+    with pool.connection() as conn:
+        conn.execute("SELECT 1")
+
+    borrowed = pool._acquire()
+    errors = []
+    def wait_for_connection():
+        try:
+            with pool.connection():
+                pass
+        except Exception as e:
+            errors.append(str(e))
+    waiting = threading.Thread(target=wait_for_connection)
+    waiting.start()
+
+    pool.close()
+    waiting.join(timeout=5)
+    assert errors == ["Connection pool is closed"], "expected a waiting thread to be woken by close"
+
+    pool._release(borrowed)
+    assert pool._idle.qsize() == 1, "expected returned connections not to be queued"
+    for _ in range(2):
+        with pytest.raises(Exception, match="Connection pool is closed"):
+            with pool.connection():
+                pass
+
+def test_lru_cache_evicts_oldest():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None, "expected the least recently used entry to be evicted"
+    assert cache.get('a') == 1 and cache.get('c') == 3
@@ -0,0 +1,79 @@
+import random
+import struct
+import pytest
+
+from mhdata.binary.parsers import structreader as sr
+from mhdata.binary.parsers import struct_to_json, DttEpg, DttEda, Itlot, Mib
+
+def epg_data(rng, count):
+    "Creates the data of a DttEpg with count parts, hitzones, and cleaves"
+    def ints(n, limit=1000):
+        return [rng.randint(-limit, limit) for _ in range(n)]
+
+    data = struct.pack('<iiIii', *ints(2), 7, *ints(2))
+    data += struct.pack('<I', count)
+    for _ in range(count):
+        data += struct.pack('<iiiiiI', *ints(4), rng.randint(0, 5), 2)
+        data += struct.pack('<20i', *ints(20))
+        data += struct.pack('<iiih', *ints(4))
+    data += struct.pack('<I', count)
+    for _ in range(count):
+        data += struct.pack('<f10i', rng.random(), *ints(10))
+    data += struct.pack('<I', count)
+    for _ in range(count):
+        data += struct.pack('<iiiiibbb', rng.randint(0, 3), *ints(4), *ints(3, 100))
+    return data
+
+def itlot_data(rng, count):
+    data = struct.pack('<ihI', 1, 2, count)
+    return data + bytes(rng.getrandbits(8) for _ in range(50 * count))
+
+def mib_data(rng):
+    data = bytearray(rng.getrandbits(8) for _ in range(2000))
+    # player spawn, time of day, and weather are mapped values
+    struct.pack_into('<I', data, 31, 1)
+    struct.pack_into('<I', data, 43, 3)
+    struct.pack_into('<I', data, 47, 2)
+    return bytes(data)
+
+@pytest.fixture()
+def uncompiled(monkeypatch):
+    "Returns a function that reads a struct one field at a time, as before structs were compiled"
+    def read(data, struct_type):
+        with monkeypatch.context() as m:
+            m.setattr(sr, 'fixed_layout', lambda readable: None)
+            m.setattr(sr, '_struct_plans', {})
+            return sr.read_struct(data, struct_type)
+    return read
+
+def test_compiled_structs_match_field_reads(uncompiled):
+    rng = random.Random(1)
+    eda = bytes(rng.getrandbits(8) for _ in range(1000))
+    for data, struct_type in [
+            (epg_data(rng, 20), DttEpg),
+            (eda, DttEda),
+            (itlot_data(rng, 30), Itlot),
+            (mib_data(rng), Mib)]:
+        expected = struct_to_json(uncompiled(data, struct_type))
+        assert struct_to_json(sr.read_struct(data, struct_type)) == expected, f"expected {struct_type.__name__} to match"
+
+    epg = sr.read_struct(epg_data(rng, 3), DttEpg)
+    assert len(epg.hitzones) == 3 and isinstance(epg.hitzones[0].sever, int)
+    assert epg.parts[0].extract in ('red', 'white', 'orange', 'green', '4', '5')
+    assert len(sr.compile_struct(DttEda).steps) == 1, "expected a fixed size struct to be read in one step"
+
+def test_compiled_structs_raise_same_errors(uncompiled):
+    rng = random.Random(2)
+
+    # Invalid mapped value, and data ending in the middle of a list
+    invalid = bytearray(epg_data(rng, 2))
+    struct.pack_into('<i', invalid, 24 + 16, 99)
+    truncated = itlot_data(rng, 5)[:-20]
+
+    for data, struct_type in [(bytes(invalid), DttEpg), (truncated, Itlot)]:
+        with pytest.raises(Exception) as expected:
+            uncompiled(data, struct_type)
+        with pytest.raises(Exception) as actual:
+            sr.read_struct(data, struct_type)
+        assert str(actual.value) == str(expected.value)
+        assert str(actual.value.__cause__) == str(expected.value.__cause__)